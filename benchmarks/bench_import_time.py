@@ -0,0 +1,95 @@
+"""
+Benchmark: CLI startup (import) time, as a regression guard.
+
+Runs each scenario in a fresh interpreter under `python -X importtime`,
+takes the best of --repeat runs and checks that
+  * no scenario imports a module it does not need (e.g. --stages 1 must not
+    load scipy, statsmodels or matplotlib);
+  * importing config / pipeline creates no directories (F1_ROOT is pointed at
+    an empty temporary directory);
+  * the CLI parser alone stays under --budget-ms.
+Exits with status 1 on any violation, so it can run in CI or a scheduler
+pre-check.
+
+Usage: python benchmarks/bench_import_time.py
+       python benchmarks/bench_import_time.py --repeat 10 --budget-ms 150
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# scenario -> (code run in the fresh interpreter, modules it must not import)
+SCENARIOS = {
+    'cli --help': ('from f1_time_rank import pipeline; pipeline.build_parser()',
+                   ['numpy', 'pandas', 'scipy', 'statsmodels', 'matplotlib']),
+    '--stages 1': ('import f1_time_rank.pipeline, f1_time_rank.stages.stage1_extract',
+                   ['scipy', 'statsmodels', 'matplotlib']),
+    '--stages 2': ('import f1_time_rank.pipeline, f1_time_rank.stages.stage2_probabilities',
+                   ['scipy', 'statsmodels', 'matplotlib']),
+    '--stages 3': ('import f1_time_rank.pipeline, f1_time_rank.stages.stage3_estimate_lambda',
+                   ['statsmodels', 'matplotlib']),
+    '--stages 4': ('import f1_time_rank.pipeline, f1_time_rank.stages.stage4_mu_sigma',
+                   ['scipy.optimize', 'statsmodels', 'matplotlib']),
+    '--stages 5': ('import f1_time_rank.pipeline, f1_time_rank.stages.stage5_regression',
+                   ['statsmodels', 'matplotlib']),
+    'monte carlo': ('import f1_time_rank.validation.monte_carlo_simulation',
+                    ['statsmodels', 'matplotlib']),
+}
+
+
+def import_profile(code, root):
+    """{module: cumulative microseconds} from one -X importtime run."""
+    env = dict(os.environ, PYTHONPATH=SRC, F1_ROOT=root)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=env,
+                          capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # top-level entries (no indent) add up to the total import time
+        times[name.rstrip()] = (int(cumulative), not name[1:].startswith(' '))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=100.0,
+                        help='maximum import time of the bare CLI (parser, config)')
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as root:
+        print(f"{'scenario':<14} {'import ms':>10}   heaviest top-level imports")
+        for name, (code, forbidden) in SCENARIOS.items():
+            runs = [import_profile(code, root) for _ in range(args.repeat)]
+            totals = [sum(t for t, top in r.values() if top) / 1e3 for r in runs]
+            best = runs[totals.index(min(totals))]
+            heavy = sorted(((t, m.strip()) for m, (t, top) in best.items() if top), reverse=True)[:3]
+            print(f"{name:<14} {min(totals):>10.1f}   "
+                  + ', '.join(f'{m} {t / 1e3:.0f}' for t, m in heavy))
+            loaded = {m.strip() for m in best}
+            for mod in forbidden:
+                if any(m == mod or m.startswith(mod + '.') for m in loaded):
+                    failures.append(f'{name}: imports {mod}')
+            if name == 'cli --help' and min(totals) > args.budget_ms:
+                failures.append(f'{name}: {min(totals):.1f} ms > budget {args.budget_ms:.0f} ms')
+        created = os.listdir(root)
+        if created:
+            failures.append(f'importing created directories: {created}')
+
+    if failures:
+        print('\nFAILED')
+        for f in failures:
+            print('  ' + f)
+        sys.exit(1)
+    print('\nOK: no unneeded imports, no import-time side effects')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: live race updates (src/f1_time_rank/stages/live_race.py) vs conditioned
+Monte Carlo.
+
+Plays a scripted race on the stage 3 lambdas (or --drivers synthetic ones):
+a retirement, the leader finishing, a chain of three known orders, the
+retirement of the chain's head and then of a driver in the middle of it
+(the orders around them stay). After each event it prints the update time and compares the
+conditional position matrix with rejection-sampled Monte Carlo of the full
+model: the largest absolute difference and the largest |difference| / SE
+over the cells with at least 10 expected draws in and out (|z| up to ~3.5 is expected
+with a few hundred cells).
+
+Usage: python benchmarks/bench_live_race.py
+       python benchmarks/bench_live_race.py --drivers 60 --sims 400000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from f1_time_rank.config import STAGE3_OUT
+from f1_time_rank.utils import read_df
+from f1_time_rank.stages.live_race import LiveRace, conditioned_monte_carlo
+
+
+def script(lam):
+    """Event list over driver indices, from the strongest driver down."""
+    order = [int(i) for i in np.argsort(-lam)]
+    return [('retire', order[2]), ('finish', order[0]), ('ahead', order[4], order[1]),
+            ('ahead', order[1], order[6]), ('retire', order[4]),
+            ('ahead', order[6], order[8]), ('retire', order[6])]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--drivers', type=int, default=None,
+                        help='synthetic lognormal lambdas instead of the stage 3 output')
+    parser.add_argument('--sims', type=int, default=200_000, help='accepted Monte Carlo draws per check')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.drivers:
+        lam = np.random.default_rng(args.seed).lognormal(0, 1, args.drivers)
+        names = None
+    else:
+        df = read_df(STAGE3_OUT)
+        lam, names = df['lambda_est'].values, df['Driver'].values
+    race = LiveRace(lam, names)
+    print(f'{len(lam)} drivers, {args.sims:,} accepted draws per check')
+    print(f"{'event':<42} {'update ms':>10} {'MC s':>8} {'max |diff|':>11} {'max |z|':>8}")
+
+    finished, retired, ahead = [], [], []
+    for kind, *rows in script(lam):
+        t0 = time.perf_counter()
+        getattr(race, kind)(*rows)
+        update = time.perf_counter() - t0
+        {'finish': finished, 'retire': retired}.get(kind, ahead).append(
+            rows[0] if kind != 'ahead' else tuple(rows))
+
+        t0 = time.perf_counter()
+        freq, accepted = conditioned_monte_carlo(lam, finished, retired, ahead,
+                                                 n_sims=args.sims, seed=args.seed)
+        mc = time.perf_counter() - t0
+        P = race.positions
+        diff = np.abs(freq - P)
+        cells = (P * accepted >= 10) & ((1 - P) * accepted >= 10)
+        z = diff[cells] / np.sqrt(P[cells] * (1 - P[cells]) / accepted)
+        label = ' '.join(race.events[-1])
+        print(f'{label[:42]:<42} {update * 1e3:>10.2f} {mc:>8.2f} {diff.max():>11.5f} {z.max():>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: online Plackett-Luce ratings vs the batch stage 6 fit.
+
+Replays the 2022 season race by race and a simulated season of --races
+races, reporting the time per race update and the distance to the batch
+maximum-likelihood fit in units of its standard errors, for the forward pass
+and after --passes refine() passes. Exits with status 1 if the refined
+estimates are more than --tolerance batch standard errors off for any driver.
+
+Usage: python benchmarks/bench_online_ratings.py
+       python benchmarks/bench_online_ratings.py --races 2000 --prior-precision 0.1
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from f1_time_rank.config import STAGE5_IN
+from f1_time_rank.stages.stage5_regression import read_positions_matrix
+from f1_time_rank.stages.stage6_plackett_luce import Rankings, fit_plackett_luce, log_lambda_covariance
+from f1_time_rank.stages.bootstrap_regression import simulate_race_positions
+from f1_time_rank.stages.online_ratings import OnlineRatings
+
+
+def max_z(ratings, lam, se):
+    diff = np.log(ratings.lambdas) - np.log(lam)
+    diff -= diff.mean()                        # same gauge as the covariance
+    z = np.abs(diff) / se
+    return np.median(z), z.max()
+
+
+def compare(label, pos, prior_precision, iterations, passes):
+    ratings = OnlineRatings(range(pos.shape[0]), prior_precision=prior_precision,
+                            iterations=iterations, history=True)
+    t0 = time.perf_counter()
+    ratings.update_many(pos)
+    per_race = (time.perf_counter() - t0) / pos.shape[1]
+
+    rankings = Rankings.from_positions(pos)
+    lam, _ = fit_plackett_luce(rankings)
+    se = np.sqrt(np.diag(log_lambda_covariance(rankings, lam)))
+    med, worst = max_z(ratings, lam, se)
+    print(f'{label}: {per_race * 1e6:.1f} us/race, |online - batch| / batch se: '
+          f'median {med:.2f}, max {worst:.2f}')
+
+    t0 = time.perf_counter()
+    ratings.refine(passes)
+    elapsed = time.perf_counter() - t0
+    med, worst = max_z(ratings, lam, se)
+    print(f'{label}, {passes} refine passes: {elapsed * 1e3:.1f} ms, '
+          f'median {med:.2f}, max {worst:.2f}')
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--races', type=int, default=500)
+    parser.add_argument('--drivers', type=int, default=20)
+    parser.add_argument('--prior-precision', type=float, default=0.3)
+    parser.add_argument('--iterations', type=int, default=1)
+    parser.add_argument('--passes', type=int, default=2)
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='max |refined - batch| in batch standard errors')
+    args = parser.parse_args()
+
+    pos, _ = read_positions_matrix(STAGE5_IN)
+    worst = [compare('2022 season', pos, args.prior_precision, args.iterations, args.passes)]
+
+    rng = np.random.default_rng(0)
+    lam = rng.lognormal(0, 1, args.drivers)
+    sim = simulate_race_positions(lam / lam.sum(), args.races, 1, rng)[0].T.astype(float)
+    worst.append(compare(f'simulated {args.races} races', sim, args.prior_precision,
+                         args.iterations, args.passes))
+
+    if max(worst) > args.tolerance:
+        print(f'FAIL: refined estimates {max(worst):.2f} batch se off (tolerance {args.tolerance})')
+        sys.exit(1)
+    print(f'OK: refined estimates within {args.tolerance} batch se of the batch fit')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark: ordered logit/probit (stage 5 alternative) against statsmodels'
+OrderedModel on simulated multi-season data.
+
+Every season has --teams teams of two drivers racing --races races; positions
+come from a latent team strength plus a second-driver effect and logistic
+(or normal) noise. Team dummies are team-season levels, so the design grows
+with the number of seasons like the stacked real data would.
+
+Usage: python benchmarks/bench_ordered_regression.py                  # 20 seasons
+       python benchmarks/bench_ordered_regression.py --seasons 50 --distr probit
+       python benchmarks/bench_ordered_regression.py --no-statsmodels
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from f1_time_rank.stages.regression_engine import encode_categorical, build_design
+from f1_time_rank.stages.ordered_regression import fit_ordered
+
+
+def make_seasons(n_seasons, n_teams, n_races, distr, seed=0):
+    rng = np.random.default_rng(seed)
+    n_drivers = 2 * n_teams
+    strength = rng.normal(0, 1.5, (n_seasons, n_teams))
+    noise = rng.logistic if distr == 'logit' else rng.normal
+    rows = []
+    for s in range(n_seasons):
+        team = np.repeat(np.arange(n_teams), 2)
+        second = np.tile([0.0, 1.0], n_teams)
+        latent = strength[s, team][None, :] + 0.3 * second[None, :] + noise(size=(n_races, n_drivers))
+        position = latent.argsort(axis=1).argsort(axis=1) + 1.0
+        rows.append(pd.DataFrame({
+            'positionlabel': position.ravel(),
+            'driverorder2': np.tile(second, n_races),
+            'constructor': np.tile([f'S{s:02d}T{t:02d}' for t in team], n_races),
+        }))
+    return pd.concat(rows, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seasons', type=int, default=20)
+    parser.add_argument('--teams', type=int, default=10)
+    parser.add_argument('--races', type=int, default=22)
+    parser.add_argument('--distr', choices=['logit', 'probit'], default='logit')
+    parser.add_argument('--no-statsmodels', action='store_true', help='skip the OrderedModel reference fit')
+    args = parser.parse_args()
+
+    df = make_seasons(args.seasons, args.teams, args.races, args.distr)
+    codes, levels = encode_categorical(df['constructor'].values, reference=df['constructor'].iloc[-1])
+    X, names = build_design(len(df), numeric={'driverorder2': df['driverorder2'].values},
+                            categorical={'constructor': (codes, levels)}, intercept=False)
+    y = df['positionlabel'].values
+    print(f'seasons={args.seasons} rows={len(df)} regressors={len(names)} distr={args.distr}')
+
+    t0 = time.perf_counter()
+    res = fit_ordered(X, y, names, distr=args.distr)
+    fast = time.perf_counter() - t0
+    print(f'fit_ordered: {fast:.3f}s, {res.n_iter} Newton steps, converged={res.converged}, '
+          f'llf={res.llf:.3f}, driverorder2={res.params["driverorder2"]:.4f} '
+          f'(se {res.bse["driverorder2"]:.4f})')
+
+    if not args.no_statsmodels:
+        from statsmodels.miscmodels.ordinal_model import OrderedModel
+        t0 = time.perf_counter()
+        ref = OrderedModel(pd.Series(y), pd.DataFrame(X.toarray(), columns=names),
+                           distr=args.distr).fit(method='bfgs', maxiter=5000, disp=0)
+        slow = time.perf_counter() - t0
+        print(f'OrderedModel: {slow:.3f}s, llf={ref.llf:.3f}, driverorder2='
+              f'{ref.params["driverorder2"]:.4f} (se {ref.bse["driverorder2"]:.4f})')
+        print(f'max |params diff| = {np.abs(res.params.values - ref.params.values).max():.2e}, '
+              f'speed-up {slow / fast:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: stage output backends (CSV vs Parquet vs Arrow IPC).
+
+Builds a stage 4 style batch table (--markets markets of 20 drivers with
+p_norm, z, mu_hat, sigma_hat) and times a full write / read with
+utils.save_df / read_df, a column-projected read, and a read of one season
+from a season-partitioned dataset. Also reports the largest float round-trip
+error per format.
+
+Usage: python benchmarks/bench_output_formats.py                  # 50k markets (1M rows)
+       python benchmarks/bench_output_formats.py --markets 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from f1_time_rank.utils import save_df, read_df
+
+
+def make_table(n_markets, n_drivers=20, n_seasons=10, seed=0):
+    rng = np.random.default_rng(seed)
+    lam = rng.lognormal(0, 1, (n_markets, n_drivers))
+    p = (lam / lam.sum(axis=1, keepdims=True)).ravel()
+    z = -np.log(p)
+    return pd.DataFrame({
+        'season': np.repeat(2000 + np.arange(n_markets) % n_seasons, n_drivers),
+        'Market': np.repeat(np.arange(n_markets), n_drivers),
+        'Driver': np.tile([f'Driver{i:02d}' for i in range(n_drivers)], n_markets),
+        'p_norm': p,
+        'z': z,
+        'mu_hat': z - z.mean(),
+        'sigma_hat': np.repeat(rng.random(n_markets), n_drivers),
+    })
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--markets', type=int, default=50_000)
+    args = parser.parse_args()
+
+    df = make_table(args.markets)
+    print(f'rows={len(df)} columns={list(df.columns)}')
+    print(f"{'format':<8} {'write s':>8} {'read s':>8} {'2 cols s':>9} {'1 season s':>11} "
+          f"{'MB':>7} {'max |err|':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for ext in ('.csv', '.parquet', '.arrow'):
+            path = os.path.join(tmp, 'stage4' + ext)
+            t_write, _ = timed(lambda: save_df(df, path))
+            t_read, back = timed(lambda: read_df(path))
+            t_cols, _ = timed(lambda: read_df(path, columns=['Market', 'mu_hat']))
+            if ext == '.csv':
+                t_season = float('nan')
+            else:
+                part = os.path.join(tmp, 'parts' + ext)
+                save_df(df, part, partition_cols=['season'])
+                t_season, one = timed(lambda: read_df(part, filters=[('season', '=', 2003)]))
+                assert len(one) == (df['season'] == 2003).sum()
+            err = np.abs(back['mu_hat'].values - df['mu_hat'].values).max()
+            size = os.path.getsize(path) / 1e6
+            print(f'{ext[1:]:<8} {t_write:8.2f} {t_read:8.2f} {t_cols:9.2f} {t_season:11.3f} '
+                  f'{size:7.1f} {err:10.1e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: memory-mapped results store vs parsing / filtering a long CSV.
+
+Writes --seasons synthetic seasons (20 drivers, 22 rounds, drivers moving
+between teams) as a CSV and as a store, then times opening each and slicing
+by season, driver and team.
+
+Usage: python benchmarks/bench_results_store.py                  # 1000 seasons (440k rows)
+       python benchmarks/bench_results_store.py --seasons 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from f1_time_rank.stages.results_store import ResultsStore
+
+
+def make_results(n_seasons, n_drivers=20, n_rounds=22, n_pool=300, seed=0):
+    rng = np.random.default_rng(seed)
+    n_teams = n_drivers // 2
+    rows = n_seasons * n_rounds * n_drivers
+    lineup = np.stack([rng.choice(n_pool, n_drivers, replace=False) for _ in range(n_seasons)])
+    driver = np.repeat(lineup, n_rounds, axis=0).ravel()
+    team = np.tile(np.repeat(np.arange(n_teams), 2), n_seasons * n_rounds)
+    position = np.argsort(rng.random((n_seasons * n_rounds, n_drivers)), axis=1).ravel() + 1.0
+    position[rng.random(rows) < 0.08] = np.nan
+    return pd.DataFrame({
+        'season': np.repeat(np.arange(n_seasons), n_rounds * n_drivers),
+        'round': np.tile(np.repeat(np.arange(1, n_rounds + 1), n_drivers), n_seasons),
+        'driver': [f'D{d:04d}' for d in driver],
+        'team': [f'T{t:02d}' for t in team],
+        'position': position,
+    })
+
+
+def timed(fn, repeat=20):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - t0) / repeat * 1e3, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seasons', type=int, default=1000)
+    args = parser.parse_args()
+
+    df = make_results(args.seasons)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv = os.path.join(tmp, 'results.csv')
+        df.to_csv(csv, index=False)
+        t0 = time.perf_counter()
+        ResultsStore.from_frame(df, os.path.join(tmp, 'store'))
+        print(f'rows={len(df)}  store written in {time.perf_counter() - t0:.2f}s')
+
+        ms_csv, frame = timed(lambda: pd.read_csv(csv), repeat=3)
+        ms_open, store = timed(lambda: ResultsStore(os.path.join(tmp, 'store')))
+        print(f'open:   csv parse {ms_csv:9.2f} ms   store {ms_open:7.3f} ms')
+
+        season = args.seasons // 2
+        cases = [
+            ('season', lambda: frame[frame['season'] == season],
+             lambda: store.frame(store.season_rows(season))),
+            ('driver', lambda: frame[frame['driver'] == 'D0042'],
+             lambda: store.frame(store.driver_rows('D0042'))),
+            ('team', lambda: frame[frame['team'] == 'T03'],
+             lambda: store.frame(store.team_rows('T03'))),
+            ('season+driver', lambda: frame[(frame['season'] == season) & (frame['driver'] == frame['driver'].iloc[season * 440])],
+             lambda: store.frame(store.select(season=season, driver=str(frame['driver'].iloc[season * 440])))),
+        ]
+        for name, pandas_fn, store_fn in cases:
+            ms_pd, a = timed(pandas_fn)
+            ms_st, b = timed(store_fn)
+            assert len(a) == len(b), name
+            print(f'{name:<14} pandas mask {ms_pd:8.3f} ms   store {ms_st:8.3f} ms   ({len(b)} rows)')
+
+
+if __name__ == '__main__':
+    main()
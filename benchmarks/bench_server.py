@@ -0,0 +1,156 @@
+"""
+Latency and throughput of the model server (src/f1_time_rank/server.py).
+
+Starts f1-serve on a temporary Unix socket and an HTTP port, then:
+  * sequential: one client, one query at a time (mixed win / podium / top /
+    positions / h2h), per-query round-trip latency p50 / p99 / max;
+  * concurrent: --clients connections each sending --queries / clients
+    queries, total queries per second.
+Also times the subprocess way of answering one query (python -c, import
+stage 3 and read the CSV) for comparison.
+
+Usage: python benchmarks/bench_server.py
+       python benchmarks/bench_server.py --queries 50000 --clients 8
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+from f1_time_rank.server import ModelClient
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def query_mix(drivers, n, seed=0):
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        kind = rng.integers(5)
+        a, b = rng.choice(len(drivers), 2, replace=False)
+        if kind == 0:
+            out.append({'q': 'win', 'driver': drivers[a]})
+        elif kind == 1:
+            out.append({'q': 'podium', 'driver': drivers[a]})
+        elif kind == 2:
+            out.append({'q': 'top', 'k': int(rng.integers(1, len(drivers) + 1)), 'driver': drivers[a]})
+        elif kind == 3:
+            out.append({'q': 'positions', 'driver': drivers[a]})
+        else:
+            out.append({'q': 'h2h', 'a': drivers[a], 'b': drivers[b]})
+    return out
+
+
+def latency_report(name, lat):
+    lat = np.asarray(lat) * 1e3
+    print(f"{name:<28} {len(lat):>8,} {np.percentile(lat, 50):>9.3f} {np.percentile(lat, 99):>9.3f} "
+          f"{lat.max():>9.3f} {len(lat) / (lat.sum() / 1e3):>10,.0f}")
+
+
+def sequential_unix(path, queries):
+    lat = []
+    with ModelClient(path) as client:
+        for q in queries:
+            params = {k: v for k, v in q.items() if k != 'q'}
+            t0 = time.perf_counter()
+            client.query(q['q'], **params)
+            lat.append(time.perf_counter() - t0)
+    return lat
+
+
+def sequential_http(port, queries):
+    from urllib.parse import urlencode
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    lat = []
+    for q in queries:
+        params = {k: v for k, v in q.items() if k != 'q'}
+        t0 = time.perf_counter()
+        conn.request('GET', f"/{q['q']}?{urlencode(params)}")
+        resp = conn.getresponse()
+        resp.read()
+        lat.append(time.perf_counter() - t0)
+    conn.close()
+    return lat
+
+
+async def _client(path, lines):
+    reader, writer = await asyncio.open_unix_connection(path)
+    for line in lines:
+        writer.write(line)
+        await reader.readline()
+    writer.close()
+
+
+async def concurrent_unix(path, queries, clients):
+    lines = [json.dumps(q).encode() + b'\n' for q in queries]
+    chunks = [lines[i::clients] for i in range(clients)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(path, c) for c in chunks))
+    return time.perf_counter() - t0
+
+
+def subprocess_query(driver):
+    code = ("import sys; sys.path.insert(0, %r); from f1_time_rank.stages.stage3_joint_lambda import "
+            "finish_probabilities; from f1_time_rank.utils import read_df; "
+            "from f1_time_rank.config import STAGE3_OUT; "
+            "df = read_df(STAGE3_OUT); i = list(df['Driver']).index(%r); "
+            "print(finish_probabilities(df['lambda_est'].values, [3])[i, 0])") % (SRC, driver)
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], check=True, capture_output=True)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--clients', type=int, default=4)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    sock = os.path.join(tmp, 'f1.sock')
+    port = free_port()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC, os.environ.get('PYTHONPATH')])))
+    proc = subprocess.Popen([sys.executable, '-m', 'f1_time_rank.server', '--socket', sock,
+                             '--port', str(port), '--quiet'], env=env)
+    try:
+        t0 = time.perf_counter()
+        while not os.path.exists(sock):
+            if proc.poll() is not None or time.perf_counter() - t0 > 30:
+                raise SystemExit('server did not start')
+            time.sleep(0.02)
+        startup = time.perf_counter() - t0
+        with ModelClient(sock) as client:
+            drivers = [d['driver'] for d in client.query('drivers')['drivers']]
+        queries = query_mix(drivers, args.queries)
+        print(f"Server ready in {startup:.2f}s, {len(drivers)} drivers; "
+              f"{args.queries:,} mixed queries")
+        print(f"{'':<28} {'queries':>8} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'q/s':>10}")
+        latency_report('unix socket, sequential', sequential_unix(sock, queries))
+        latency_report('http keep-alive, sequential', sequential_http(port, queries))
+        elapsed = asyncio.run(concurrent_unix(sock, queries, args.clients))
+        print(f"{f'unix socket, {args.clients} clients':<28} {args.queries:>8,} "
+              f"{'':>9} {'':>9} {'':>9} {args.queries / elapsed:>10,.0f}")
+        sub = [subprocess_query(drivers[0]) for _ in range(3)]
+        print(f"{'subprocess per query':<28} {3:>8} {np.median(sub) * 1e3:>9.1f}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == '__main__':
+    main()
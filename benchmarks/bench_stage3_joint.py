@@ -0,0 +1,81 @@
+"""
+Benchmark: joint multi-market lambda fit (stage 3 joint) on synthetic odds.
+
+Builds win / top 3 / top 6 / top 10 markets from known lognormal lambdas and
+runs run_stage3_joint on two odds files: every market pricing every driver,
+and the top-k markets pricing only the --priced strongest drivers with an
+--overround. Prints the fit time and the largest relative lambda error, and
+exits with status 1 if it exceeds --tolerance in either case.
+
+Usage: python benchmarks/bench_stage3_joint.py
+       python benchmarks/bench_stage3_joint.py --drivers 40 --priced 12
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from f1_time_rank import events
+from f1_time_rank.stages.stage3_joint_lambda import LAMBDA_TOTAL, finish_probabilities, run_stage3_joint
+
+KS = (1, 3, 6, 10)
+
+
+def write_markets(path, lam, priced, overround):
+    """Decimal odds file; top-k markets (k > 1) only for the first `priced`
+    drivers, whose raw probabilities carry the overround."""
+    P = finish_probabilities(lam, KS)
+    names = [f'Driver{i:03d}' for i in range(len(lam))]
+    rows = []
+    for j, k in enumerate(KS):
+        field = len(lam) if k == 1 else priced
+        c = 1.0 if field == len(lam) else overround
+        rows += [(names[i], f'top{k}' if k > 1 else 'win', f'{1.0 / (c * P[i, j]):.12g}')
+                 for i in range(field)]
+    pd.DataFrame(rows, columns=['Driver', 'Market', 'Odds']).to_csv(path, sep=';', index=False)
+
+
+def check(label, path, out, lam_true):
+    t0 = time.perf_counter()
+    df = run_stage3_joint(path, out)
+    elapsed = time.perf_counter() - t0
+    err = np.max(np.abs(df['lambda_est'].values / lam_true - 1.0))
+    print(f'{label}: {elapsed:.2f} s, max relative lambda error {err:.2e}')
+    return err
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--drivers', type=int, default=20)
+    parser.add_argument('--priced', type=int, default=12, help='drivers priced in the partial markets')
+    parser.add_argument('--overround', type=float, default=1.15)
+    parser.add_argument('--tolerance', type=float, default=1e-4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    events.configure(quiet=True)
+    lam = np.random.default_rng(args.seed).lognormal(0, 1, args.drivers)
+    lam = np.sort(lam)[::-1]
+    lam_true = lam / lam.sum() * LAMBDA_TOTAL
+    errors = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, priced in (('complete markets', args.drivers),
+                              (f'top-k priced for {args.priced} drivers', args.priced)):
+            path = os.path.join(tmp, 'markets.csv')
+            write_markets(path, lam, priced, args.overround)
+            errors.append(check(label, path, os.path.join(tmp, 'out.csv'), lam_true))
+
+    if max(errors) > args.tolerance:
+        print(f'FAIL: lambda error {max(errors):.2e} above tolerance {args.tolerance}')
+        sys.exit(1)
+    print(f'OK: lambdas recovered within {args.tolerance}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark: sparse stage 5 regression engine vs statsmodels OLS.
+
+Synthetic multi-season design: driverorder2 plus driver, team and season
+dummies built from integer codes.
+
+Usage: python benchmarks/bench_stage5_ols.py                 # 10M rows
+       python benchmarks/bench_stage5_ols.py --rows 200000 --compare
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from f1_time_rank.stages.regression_engine import build_design, fit_ols
+
+
+def make_data(n_rows, n_drivers=300, n_teams=40, n_seasons=30, seed=0):
+    rng = np.random.default_rng(seed)
+    driver = rng.integers(0, n_drivers, n_rows)
+    team = rng.integers(0, n_teams, n_rows)
+    season = rng.integers(0, n_seasons, n_rows)
+    order = rng.integers(0, 2, n_rows).astype(float)
+    y = (10 + 0.3 * order + rng.normal(0, 1, n_drivers)[driver]
+         + rng.normal(0, 2, n_teams)[team] + rng.normal(0, 5, n_rows))
+    # code 0 of every factor is the reference level
+    cats = {}
+    for name, codes, k in (('driver', driver, n_drivers), ('team', team, n_teams),
+                           ('season', season, n_seasons)):
+        cats[name] = (codes - 1, [f'{name}{j}' for j in range(1, k)])
+    return order, cats, y
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--compare', action='store_true', help='also time statsmodels (dense)')
+    args = parser.parse_args()
+
+    order, cats, y = make_data(args.rows)
+    t0 = time.perf_counter()
+    X, names = build_design(args.rows, numeric={'driverorder2': order}, categorical=cats)
+    t1 = time.perf_counter()
+    res = fit_ols(X, y, names)
+    t2 = time.perf_counter()
+    print(f'rows={args.rows:,} terms={len(names)} nnz={X.nnz:,}')
+    print(f'sparse build: {t1 - t0:.2f}s  fit: {t2 - t1:.2f}s  total: {t2 - t0:.2f}s')
+    print(f'driverorder2 = {res.params["driverorder2"]:.4f} (se {res.bse["driverorder2"]:.4f}), R2 = {res.rsquared:.4f}')
+
+    if args.compare:
+        import statsmodels.api as sm
+        t0 = time.perf_counter()
+        model = sm.OLS(y, X.toarray()).fit()
+        t1 = time.perf_counter()
+        print(f'statsmodels dense fit: {t1 - t0:.2f}s, max |diff params| = '
+              f'{np.abs(model.params - res.params.values).max():.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: out-of-core stage 5 regression on a synthetic long-format file.
+
+Writes a multi-season results CSV (positionlabel, driverorder2, constructor)
+in pieces, streams it through StreamingOLS and reports time and peak traced
+memory; the peak should stay flat as --rows grows.
+
+Usage: python benchmarks/bench_stage5_streaming.py --rows 5000000
+       python benchmarks/bench_stage5_streaming.py --rows 1000000 --method gram --compare
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from f1_time_rank.stages.streaming_ols import scan_levels, stream_fit
+from f1_time_rank.stages.regression_engine import build_design, encode_categorical, fit_ols
+
+
+def write_data(path, n_rows, n_teams=40, seed=0, piece=1_000_000):
+    rng = np.random.default_rng(seed)
+    team_effect = rng.normal(0, 3, n_teams)
+    for start in range(0, n_rows, piece):
+        m = min(piece, n_rows - start)
+        team = rng.integers(0, n_teams, m)
+        order = rng.integers(0, 2, m).astype(float)
+        y = np.clip(np.round(11 + 0.3 * order + team_effect[team] + rng.normal(0, 5, m)), 1, 20)
+        pd.DataFrame({'positionlabel': y, 'driverorder2': order,
+                      'constructor': np.char.add('team', team.astype(str))}).to_csv(
+            path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--chunksize', type=int, default=500_000)
+    parser.add_argument('--method', choices=['tsqr', 'gram'], default='tsqr')
+    parser.add_argument('--compare', action='store_true', help='also fit in memory with fit_ols')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'positions_long.csv'
+        write_data(path, args.rows)
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        teams = [t for t in scan_levels(path, chunksize=args.chunksize) if t != 'team0']
+        acc = stream_fit(path, teams, chunksize=args.chunksize, method=args.method)
+        res = acc.result()
+        t1 = time.perf_counter()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f'rows={args.rows:,} terms={len(acc.names)} method={args.method}')
+        print(f'streaming fit: {t1 - t0:.2f}s, peak traced memory {peak / 2**20:.0f} MiB')
+        print(f'driverorder2 = {res.params["driverorder2"]:.4f} (se {res.bse["driverorder2"]:.4f}), '
+              f'R2 = {res.rsquared:.4f}')
+
+        if args.compare:
+            df = pd.read_csv(path)
+            codes, levels = encode_categorical(df['constructor'].values, reference='team0')
+            X, names = build_design(len(df), numeric={'driverorder2': df['driverorder2'].values},
+                                    categorical={'constructor': (codes, levels)})
+            full = fit_ols(X, df['positionlabel'].values, names)
+            print(f'in-memory fit_ols: max |diff params| = '
+                  f'{np.abs(full.params[res.params.index].values - res.params.values).max():.2e}')
+
+
+if __name__ == '__main__':
+    main()
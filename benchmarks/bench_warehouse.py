@@ -0,0 +1,95 @@
+"""
+Benchmark: SQLite warehouse ingest and indexed point queries.
+
+Builds a synthetic season of stage outputs (--races events x --bookmakers
+books, 20 drivers, the stage 1-4 columns plus a stage 5 coefficient table),
+ingests it as one batch and times point queries against the indexes.
+
+Usage: python benchmarks/bench_warehouse.py                     # 22 races x 10 bookmakers
+       python benchmarks/bench_warehouse.py --races 22 --bookmakers 40
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from f1_time_rank.stages.warehouse import Warehouse
+
+
+def make_run(rng, n_drivers=20, n_terms=12):
+    drivers = [f'Driver {i:02d}' for i in range(n_drivers)]
+    teams = [f'Team {i // 2:02d}' for i in range(n_drivers)]
+    raw = rng.dirichlet(np.ones(n_drivers)) * 1.1
+    p = raw / raw.sum()
+    lam = -np.log1p(-p) / 20
+    base = pd.DataFrame({'Team': teams, 'Driver': drivers, 'Odds': [f'{1 / r - 1:.0f}/1' for r in raw],
+                         'raw_implied_p': raw})
+    stage2 = base.assign(p_norm=p)
+    stage3 = stage2.assign(lambda_est=lam, p_predicted=p, p_error=rng.normal(0, 1e-12, n_drivers))
+    stage4 = stage2.assign(z=rng.normal(size=n_drivers), mu_hat=-np.log(p), sigma_hat=np.pi / np.sqrt(6))
+    terms = pd.DataFrame({'term': ['const', 'driverorder2'] + [f'Team {i:02d}' for i in range(n_terms - 2)]})
+    for col in ('Estimate', 'Std_Error', 't_value', 'p_value', 'r2', 'aic'):
+        terms[col] = rng.normal(size=n_terms)
+    return ({'stage1': base, 'stage2': stage2, 'stage3': stage3, 'stage4': stage4},
+            {'stage5': terms})
+
+
+def timed(fn, repeat=2000):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - t0) / repeat * 1e3, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--races', type=int, default=22)
+    parser.add_argument('--bookmakers', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    runs = []
+    for r in range(args.races):
+        for b in range(args.bookmakers):
+            driver_tables, term_tables = make_run(rng)
+            runs.append({'driver_tables': driver_tables, 'term_tables': term_tables,
+                         'event': f'race{r:02d}', 'bookmaker': f'book{b:02d}', 'season': 2022})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wh = Warehouse(os.path.join(tmp, 'warehouse.sqlite'))
+        t0 = time.perf_counter()
+        wh.ingest_batch(runs)
+        t_ingest = time.perf_counter() - t0
+        n_rows = wh.conn.execute('SELECT COUNT(*) FROM driver_results').fetchone()[0]
+        n_coef = wh.conn.execute('SELECT COUNT(*) FROM coefficients').fetchone()[0]
+        print(f'{len(runs)} runs -> {n_rows:,} driver rows + {n_coef:,} coefficient rows')
+        print(f'  batch ingest: {t_ingest:.2f} s ({n_rows / t_ingest:,.0f} rows/s)')
+
+        point = ('SELECT value FROM driver_results '
+                 'WHERE event = ? AND driver = ? AND stage = ? AND metric = ?')
+        args_point = ('race07', 'Driver 03', 'stage3', 'lambda_est')
+        plan = wh.conn.execute('EXPLAIN QUERY PLAN ' + point, args_point).fetchall()
+        print(f'  plan: {plan[0][-1]}')
+        t_raw, rows = timed(lambda: wh.conn.execute(point, args_point).fetchall())
+        print(f'  point query, cursor:    {t_raw:.4f} ms ({len(rows)} rows, one per bookmaker)')
+        t_df, df = timed(lambda: wh.query(event='race07', driver='Driver 03', stage='stage3',
+                                          metric='lambda_est'), repeat=500)
+        print(f'  point query, DataFrame: {t_df:.4f} ms')
+        t_drv, df = timed(lambda: wh.query(driver='Driver 03', stage='stage3', metric='lambda_est'),
+                          repeat=200)
+        print(f'  driver over the season: {t_drv:.4f} ms ({len(df)} rows)')
+        t_full, _ = timed(lambda: wh.conn.execute(
+            'SELECT value FROM driver_results NOT INDEXED '
+            'WHERE event = ? AND driver = ? AND stage = ? AND metric = ?', args_point).fetchall(), repeat=5)
+        print(f'  same point query without index: {t_full:.2f} ms')
+        wh.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+"""
+Benchmark suite: pipeline stages and the Monte Carlo engine on synthetic data.
+
+Cases (inputs from benchmarks/synthetic.py, with known true lambdas):
+    stage1        parse a generated odds table (run_stage1)
+    stage3        stage 2 normalisation + stage 3 lambda estimation; accuracy
+                  is the median relative error of the recovered win shares
+    stage4        stage 4 on the stage 2 output (run_stage4)
+    stage4_batch  mu_sigma_batch over one market per race
+    stage5        long frame, design, full OLS and (small fields) stepwise
+                  selection on a drivers x races positions matrix
+    monte_carlo   MonteCarloF1Simulator: exponential times, positions and win
+                  frequencies; accuracy is the max abs error vs true shares
+
+Each case runs once to warm up, then --repeat times for wall / CPU time, then once more under
+tracemalloc for peak memory (src/f1_time_rank/profiling.py records both, including the
+sub-steps). A case whose estimated memory exceeds --max-mem-gb is recorded
+as skipped. Results go to benchmarks/results/<UTC time>_<commit>.json.
+--compare prints the time and memory ratios against the latest earlier
+results file with the same parameters.
+
+Scales: --tier small (20 drivers, 25 races, 1e3 sims), medium (500, 2000,
+1e4) or large (10000, 100000, 1e5); --drivers / --races / --sims override.
+
+Usage: python benchmarks/run_suite.py
+       python benchmarks/run_suite.py --tier medium --cases stage3 stage5 --compare
+       python benchmarks/run_suite.py --drivers 5000 --races 500 --sims 2000
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.append(os.path.dirname(__file__))
+
+from f1_time_rank.profiling import PROFILER
+from synthetic import (make_odds_table, write_odds_table, make_positions, make_markets,
+                       team_names)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+TIERS = {
+    'small': {'drivers': 20, 'races': 25, 'sims': 1_000},
+    'medium': {'drivers': 500, 'races': 2_000, 'sims': 10_000},
+    'large': {'drivers': 10_000, 'races': 100_000, 'sims': 100_000},
+}
+# Monte Carlo races per simulation (the engine's default season length)
+MC_RACES = 25
+
+
+def _quiet(fn, *args, **kwargs):
+    """Run fn with stdout silenced (the stages print progress)."""
+    with open(os.devnull, 'w') as devnull:
+        old, sys.stdout = sys.stdout, devnull
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            sys.stdout = old
+
+
+# Every case: setup(params, tmp) -> state (not timed), run(state) -> dict of
+# extra fields (accuracy, ...), work(params) -> (units, unit), mem(params) -> bytes
+
+def setup_odds(p, tmp):
+    from f1_time_rank.stages.stage1_extract import run_stage1
+    from f1_time_rank.stages.stage2_probabilities import run_stage2
+    df, lam = make_odds_table(p['drivers'], seed=p['seed'])
+    paths = {k: os.path.join(tmp, f'{k}.csv') for k in ('odds', 'stage1', 'stage2', 'stage3', 'stage4')}
+    write_odds_table(df, paths['odds'])
+    _quiet(run_stage1, paths['odds'], paths['stage1'])
+    _quiet(run_stage2, paths['stage1'], paths['stage2'])
+    return {'paths': paths, 'lam': lam}
+
+
+def run_stage1_case(s):
+    from f1_time_rank.stages.stage1_extract import run_stage1
+    _quiet(run_stage1, s['paths']['odds'], s['paths']['stage1'])
+    return {}
+
+
+def run_stage3_case(s):
+    from f1_time_rank.stages.stage2_probabilities import run_stage2
+    from f1_time_rank.stages.stage3_estimate_lambda import run_stage3
+    _quiet(run_stage2, s['paths']['stage1'], s['paths']['stage2'])
+    out = _quiet(run_stage3, s['paths']['stage2'], s['paths']['stage3'])
+    share = out['lambda_est'].values / out['lambda_est'].values.sum()
+    truth = s['lam'] / s['lam'].sum()
+    return {'accuracy': {'median_rel_err_share': float(np.median(np.abs(share / truth - 1)))}}
+
+
+def run_stage4_case(s):
+    from f1_time_rank.stages.stage4_mu_sigma import run_stage4
+    _quiet(run_stage4, s['paths']['stage2'], s['paths']['stage4'])
+    return {}
+
+
+def setup_markets(p, tmp):
+    return {'p': make_markets(p['races'], p['drivers'], seed=p['seed'])}
+
+
+def run_stage4_batch_case(s):
+    from f1_time_rank.stages.stage4_mu_sigma import mu_sigma_batch
+    mu_sigma_batch(s['p'])
+    return {}
+
+
+def setup_positions(p, tmp):
+    pos, lam = make_positions(p['drivers'], p['races'], seed=p['seed'])
+    return {'pos': pos, 'teams': team_names(p['drivers']), 'max_stepwise': p['max_stepwise_teams']}
+
+
+def run_stage5_case(s):
+    from f1_time_rank.profiling import step
+    from f1_time_rank.stages.regression_engine import encode_categorical, build_design
+    from f1_time_rank.stages.stepwise import StepwiseOLS
+    from f1_time_rank.stages.stage5_regression import positions_frame, select_teams_stepwise
+    with step('frame', rows=s['pos'].size):
+        df = positions_frame(s['pos'], s['teams'])
+    with step('design'):
+        codes, levels = encode_categorical(df['constructor'].values, reference='Williams')
+        X, names = build_design(len(df), numeric={'driverorder2': df['driverorder2'].values},
+                                categorical={'constructor': (codes, levels)})
+        engine = StepwiseOLS.from_design(X, df['positionlabel'].values, names)
+    with step('fit_full'):
+        model = engine.fit(names)
+    extra = {'r2': float(model.rsquared)}
+    if len(levels) <= s['max_stepwise']:
+        with step('stepwise'):
+            selected, _ = select_teams_stepwise(df, engine=engine)
+        extra['selected_teams'] = len(selected)
+    return extra
+
+
+def setup_monte_carlo(p, tmp):
+    from f1_time_rank.validation.monte_carlo_simulation import MonteCarloF1Simulator
+    _, lam = make_odds_table(p['drivers'], seed=p['seed'])
+    sim = MonteCarloF1Simulator(n_simulations=p['sims'], n_drivers=p['drivers'], n_races=MC_RACES)
+    sim.lambda_theoretical = lam
+    return {'sim': sim, 'lam': lam, 'seed': p['seed']}
+
+
+def run_monte_carlo_case(s):
+    from f1_time_rank.profiling import step
+    sim = s['sim']
+    np.random.seed(s['seed'])
+    with step('simulate_exponential_times', rows=sim.n_simulations, unit='simulations'):
+        times = sim.simulate_exponential_times(sim.lambda_theoretical)
+    positions = np.zeros((sim.n_drivers, sim.n_races, sim.n_simulations))
+    with step('times_to_positions', rows=sim.n_simulations, unit='simulations'):
+        for k in range(sim.n_simulations):
+            positions[:, :, k] = sim.times_to_positions(times[:, :, k])
+    empirical = sim.calculate_empirical_probabilities(positions)
+    return {'accuracy': {'max_abs_err_win_prob': float(np.abs(empirical - s['lam']).max())}}
+
+
+CASES = {
+    'stage1': (setup_odds, run_stage1_case,
+               lambda p: (p['drivers'], 'drivers'), lambda p: 2e3 * p['drivers']),
+    'stage3': (setup_odds, run_stage3_case,
+               lambda p: (p['drivers'], 'drivers'), lambda p: 2e3 * p['drivers']),
+    'stage4': (setup_odds, run_stage4_case,
+               lambda p: (p['drivers'], 'drivers'), lambda p: 2e3 * p['drivers']),
+    'stage4_batch': (setup_markets, run_stage4_batch_case,
+                     lambda p: (p['races'], 'markets'), lambda p: 8 * 8.0 * p['races'] * p['drivers']),
+    'stage5': (setup_positions, run_stage5_case,
+               lambda p: (p['drivers'] * p['races'], 'rows'),
+               lambda p: 120.0 * p['drivers'] * p['races']),
+    'monte_carlo': (setup_monte_carlo, run_monte_carlo_case,
+                    lambda p: (p['sims'], 'simulations'),
+                    lambda p: 2 * 8.0 * p['drivers'] * MC_RACES * p['sims']),
+}
+
+
+def measure(name, params, repeat, tmp):
+    setup, run, work, mem = CASES[name]
+    units, unit = work(params)
+    result = {'case': name, 'units': units, 'unit': unit}
+    need_gb = mem(params) / 1e9
+    if need_gb > params['max_mem_gb']:
+        result['skipped'] = f'needs about {need_gb:.1f} GB > --max-mem-gb {params["max_mem_gb"]}'
+        return result
+    state = setup(params, tmp)
+    run(state)   # warm-up: lazy imports and first-call caches stay out of the timings
+    walls, cpus = [], []
+    for _ in range(repeat):
+        PROFILER.enable(trace_memory=False)
+        with PROFILER.step(name) as record:
+            extra = run(state)
+        PROFILER.disable()
+        walls.append(record['wall_s'])
+        cpus.append(record['cpu_s'])
+        timing_steps = PROFILER.report()['steps']
+    PROFILER.enable(trace_memory=True)
+    with PROFILER.step(name) as record:
+        run(state)
+    PROFILER.disable()
+    best = int(np.argmin(walls))
+    result.update({
+        'wall_s': walls[best], 'wall_runs': walls, 'cpu_s': cpus[best],
+        'throughput': units / walls[best] if walls[best] > 0 else None,
+        'peak_alloc_mb': record['peak_alloc_mb'], 'peak_rss_mb': record['peak_rss_mb'],
+        'steps': [{k: r.get(k) for k in ('path', 'wall_s', 'rows', 'unit')}
+                  for r in timing_steps[1:]],
+        **extra,
+    })
+    return result
+
+
+def git_commit():
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    try:
+        sha = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True).stdout.strip())
+        return sha, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', None
+
+
+def compare(current, previous):
+    print(f"\nvs {previous['commit']} ({previous['date']}):")
+    print(f"{'case':<14} {'wall':>10} {'before':>10} {'ratio':>7} {'alloc MB':>9} {'before':>9}")
+    old = {c['case']: c for c in previous['cases']}
+    for c in current['cases']:
+        o = old.get(c['case'])
+        if o is None or 'wall_s' not in c or 'wall_s' not in o:
+            print(f"{c['case']:<14} {'(no comparable result)':>30}")
+            continue
+        print(f"{c['case']:<14} {c['wall_s']:>10.4f} {o['wall_s']:>10.4f} {c['wall_s'] / o['wall_s']:>7.2f} "
+              f"{c['peak_alloc_mb']:>9.1f} {o['peak_alloc_mb']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tier', choices=sorted(TIERS), default='small')
+    parser.add_argument('--drivers', type=int)
+    parser.add_argument('--races', type=int)
+    parser.add_argument('--sims', type=int)
+    parser.add_argument('--cases', nargs='*', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-mem-gb', type=float, default=4.0,
+                        help='skip cases estimated to need more memory')
+    parser.add_argument('--max-stepwise-teams', type=int, default=50,
+                        help='stage 5: run stepwise selection only up to this many teams')
+    parser.add_argument('--output', default=RESULTS_DIR, help='results directory')
+    parser.add_argument('--compare', action='store_true', help='compare with the previous results file')
+    args = parser.parse_args()
+
+    params = dict(TIERS[args.tier])
+    for key in ('drivers', 'races', 'sims'):
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    params.update(seed=args.seed, max_mem_gb=args.max_mem_gb,
+                  max_stepwise_teams=args.max_stepwise_teams)
+    commit, dirty = git_commit()
+    report = {
+        'commit': commit, 'dirty': dirty,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'numpy': np.__version__,
+        'machine': platform.platform(), 'cpu_count': os.cpu_count(),
+        'tier': args.tier, 'params': params, 'cases': [],
+    }
+    print(f"tier {args.tier}: {params['drivers']} drivers, {params['races']} races, "
+          f"{params['sims']} simulations (commit {commit}{'+dirty' if dirty else ''})")
+    print(f"{'case':<14} {'wall s':>10} {'cpu s':>10} {'alloc MB':>9} {'throughput':>22}  notes")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.cases:
+            r = measure(name, params, args.repeat, tmp)
+            report['cases'].append(r)
+            if 'skipped' in r:
+                print(f"{name:<14} {'skipped':>10}   {r['skipped']}")
+                continue
+            notes = ', '.join(f'{k} {v:.3g}' for k, v in r.get('accuracy', {}).items())
+            if 'r2' in r:
+                notes = f"R2 {r['r2']:.3f}" + (f", {r['selected_teams']} teams selected"
+                                               if 'selected_teams' in r else ', stepwise skipped')
+            print(f"{name:<14} {r['wall_s']:>10.4f} {r['cpu_s']:>10.4f} {r['peak_alloc_mb']:>9.1f} "
+                  f"{r['throughput']:>13,.0f} {r['unit'] + '/s':<8}  {notes}")
+
+    os.makedirs(args.output, exist_ok=True)
+    previous = sorted(f for f in os.listdir(args.output) if f.endswith('.json'))
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    path = os.path.join(args.output, f'{stamp}_{commit}.json')
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nResults -> {path}')
+    if args.compare:
+        # latest earlier run at the same scale
+        for name in reversed(previous):
+            with open(os.path.join(args.output, name)) as f:
+                earlier = json.load(f)
+            if earlier.get('params') == report['params']:
+                compare(report, earlier)
+                break
+        else:
+            print('No earlier results at these parameters to compare with')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Synthetic inputs with known ground truth, at any scale.
+
+Every generator starts from true race rates lambda (log-normal strengths) so
+benchmarks can check recovery as well as speed:
+  * make_odds_table: a bookmaker's outright-winner odds. Win probabilities
+    lambda_i / sum(lambda) carry an overround and are rounded to a fractional
+    price ladder, in the data/odds_table1.csv layout (Team ; Driver ; odds).
+  * make_positions: finishing positions from exponential race times with rates
+    lambda (the model of stages 3-6), in the data/f1seconddata.txt layout.
+  * make_markets: padded markets x drivers probability matrix for the batched
+    stage 4.
+Teams hold two consecutive drivers; the last team is 'Williams', the stage 5
+reference level.
+
+Usage (as a module): from synthetic import true_lambdas, make_odds_table, ...
+"""
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+
+# Fractional prices quoted by UK bookmakers (odds against), extended upwards
+# for large fields where win probabilities go down to 1e-5
+LADDER = [Fraction(s) for s in (
+    '1/10 1/8 1/6 1/5 2/9 1/4 2/7 1/3 4/11 2/5 4/9 1/2 4/7 8/13 4/6 8/11 4/5 5/6 10/11 '
+    '1 11/10 6/5 5/4 11/8 6/4 13/8 7/4 15/8 2 9/4 5/2 11/4 3 10/3 7/2 4 9/2 5 11/2 6 13/2 '
+    '7 15/2 8 9 10 11 12 14 16 18 20 22 25 28 33 40 50 66 80 100 125 150 200 250 300 400 '
+    '500 750 1000 1500 2000 2500 5000 7500 10000 25000 50000 100000').split()]
+_LADDER_LOG = np.log1p(np.array([float(f) for f in LADDER]))
+
+
+def true_lambdas(n_drivers, seed=0, spread=1.0):
+    """Race rates with log-normal spread, normalised to sum 1 (the scale of
+    lambda is not identified by win probabilities)."""
+    rng = np.random.default_rng(seed)
+    lam = np.exp(spread * rng.standard_normal(n_drivers))
+    return lam / lam.sum()
+
+
+def driver_names(n_drivers):
+    return [f'Driver{i:05d}' for i in range(n_drivers)]
+
+
+def team_names(n_drivers):
+    """Two consecutive drivers per team; the last team is 'Williams'."""
+    n_teams = (n_drivers + 1) // 2
+    names = [f'Team{j:04d}' for j in range(n_teams - 1)] + ['Williams']
+    return [names[i // 2] for i in range(n_drivers)]
+
+
+def to_fractional(p):
+    """Nearest ladder price (in log decimal odds) for win probabilities p."""
+    decimal_log = np.log(1.0 / np.asarray(p, dtype=float))
+    idx = np.clip(np.searchsorted(_LADDER_LOG, decimal_log), 1, len(LADDER) - 1)
+    lower = _LADDER_LOG[idx - 1]
+    idx = np.where(decimal_log - lower < _LADDER_LOG[idx] - decimal_log, idx - 1, idx)
+    return [f'{LADDER[i].numerator}/{LADDER[i].denominator}' for i in idx]
+
+
+def make_odds_table(n_drivers, seed=0, overround=0.2, lambdas=None):
+    """(odds DataFrame with Team, Driver, Bookmakers odds; true lambdas)."""
+    lam = true_lambdas(n_drivers, seed) if lambdas is None else np.asarray(lambdas)
+    implied = lam / lam.sum() * (1 + overround)
+    df = pd.DataFrame({'Team': team_names(n_drivers), 'Driver': driver_names(n_drivers),
+                       'Bookmakers odds': to_fractional(np.minimum(implied, 0.95))})
+    return df, lam
+
+
+def write_odds_table(df, path):
+    """Semicolon-separated, like data/odds_table1.csv."""
+    df.to_csv(path, sep=';', index=False)
+
+
+def make_positions(n_drivers, n_races, lambdas=None, seed=0, chunk=4096):
+    """(drivers x races positions, 1 = winner; true lambdas). Each race is
+    the ranking of independent Exp(lambda_i) times; races are drawn in chunks
+    to bound memory."""
+    rng = np.random.default_rng(seed)
+    lam = true_lambdas(n_drivers, seed) if lambdas is None else np.asarray(lambdas)
+    dtype = np.int16 if n_drivers < 2 ** 15 else np.int32
+    pos = np.empty((n_drivers, n_races), dtype=dtype)
+    ranks = np.arange(1, n_drivers + 1, dtype=dtype)
+    for start in range(0, n_races, chunk):
+        stop = min(start + chunk, n_races)
+        times = rng.exponential(1.0, (stop - start, n_drivers)) / lam
+        order = np.argsort(times, axis=1)
+        block = np.empty_like(order, dtype=dtype)
+        np.put_along_axis(block, order, ranks[None, :], axis=1)
+        pos[:, start:stop] = block.T
+    return pos, lam
+
+
+def write_positions_text(pos, names, path):
+    """Tab-separated matrix with the driver name in column 0, like
+    data/f1seconddata.txt."""
+    df = pd.DataFrame(pos)
+    df.insert(0, 'driver', names)
+    df.to_csv(path, sep='\t', header=False, index=False)
+
+
+def make_markets(n_markets, n_drivers, seed=0, min_field=None):
+    """Padded markets x drivers win-probability matrix (NaN = empty slot);
+    field sizes vary between min_field and n_drivers."""
+    rng = np.random.default_rng(seed)
+    min_field = max(2, n_drivers // 2) if min_field is None else min_field
+    sizes = rng.integers(min_field, n_drivers + 1, n_markets)
+    strength = np.exp(rng.standard_normal((n_markets, n_drivers)))
+    strength[np.arange(n_drivers)[None, :] >= sizes[:, None]] = np.nan
+    return strength / np.nansum(strength, axis=1, keepdims=True)
@@ -1,38 +1,25 @@
 """
-Orchestrator: run all stages in order. Outputs CSV at each stage in output/.
+Orchestrator: run all stages in order. Outputs a table at each stage in output/
+(CSV by default; Parquet / Arrow via config.OUTPUT_FORMAT or F1_OUTPUT_FORMAT).
+Source-checkout wrapper of src/f1_time_rank/pipeline.py (installed: f1-pipeline /
+python -m f1_time_rank.pipeline).
 Usage: python main.py         # runs full pipeline
        python main.py --stages 1 2   # run selected stages
+       python main.py --uncertainty rounding   # add lambda SEs/covariance (stages 3-4)
+       python main.py --stages 5 --bootstrap 100000   # bootstrap CIs for stage 5
+       python main.py --stages 5 --permutations 100000   # permutation test of driverorder2
+       python main.py --stages 5 --ordered logit   # also fit an ordered logit/probit
+       python main.py --stages 5 --mixed   # crossed random effects (driver, team, team-season)
+       python main.py --stages 6 --posterior   # Plackett-Luce fit + Gibbs posterior
+       python main.py --warehouse --event bahrain --bookmaker bet365   # also append to SQLite
 """
-import argparse
 import sys
 import os
 
-# Add src to path for imports
-sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
+# src first, so this checkout wins over an installed copy of the package
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from stages.stage1_extract import run_stage1
-from stages.stage2_probabilities import run_stage2
-from stages.stage3_estimate_lambda import run_stage3
-from stages.stage4_mu_sigma import run_stage4
-from stages.stage5_regression import run_stage5
-
-
-def main(run_stages=None):
-    if run_stages is None:
-        run_stages = [1,2,3,4,5]
-    if 1 in run_stages:
-        run_stage1()
-    if 2 in run_stages:
-        run_stage2()
-    if 3 in run_stages:
-        run_stage3()
-    if 4 in run_stages:
-        run_stage4()
-    if 5 in run_stages:
-        run_stage5()
+from f1_time_rank.pipeline import main, cli
 
 if __name__ == '__main__':
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--stages', nargs='*', type=int, help='stages to run (1..5)')
-    args = parser.parse_args()
-    main(args.stages)
\ No newline at end of file
+    cli()
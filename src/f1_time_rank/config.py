@@ -0,0 +1,54 @@
+import os
+from pathlib import Path
+
+# Project root: F1_ROOT if set, else the checkout holding src/f1_time_rank/
+# (also for an editable install), else the current directory (a regular
+# install puts the package in site-packages, whose parent is no project)
+_SRC = Path(__file__).resolve().parent.parent
+ROOT = Path(os.environ.get('F1_ROOT') or (_SRC.parent if _SRC.name == 'src' else Path.cwd()))
+DATA_DIR = ROOT / 'data'
+OUTPUT_DIR = ROOT / 'output'
+LOGS_DIR = ROOT / 'logs'
+MODELS_DIR = ROOT / 'models'
+CACHE_DIR = ROOT / '.cache'     # memoized designs keyed by input hash (created on first write)
+
+# Importing config has no side effects: writers create the directory they
+# write into (save_df, the results store, the design cache, the warehouse).
+
+# Format of the table outputs below: 'csv' (default, backward compatible),
+# 'parquet' or 'arrow' (Arrow IPC / Feather v2). The columnar formats keep
+# dtypes and exact floats and need pyarrow. Override with F1_OUTPUT_FORMAT.
+OUTPUT_FORMAT = os.environ.get('F1_OUTPUT_FORMAT', 'csv')
+OUTPUT_EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+if OUTPUT_FORMAT not in OUTPUT_EXTENSIONS:
+    raise ValueError(f"OUTPUT_FORMAT must be one of {sorted(OUTPUT_EXTENSIONS)}")
+OUTPUT_EXT = OUTPUT_EXTENSIONS[OUTPUT_FORMAT]
+
+# Filenames used across stages
+STAGE1_IN = DATA_DIR / 'odds_table1.csv'        # expected input for stage 1 (Team,Driver,Odds)
+STAGE1_OUT = OUTPUT_DIR / f'stage1_odds_parsed{OUTPUT_EXT}'
+
+STAGE2_OUT = OUTPUT_DIR / f'stage2_probabilities{OUTPUT_EXT}'   # contains raw_implied_p and p_norm
+
+STAGE3_OUT = OUTPUT_DIR / f'stage3_lambda{OUTPUT_EXT}'         # estimated lambda per driver
+STAGE3_COV_OUT = OUTPUT_DIR / f'stage3_lambda_cov{OUTPUT_EXT}' # optional lambda covariance (driver x driver)
+STAGE3_MARKETS_IN = DATA_DIR / 'odds_markets.csv'    # optional win/top-k odds (Team,Driver,Market,Odds)
+STAGE3_JOINT_OUT = OUTPUT_DIR / f'stage3_joint_lambda{OUTPUT_EXT}'  # lambda fitted to all markets jointly
+LIVE_RACE_OUT = OUTPUT_DIR / f'live_race{OUTPUT_EXT}'            # optional: positions conditioned on race events
+
+STAGE4_OUT = OUTPUT_DIR / f'stage4_mu_sigma{OUTPUT_EXT}'       # mu_i and sigma results
+
+STAGE5_IN = DATA_DIR / 'f1seconddata.txt'             # race positions, used by regression stage
+STAGE5_SEASON = 2022                                  # season of STAGE5_IN
+RESULTS_STORE_DIR = DATA_DIR / 'results_store'       # optional memory-mapped long-format results store
+STAGE5_OUT = OUTPUT_DIR / f'stage5_regression{OUTPUT_EXT}'     # regression coefficients and stats
+STAGE5_BOOT_OUT = OUTPUT_DIR / f'stage5_bootstrap{OUTPUT_EXT}'    # parametric bootstrap CIs / p-values
+STAGE5_LONG_IN = DATA_DIR / 'positions_long.csv'      # optional long format (positionlabel,driverorder2,constructor) for streaming
+STAGE5_ORDERED_OUT = OUTPUT_DIR / f'stage5_ordered{OUTPUT_EXT}'  # optional ordered logit/probit alternative to the OLS
+STAGE5_MIXED_OUT = OUTPUT_DIR / f'stage5_mixed{OUTPUT_EXT}'    # optional crossed random-effects fit (fixed effects)
+STAGE5_MIXED_VC_OUT = OUTPUT_DIR / f'stage5_mixed_vc{OUTPUT_EXT}'  # its variance components
+
+STAGE6_OUT = OUTPUT_DIR / f'stage6_plackett_luce{OUTPUT_EXT}'  # optional: lambdas fitted to finishing orders
+STAGE6_POSTERIOR_OUT = OUTPUT_DIR / f'stage6_posterior{OUTPUT_EXT}'  # optional: Gibbs posterior of the race rates
+
+WAREHOUSE_DB = OUTPUT_DIR / 'warehouse.sqlite'   # optional SQLite sink appending every run's outputs
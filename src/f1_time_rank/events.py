@@ -0,0 +1,162 @@
+"""
+Log levels and progress events for the stages and the Monte Carlo simulator.
+
+Stages log through get_logger(__name__) instead of print(). Messages take
+%-style arguments (log.info('wrote %s', path)), so a message below the active
+level is never formatted, and long listings (per group, per driver) go to
+DEBUG behind log.isEnabledFor(). configure() picks the level:
+    verbose   DEBUG    everything, including the per-group / per-driver tables
+    default   INFO     stage headers and results, as plain lines on stdout
+    quiet     WARNING  batch runs: warnings and errors only
+All loggers sit under 'f1', so a job runner can add its own handlers (a file,
+a JSON formatter) next to or instead of the console one.
+
+Long loops report through Progress: it counts work and, at most every
+min_interval seconds and once at the end, sends an event
+    {'task', 'done', 'total', 'unit', 'elapsed_s', 'rate', 'eta_s', 'final', 'time'}
+to the callbacks registered with add_progress_callback() and logs it at INFO.
+With no callback and INFO disabled, update() only adds to a counter.
+JsonLinesProgress(path) is a callback appending one JSON line per event, for
+a job monitor to tail.
+"""
+import json
+import logging
+import os
+import sys
+import time
+
+ROOT = 'f1'
+DEBUG, INFO, WARNING = logging.DEBUG, logging.INFO, logging.WARNING
+
+_callbacks = []
+
+
+class _ConsoleHandler(logging.StreamHandler):
+    """Message text on the current sys.stdout, so output captured with
+    contextlib.redirect_stdout behaves as it did with print()."""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+        self.setFormatter(logging.Formatter('%(message)s'))
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+    def handleError(self, record):
+        # output piped into head and closed: drop the rest quietly
+        if isinstance(sys.exc_info()[1], BrokenPipeError):
+            return
+        super().handleError(record)
+
+
+_root = logging.getLogger(ROOT)
+_console = next((h for h in _root.handlers if getattr(h, 'f1_console', False)), None)
+if _console is None:
+    _console = _ConsoleHandler()
+    _console.f1_console = True
+    _root.addHandler(_console)
+    _root.setLevel(INFO)
+    _root.propagate = False
+
+
+def get_logger(name):
+    """Logger 'f1.<name>' for a module (pass __name__)."""
+    return logging.getLogger(f'{ROOT}.{name}')
+
+
+def configure(quiet=False, verbose=False, level=None, console=True):
+    """Set the level of every f1 logger (level overrides quiet / verbose);
+    console=False drops the stdout handler, e.g. when a job runner attaches
+    its own."""
+    if level is None:
+        level = WARNING if quiet else DEBUG if verbose else INFO
+    _root.setLevel(level)
+    if console and _console not in _root.handlers:
+        _root.addHandler(_console)
+    elif not console:
+        _root.removeHandler(_console)
+
+
+def add_progress_callback(callback):
+    """Call callback(event) for every progress event; returns callback."""
+    _callbacks.append(callback)
+    return callback
+
+
+def remove_progress_callback(callback):
+    if callback in _callbacks:
+        _callbacks.remove(callback)
+
+
+class Progress:
+    """Rate-limited progress of one task. Use as a context manager (the final
+    event is sent on exit) or call close()."""
+
+    def __init__(self, task, total=None, unit='items', min_interval=1.0, logger=None):
+        self.task = task
+        self.total = total
+        self.unit = unit
+        self.min_interval = min_interval
+        self.done = 0
+        self._log = logger or get_logger('progress')
+        self._start = self._last = time.perf_counter()
+        self._active = bool(_callbacks) or self._log.isEnabledFor(INFO)
+        self._closed = False
+
+    def update(self, n=1):
+        self.done += n
+        if self._active:
+            now = time.perf_counter()
+            if now - self._last >= self.min_interval:
+                self._last = now
+                self._emit(now, final=False)
+
+    def close(self):
+        if self._active and not self._closed:
+            self._emit(time.perf_counter(), final=True)
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _emit(self, now, final):
+        elapsed = now - self._start
+        rate = self.done / elapsed if elapsed > 0 else None
+        eta = (self.total - self.done) / rate if rate and self.total is not None else None
+        event = {'task': self.task, 'done': self.done, 'total': self.total, 'unit': self.unit,
+                 'elapsed_s': elapsed, 'rate': rate, 'eta_s': eta, 'final': final,
+                 'time': time.time()}
+        for callback in list(_callbacks):
+            callback(event)
+        if self._log.isEnabledFor(INFO):
+            of_total = '' if self.total is None else f'/{self.total:,}'
+            speed = '' if rate is None else f', {rate:,.0f} {self.unit}/s'
+            left = f', {eta:.0f}s left' if eta and not final else ''
+            self._log.info('  %s: %s%s %s%s%s', self.task, f'{self.done:,}', of_total, self.unit,
+                           speed, left)
+
+
+class JsonLinesProgress:
+    """Progress callback writing one JSON object per event to path (appended)
+    or to an open text stream, flushed each time."""
+
+    def __init__(self, path):
+        self._own = isinstance(path, (str, os.PathLike))
+        self._file = open(path, 'a', encoding='utf-8') if self._own else path
+
+    def __call__(self, event):
+        self._file.write(json.dumps(event) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._own:
+            self._file.close()
@@ -0,0 +1,128 @@
+"""
+Orchestrator: run all stages in order. Outputs a table at each stage in output/
+(CSV by default; Parquet / Arrow via config.OUTPUT_FORMAT or F1_OUTPUT_FORMAT).
+
+Each stage module is imported only when its stage runs, so a short run such as
+--stages 1 loads pandas but not scipy.optimize, statsmodels or matplotlib.
+--profile records time, memory and rows per stage and sub-step (see profiling).
+--quiet / --verbose set the log level and --progress-log writes progress events
+as JSON lines (see events).
+
+Usage: f1-pipeline [options]                        # console script (pip install -e .)
+       python -m f1_time_rank.pipeline [options]    # same, as a module
+       python main.py [options]                     # from a source checkout
+"""
+import argparse
+
+
+def main(run_stages=None, uncertainty=None, bootstrap=None, permutations=None, posterior=False,
+         ordered=None, mixed=None, warehouse=None, event=None, bookmaker=None, profile=None,
+         profile_hook=None, quiet=False, verbose=False, progress_log=None):
+    from f1_time_rank import events
+    events.configure(quiet=quiet, verbose=verbose)
+    log = events.get_logger(__name__)
+    if progress_log:
+        events.add_progress_callback(events.JsonLinesProgress(progress_log))
+    if profile:
+        from f1_time_rank import profiling
+        profiling.enable(hook=profile_hook)
+        with profiling.step('pipeline'):
+            _run(run_stages, uncertainty, bootstrap, permutations, posterior, ordered, mixed,
+                 warehouse, event, bookmaker)
+        profiling.write_report(profile)
+        log.info('\n%s', profiling.PROFILER.summary())
+        log.info('Profile report -> %s', profile)
+    else:
+        _run(run_stages, uncertainty, bootstrap, permutations, posterior, ordered, mixed,
+             warehouse, event, bookmaker)
+
+
+def _run(run_stages, uncertainty, bootstrap, permutations, posterior, ordered, mixed,
+         warehouse, event, bookmaker):
+    if run_stages is None:
+        run_stages = [1,2,3,4,5]
+    if 1 in run_stages:
+        from f1_time_rank.stages.stage1_extract import run_stage1
+        run_stage1()
+    if 2 in run_stages:
+        from f1_time_rank.stages.stage2_probabilities import run_stage2
+        run_stage2()
+    if 3 in run_stages:
+        from f1_time_rank.stages.stage3_estimate_lambda import run_stage3
+        run_stage3(uncertainty=uncertainty)
+    if 4 in run_stages:
+        from f1_time_rank.config import STAGE3_COV_OUT
+        from f1_time_rank.stages.stage4_mu_sigma import run_stage4
+        run_stage4(lambda_cov_path=STAGE3_COV_OUT if uncertainty else None)
+    if 5 in run_stages:
+        from f1_time_rank.stages.stage5_regression import run_stage5
+        run_stage5(bootstrap=bootstrap, permutations=permutations)
+        if ordered:
+            from f1_time_rank.stages.ordered_regression import run_stage5_ordered
+            run_stage5_ordered(distr=ordered)
+        if mixed:
+            from f1_time_rank.stages.mixed_effects import run_stage5_mixed
+            run_stage5_mixed(input_path=mixed)
+    if 6 in run_stages:
+        from f1_time_rank.stages.stage6_plackett_luce import run_stage6
+        run_stage6()
+        if posterior:
+            from f1_time_rank.stages.stage6_posterior import run_stage6_posterior
+            run_stage6_posterior()
+    if warehouse:
+        from f1_time_rank.stages.warehouse import run_warehouse
+        stages = [f'stage{s}' for s in run_stages]
+        if 5 in run_stages:
+            stages += ['stage5_ordered'] * bool(ordered) + ['stage5_mixed'] * bool(mixed)
+        if 6 in run_stages and posterior:
+            stages.append('stage6_posterior')
+        run_warehouse(event=event, bookmaker=bookmaker, stages=stages, db_path=warehouse)
+
+
+def build_parser():
+    from f1_time_rank.config import OUTPUT_DIR, STAGE5_IN, WAREHOUSE_DB
+    parser = argparse.ArgumentParser(prog='f1-pipeline')
+    parser.add_argument('--stages', nargs='*', type=int, help='stages to run (1..5, 6 = optional Plackett-Luce fit)')
+    parser.add_argument('--uncertainty', choices=['rounding', 'residual'],
+                        help='propagate odds rounding or fit residuals to lambda SEs')
+    parser.add_argument('--bootstrap', type=int, metavar='B',
+                        help='parametric bootstrap of the stage 5 coefficients with B simulated seasons')
+    parser.add_argument('--permutations', type=int, metavar='P',
+                        help='within-team permutation test of driverorder2 with P relabellings')
+    parser.add_argument('--ordered', choices=['logit', 'probit'],
+                        help='with stage 5: ordered logit/probit of the positions as well as OLS')
+    parser.add_argument('--mixed', nargs='?', const=STAGE5_IN, metavar='PATH',
+                        help='with stage 5: REML mixed model with driver, team and team-season '
+                             'effects (PATH: long CSV of pooled seasons; default the stage 5 data)')
+    parser.add_argument('--posterior', action='store_true',
+                        help='with stage 6: Gibbs posterior of the race rates (prior from stage 3)')
+    parser.add_argument('--warehouse', nargs='?', const=WAREHOUSE_DB, metavar='DB',
+                        help='append the outputs of the stages run to a SQLite warehouse '
+                             '(default output/warehouse.sqlite)')
+    parser.add_argument('--event', help='event label stored with --warehouse (default: odds file name)')
+    parser.add_argument('--bookmaker', help='bookmaker label stored with --warehouse')
+    parser.add_argument('--profile', nargs='?', const=OUTPUT_DIR / 'profile.json', metavar='JSON',
+                        help='write wall/CPU time, peak memory and rows per stage and sub-step '
+                             'as JSON (default output/profile.json)')
+    parser.add_argument('--profile-hook', choices=['cprofile', 'pyinstrument'],
+                        help='with --profile: also profile every function (.prof / .html next to the JSON)')
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument('--quiet', action='store_true',
+                           help='batch mode: log warnings and errors only')
+    verbosity.add_argument('--verbose', action='store_true',
+                           help='also log per-group / per-driver details')
+    parser.add_argument('--progress-log', metavar='JSONL',
+                        help='append rate-limited progress events (bootstrap, simulations) as JSON lines')
+    return parser
+
+
+def cli(argv=None):
+    """Console entry point (f1-pipeline)."""
+    args = build_parser().parse_args(argv)
+    main(args.stages, args.uncertainty, args.bootstrap, args.permutations, args.posterior,
+         args.ordered, args.mixed, args.warehouse, args.event, args.bookmaker, args.profile,
+         args.profile_hook, args.quiet, args.verbose, args.progress_log)
+
+
+if __name__ == '__main__':
+    cli()
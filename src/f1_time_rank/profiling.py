@@ -0,0 +1,224 @@
+"""
+Per-stage instrumentation: wall and CPU time, memory and work counts.
+
+Stages mark their work with step() blocks or the @profiled decorator. Nested
+steps get paths like 'stage3/minimize'. Recording is off until enable() is
+called (main.py --profile). A disabled step costs one attribute check, so the
+instrumentation stays in place in normal runs.
+
+Each record holds:
+    wall_s, cpu_s       perf_counter / process_time over the step
+    self_s              wall time outside the recorded sub-steps
+    peak_alloc_mb       tracemalloc peak above the allocations live at entry
+                        (Python and numpy buffers; only with trace_memory)
+    peak_rss_mb         process high-water RSS at step exit (ru_maxrss)
+    rows, unit          work done, e.g. 440 rows or 10000 simulations
+
+write_report() saves the records as JSON. With hook='cprofile' the whole run
+is also profiled function by function: the .prof file opens in snakeviz or
+pstats, and the top functions by cumulative time go into the JSON. With
+hook='pyinstrument' an HTML call tree is saved instead (pyinstrument is
+optional).
+"""
+import functools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+class Profiler:
+    """Collects step records; one module-level instance (PROFILER) is shared."""
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.hook = None
+        self.records = []
+        self._stack = []
+        self._hook_profiler = None
+        self._started = None
+
+    def enable(self, trace_memory=True, hook=None):
+        if hook not in (None, 'cprofile', 'pyinstrument'):
+            raise ValueError("hook must be None, 'cprofile' or 'pyinstrument'")
+        self.enabled = True
+        self.trace_memory = trace_memory
+        self.hook = hook
+        self.records, self._stack = [], []
+        self._started = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if hook == 'cprofile':
+            import cProfile
+            self._hook_profiler = cProfile.Profile()
+            self._hook_profiler.enable()
+        elif hook == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler as _Instrument
+            except ImportError:
+                raise ImportError('hook pyinstrument needs pyinstrument '
+                                  '(pip install pyinstrument)') from None
+            self._hook_profiler = _Instrument()
+            self._hook_profiler.start()
+
+    def disable(self):
+        if self.hook == 'cprofile' and self._hook_profiler is not None:
+            self._hook_profiler.disable()
+        elif self.hook == 'pyinstrument' and self._hook_profiler is not None:
+            self._hook_profiler.stop()
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.enabled = False
+
+    @contextmanager
+    def step(self, name, rows=None, unit='rows'):
+        """Record the enclosed block. Yields the record dict, so the caller
+        can fill in rows once they are known."""
+        if not self.enabled:
+            yield {}
+            return
+        parent = self._stack[-1] if self._stack else None
+        record = {'name': name, 'path': f"{parent['path']}/{name}" if parent else name,
+                  'depth': len(self._stack), 'rows': rows, 'unit': unit}
+        frame = {'path': record['path'], 'child_peak': 0}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if parent is not None:
+                # the parent's peak so far must survive the reset below
+                parent['child_peak'] = max(parent['child_peak'], peak)
+            frame['base'] = current
+            tracemalloc.reset_peak()
+        self._stack.append(frame)
+        self.records.append(record)
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = time.perf_counter() - wall0
+            record['cpu_s'] = time.process_time() - cpu0
+            self._stack.pop()
+            if self.trace_memory:
+                peak = max(tracemalloc.get_traced_memory()[1], frame['child_peak'])
+                record['peak_alloc_mb'] = max(peak - frame['base'], 0) / 2 ** 20
+                if parent is not None:
+                    parent['child_peak'] = max(parent['child_peak'], peak)
+            record['peak_rss_mb'] = _peak_rss_mb()
+            if record['rows'] and record['wall_s'] > 0:
+                record['rows_per_s'] = record['rows'] / record['wall_s']
+
+    def report(self, top=30):
+        """Machine-readable report: environment, step records (in start order)
+        and, with the cProfile hook, the top functions by cumulative time."""
+        # self time: what a step spent outside its recorded sub-steps (in the
+        # pipeline step that is mostly the lazy stage imports)
+        for record in self.records:
+            if 'wall_s' in record:
+                children = sum(r.get('wall_s', 0.0) for r in self.records
+                               if r['depth'] == record['depth'] + 1
+                               and r['path'].startswith(record['path'] + '/'))
+                record['self_s'] = record['wall_s'] - children
+        out = {
+            'started': self._started,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'argv': sys.argv,
+            'trace_memory': self.trace_memory,
+            'steps': self.records,
+        }
+        if self.hook == 'cprofile' and self._hook_profiler is not None:
+            import pstats
+            stats = pstats.Stats(self._hook_profiler)
+            rows = []
+            for (file, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+                rows.append({'function': f'{os.path.basename(file)}:{line}({func})',
+                             'ncalls': nc, 'tottime_s': tt, 'cumtime_s': ct})
+            out['functions'] = sorted(rows, key=lambda r: r['cumtime_s'], reverse=True)[:top]
+        return out
+
+    def write_report(self, path):
+        """Write report() as JSON at path; the hook output goes next to it
+        (<stem>.prof or <stem>.html). Stops recording."""
+        path = Path(path)
+        if self.enabled:
+            self.disable()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        report = self.report()
+        if self.hook == 'cprofile':
+            report['hook_output'] = str(path.with_suffix('.prof'))
+            self._hook_profiler.dump_stats(report['hook_output'])
+        elif self.hook == 'pyinstrument':
+            report['hook_output'] = str(path.with_suffix('.html'))
+            with open(report['hook_output'], 'w', encoding='utf-8') as f:
+                f.write(self._hook_profiler.output_html())
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=float)
+        return report
+
+    def summary(self):
+        """Indented text table of the step records."""
+        def fmt(value, spec):
+            return '' if value is None else format(value, spec)
+        self.report()
+        lines = [f"{'step':<40} {'wall s':>9} {'self s':>9} {'cpu s':>9} {'alloc MB':>9} "
+                 f"{'rss MB':>8} {'rows':>10}"]
+        for r in self.records:
+            lines.append(f"{'  ' * r['depth'] + r['name']:<40} {fmt(r.get('wall_s'), '.4f'):>9} "
+                         f"{fmt(r.get('self_s'), '.4f'):>9} "
+                         f"{fmt(r.get('cpu_s'), '.4f'):>9} {fmt(r.get('peak_alloc_mb'), '.1f'):>9} "
+                         f"{fmt(r.get('peak_rss_mb'), '.0f'):>8} {fmt(r['rows'], ''):>10}")
+        return '\n'.join(lines)
+
+
+PROFILER = Profiler()
+
+
+def enable(trace_memory=True, hook=None):
+    PROFILER.enable(trace_memory=trace_memory, hook=hook)
+
+
+def step(name, rows=None, unit='rows'):
+    """Context manager recording a step on the shared profiler."""
+    return PROFILER.step(name, rows=rows, unit=unit)
+
+
+def profiled(name, unit='rows'):
+    """Decorator recording a whole stage function. rows is taken from the
+    result when it is a table (len) or a fitted model (nobs)."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return fn(*args, **kwargs)
+            with PROFILER.step(name, unit=unit) as record:
+                result = fn(*args, **kwargs)
+                if record.get('rows') is None:
+                    if hasattr(result, 'nobs'):
+                        record['rows'] = int(result.nobs)
+                    elif hasattr(result, '__len__'):
+                        record['rows'] = len(result)
+                return result
+        return wrapper
+    return decorate
+
+
+def write_report(path):
+    return PROFILER.write_report(path)
@@ -0,0 +1,383 @@
+"""
+Model server: answers probability queries from fitted outputs held in memory,
+so pricing tools do not start Python, import scipy and reread output/ per query.
+
+Loaded once, and again whenever one of the files changes (polled):
+    stage 3 lambdas (required)       win / top-k / position / head-to-head
+    stage 4 mu and sigma             if present
+    Monte Carlo summary              simulated win frequencies, if present
+All answers come from tables built at load time: the analytic position matrix
+P(rank_i = r) (stage3_joint_lambda.position_probability_matrix), its
+cumulative sums and the head-to-head matrix lambda_i / (lambda_i + lambda_j)
+(exponential race times). Encoded responses are cached per query until the
+next reload. A reload that fails (e.g. a half-written file) keeps serving the
+previous tables.
+
+Transports (asyncio, one process, either or both):
+    --socket PATH   Unix socket, one JSON object per line each way:
+                    {"q": "h2h", "a": "Max Verstappen", "b": "Lewis Hamilton"}
+    --port N        HTTP on 127.0.0.1 with keep-alive: GET /h2h?a=...&b=...
+Queries (driver = name, case-insensitive, or row index):
+    drivers                  names, teams and lambdas
+    win [driver]             P(win)
+    podium [driver]          P(top 3)
+    top k [driver]           P(top k)
+    positions driver         P(rank = 1..n)
+    h2h a b                  P(a finishes ahead of b)
+    mu_sigma [driver]        stage 4 mu_hat and sigma_hat
+    simulated [driver]       Monte Carlo win frequencies
+    info                     files, their load time and the query cache size
+Errors are returned as {"error": message} (HTTP 400 / 404).
+
+Usage: f1-serve --socket /tmp/f1.sock --port 8765
+       python -m f1_time_rank.server --port 8765
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qsl
+
+import numpy as np
+
+from f1_time_rank.config import OUTPUT_DIR, STAGE3_OUT, STAGE4_OUT
+from f1_time_rank.utils import read_df
+from f1_time_rank.events import get_logger, configure as configure_logging
+
+log = get_logger(__name__)
+
+SIMULATION_SUMMARY = OUTPUT_DIR / 'monte_carlo_summary.json'
+# encoded answers kept per snapshot; cleared when full
+CACHE_SIZE = 100_000
+
+
+class UnknownQuery(LookupError):
+    """Query name the tables do not answer (HTTP 404)."""
+
+
+def _stamp(paths):
+    """(mtime_ns, size) of every path, None for missing files."""
+    out = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            out.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append(None)
+    return tuple(out)
+
+
+class ModelTables:
+    """Immutable snapshot of the served outputs and the derived tables."""
+
+    def __init__(self, lambda_path=STAGE3_OUT, mu_sigma_path=STAGE4_OUT,
+                 simulation_path=SIMULATION_SUMMARY):
+        from f1_time_rank.stages.stage3_joint_lambda import position_probability_matrix
+        self.paths = (lambda_path, mu_sigma_path, simulation_path)
+        self.stamp = _stamp(self.paths)
+        df = read_df(lambda_path)
+        self.drivers = [str(d) for d in df['Driver']]
+        self.teams = [str(t) for t in df['Team']] if 'Team' in df.columns else [None] * len(df)
+        lam = df['lambda_est'].to_numpy(dtype=float)
+        n = len(lam)
+        self.lam = lam
+        self.win = lam / lam.sum()
+        self.positions = position_probability_matrix(lam)              # n x n
+        self.cdf = np.minimum(np.cumsum(self.positions, axis=1), 1.0)  # P(rank <= k)
+        self.cdf[:, 0] = self.win
+        self.h2h = lam[:, None] / (lam[:, None] + lam[None, :])
+        self.h2h[np.arange(n), np.arange(n)] = np.nan
+        self._index = {name.lower(): i for i, name in enumerate(self.drivers)}
+
+        self.mu = self.sigma = None
+        if self.stamp[1] is not None:
+            ms = read_df(mu_sigma_path)
+            if len(ms) == n:
+                self.mu = ms['mu_hat'].to_numpy(dtype=float)
+                self.sigma = ms['sigma_hat'].to_numpy(dtype=float)
+        self.simulated = None
+        if self.stamp[2] is not None:
+            with open(simulation_path, encoding='utf-8') as f:
+                summary = json.load(f)
+            if summary.get('driver_names') == self.drivers:
+                self.simulated = np.asarray(summary['p_empirical'], dtype=float)
+                self.simulations = summary.get('n_simulations')
+        self.loaded_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    def driver(self, key):
+        if key is None:
+            raise ValueError('missing driver')
+        i = self._index.get(str(key).lower())
+        if i is None:
+            if str(key).isdigit() and int(key) < len(self.drivers):
+                return int(key)
+            raise KeyError(f'unknown driver {key!r}')
+        return i
+
+    def _per_driver(self, values, params):
+        """One value for params['driver'], or a name -> value map."""
+        if params.get('driver') is None:
+            return {'values': dict(zip(self.drivers, values.tolist()))}
+        i = self.driver(params['driver'])
+        return {'driver': self.drivers[i], 'value': float(values[i])}
+
+    def answer(self, q, params):
+        if q == 'win':
+            return self._per_driver(self.win, params)
+        if q in ('podium', 'top'):
+            k = 3 if q == 'podium' else int(params.get('k', 0))
+            if not 1 <= k <= len(self.drivers):
+                raise ValueError(f'k must be between 1 and {len(self.drivers)}')
+            return {'k': k, **self._per_driver(self.cdf[:, k - 1], params)}
+        if q == 'positions':
+            i = self.driver(params.get('driver'))
+            return {'driver': self.drivers[i], 'probabilities': self.positions[i].tolist()}
+        if q == 'h2h':
+            a, b = self.driver(params.get('a')), self.driver(params.get('b'))
+            if a == b:
+                raise ValueError('h2h needs two different drivers')
+            return {'a': self.drivers[a], 'b': self.drivers[b], 'value': float(self.h2h[a, b])}
+        if q == 'mu_sigma':
+            if self.mu is None:
+                raise LookupError('no stage 4 output loaded')
+            if params.get('driver') is None:
+                return {'mu_hat': dict(zip(self.drivers, self.mu.tolist())),
+                        'sigma_hat': float(self.sigma[0])}
+            i = self.driver(params['driver'])
+            return {'driver': self.drivers[i], 'mu_hat': float(self.mu[i]),
+                    'sigma_hat': float(self.sigma[i])}
+        if q == 'simulated':
+            if self.simulated is None:
+                raise LookupError('no Monte Carlo summary loaded')
+            return {'n_simulations': self.simulations, **self._per_driver(self.simulated, params)}
+        if q == 'drivers':
+            return {'drivers': [{'driver': d, 'team': t, 'lambda': float(l)}
+                                for d, t, l in zip(self.drivers, self.teams, self.lam)]}
+        raise UnknownQuery(f'unknown query {q!r}')
+
+
+class ModelServer:
+    """Serves one ModelTables snapshot at a time over asyncio transports."""
+
+    def __init__(self, lambda_path=STAGE3_OUT, mu_sigma_path=STAGE4_OUT,
+                 simulation_path=SIMULATION_SUMMARY, poll_interval=1.0):
+        self.paths = (lambda_path, mu_sigma_path, simulation_path)
+        self.poll_interval = poll_interval
+        self.tables = ModelTables(*self.paths)
+        self._cache = {}
+        self._failed_stamp = None
+        self.queries = 0
+        self.reloads = 0
+        log.info('Loaded %d drivers from %s', len(self.tables.drivers), lambda_path)
+
+    def respond(self, q, params):
+        """(status, encoded JSON) for one query; 200, 400 or 404."""
+        self.queries += 1
+        # answer and cache from one snapshot; swap() replaces both together
+        tables, cache = self.tables, self._cache
+        key = (q, tuple(sorted(params.items())))
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+        if q == 'info':
+            return 200, json.dumps(self.info()).encode()
+        try:
+            out = 200, json.dumps(tables.answer(q, params)).encode()
+        except UnknownQuery as e:
+            return 404, json.dumps({'error': str(e)}).encode()
+        except (KeyError, ValueError, LookupError) as e:
+            out = 400, json.dumps({'error': e.args[0] if e.args else str(e)}).encode()
+        if len(cache) >= CACHE_SIZE:
+            cache.clear()
+        cache[key] = out
+        return out
+
+    def info(self):
+        t = self.tables
+        return {'files': {str(p): s is not None for p, s in zip(t.paths, t.stamp)},
+                'drivers': len(t.drivers), 'loaded_at': t.loaded_at, 'reloads': self.reloads,
+                'queries': self.queries, 'cached': len(self._cache),
+                'mu_sigma': t.mu is not None, 'simulated': t.simulated is not None}
+
+    def load_if_changed(self):
+        """New ModelTables when a file changed, else None. Only reads
+        server state, so it can run on an executor thread."""
+        stamp = _stamp(self.paths)
+        if stamp in (self.tables.stamp, self._failed_stamp):
+            return None
+        try:
+            return ModelTables(*self.paths)
+        except Exception as e:     # mid-write or broken output: keep serving the old snapshot
+            log.warning('Reload failed, keeping previous tables: %r', e)
+            self._failed_stamp = stamp
+            return None
+
+    def swap(self, tables):
+        """Serve tables from now on, with an empty cache. Call it on the
+        thread that runs respond() (the event loop)."""
+        self.tables, self._cache = tables, {}
+        self.reloads += 1
+        log.info('Reloaded %d drivers (%s)', len(tables.drivers), tables.loaded_at)
+
+    def reload_if_changed(self):
+        """Synchronous load_if_changed() + swap(); True when swapped."""
+        tables = self.load_if_changed()
+        if tables is None:
+            return False
+        self.swap(tables)
+        return True
+
+    async def watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            # tables are built off the event loop and swapped on it, so no
+            # respond() can mix the old tables with the new cache
+            tables = await loop.run_in_executor(None, self.load_if_changed)
+            if tables is not None:
+                self.swap(tables)
+
+    async def handle_lines(self, reader, writer):
+        """Unix socket protocol: a JSON object per line, answered in order."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    q = request.pop('q')
+                    _, body = self.respond(q, {k: str(v) for k, v in request.items()})
+                except (ValueError, KeyError, AttributeError, TypeError):
+                    body = b'{"error": "expected a JSON object with a \\"q\\" field"}'
+                writer.write(body + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_http(self, reader, writer):
+        """Minimal HTTP/1.1: GET /<query>?params, keep-alive unless asked to close."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = request_line.rstrip().endswith(b'HTTP/1.1')
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    if header.lower().startswith(b'connection:'):
+                        keep_alive = b'close' not in header.lower()
+                try:
+                    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    break
+                url = urlsplit(target)
+                if method != 'GET':
+                    status, body = 405, b'{"error": "only GET is supported"}'
+                else:
+                    status, body = self.respond(url.path.strip('/'), dict(parse_qsl(url.query)))
+                reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found'}.get(status, 'Error')
+                writer.write(f'HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n'
+                             f'Content-Length: {len(body)}\r\n'
+                             f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+                             .encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path=None, host='127.0.0.1', port=None):
+        if socket_path is None and port is None:
+            raise ValueError('give a socket path, a port or both')
+        servers = []
+        if socket_path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            servers.append(await asyncio.start_unix_server(self.handle_lines, path=str(socket_path)))
+            log.info('Serving on unix socket %s', socket_path)
+        if port is not None:
+            servers.append(await asyncio.start_server(self.handle_http, host, port))
+            log.info('Serving HTTP on http://%s:%d/', host, port)
+        watcher = asyncio.create_task(self.watch()) if self.poll_interval else None
+        # SIGTERM stops serving cleanly (removes the socket file)
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        try:
+            await asyncio.gather(*(s.serve_forever() for s in servers))
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            if socket_path is not None and os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+
+class ModelClient:
+    """Blocking client for the Unix socket transport, one connection reused
+    across queries: ModelClient('/tmp/f1.sock').query('win', driver='Max Verstappen')."""
+
+    def __init__(self, socket_path, timeout=5.0):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(str(socket_path))
+        self._file = self._sock.makefile('rwb')
+
+    def query(self, q, **params):
+        self._file.write(json.dumps({'q': q, **params}).encode() + b'\n')
+        self._file.flush()
+        out = json.loads(self._file.readline())
+        if 'error' in out:
+            raise ValueError(out['error'])
+        return out
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='f1-serve')
+    parser.add_argument('--socket', metavar='PATH', help='Unix socket (JSON lines)')
+    parser.add_argument('--port', type=int, help='HTTP port')
+    parser.add_argument('--host', default='127.0.0.1', help='HTTP address (default 127.0.0.1)')
+    parser.add_argument('--lambdas', default=STAGE3_OUT, help='stage 3 output')
+    parser.add_argument('--mu-sigma', default=STAGE4_OUT, help='stage 4 output (optional)')
+    parser.add_argument('--simulation', default=SIMULATION_SUMMARY,
+                        help='Monte Carlo summary JSON (optional)')
+    parser.add_argument('--poll', type=float, default=1.0,
+                        help='seconds between checks for new outputs (0 = no reload)')
+    parser.add_argument('--quiet', action='store_true', help='log warnings and errors only')
+    return parser
+
+
+def cli(argv=None):
+    """Console entry point (f1-serve)."""
+    args = build_parser().parse_args(argv)
+    configure_logging(quiet=args.quiet)
+    if args.socket is None and args.port is None:
+        args.socket = str(OUTPUT_DIR / 'f1-serve.sock')
+    server = ModelServer(args.lambdas, args.mu_sigma, args.simulation, args.poll)
+    try:
+        asyncio.run(server.serve(args.socket, args.host, args.port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,144 @@
+"""
+Parametric bootstrap of the stage 5 regression driven by the exponential-race
+model.
+
+1. Fit one lambda per driver to the observed finishing orders (exponential
+   race = Plackett-Luce ranking model, stage 6 MM fit).
+2. Simulate B synthetic seasons: every race draws T_i ~ Exp(lambda_i) for
+   all drivers and ranks them.
+3. The design matrix (driverorder2 + the stepwise team dummies) does not
+   change between replicates, so X'X is factorized once and all B responses
+   are refit together: beta = solve(X'X, X'Y) with Y of shape (n_obs, B).
+
+Reports bootstrap SEs, basic (pivotal) CIs and bootstrap p-values next to the
+normal-theory t-intervals. The pivot is each replicate's deviation from the
+replicate mean, since the race model does not reproduce the observed team
+gaps exactly. Team selection is not redone per replicate.
+
+Input: data/f1seconddata.txt
+Output: output/stage5_bootstrap.csv
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+from scipy.linalg import cho_factor, cho_solve
+from scipy import stats
+from f1_time_rank.config import STAGE5_IN, STAGE5_BOOT_OUT
+from f1_time_rank.utils import save_df
+from f1_time_rank.events import get_logger, Progress, DEBUG, INFO
+from f1_time_rank.stages.regression_engine import encode_categorical, build_design, fit_ols
+from f1_time_rank.stages.stage5_regression import select_teams_stepwise, TEAMS_2022
+from f1_time_rank.stages.results_store import open_results
+from f1_time_rank.stages.stage6_plackett_luce import Rankings, fit_plackett_luce
+
+log = get_logger(__name__)
+
+
+def simulate_race_positions(lam, n_races, n_seasons, rng=None):
+    """Finishing positions (n_seasons, n_races, n_drivers) of exponential races."""
+    rng = np.random.default_rng(rng)
+    lam = np.asarray(lam, dtype=float)
+    times = rng.standard_exponential((n_seasons, n_races, len(lam))) / lam
+    order = np.argsort(times, axis=-1)
+    positions = np.empty(order.shape, dtype=np.int16)
+    ranks = np.broadcast_to(np.arange(1, len(lam) + 1, dtype=np.int16), order.shape)
+    np.put_along_axis(positions, order, ranks, axis=-1)
+    return positions
+
+
+def bootstrap_stage5(input_path=STAGE5_IN, output_path=STAGE5_BOOT_OUT, n_boot=100_000,
+                     teams=None, lambdas=None, alpha=0.05, batch_size=5_000, seed=None):
+    """Parametric bootstrap of the stage 5 coefficients.
+
+    Args:
+        teams: team dummies in the model (default: stepwise selection as in
+               run_stage5).
+        lambdas: per-driver rates in data order (default: fitted to the
+                 observed positions with fit_plackett_luce).
+        batch_size: seasons simulated and refit per block (bounds memory).
+
+    Returns:
+        DataFrame with one row per coefficient.
+    """
+    log.info('Stage 5 bootstrap: %d synthetic seasons from %s', n_boot, input_path)
+    store = open_results(input_path, teams=TEAMS_2022)
+    pos, driver_names, _ = store.positions_matrix()
+    df = store.regression_frame()
+    # (race, driver) cell of the positions matrix behind every frame row
+    rounds = np.unique(np.asarray(store.round[store.season_rows(store.seasons[-1])]))
+    race_of = np.searchsorted(rounds, df['race'].values)
+    driver_of = pd.Index(driver_names).get_indexer(df['driver'].values)
+    n_races = pos.shape[1]
+    if teams is None:
+        teams, _ = select_teams_stepwise(df)
+    codes, levels = encode_categorical(df['constructor'].values, reference='Williams', keep=teams)
+    X, names = build_design(len(df), numeric={'driverorder2': df['driverorder2'].values},
+                            categorical={'constructor': (codes, levels)})
+    model = fit_ols(X, df['positionlabel'].values, names)
+
+    if lambdas is None:
+        lambdas, _ = fit_plackett_luce(Rankings.from_positions(pos))
+    lambdas = np.asarray(lambdas, dtype=float)
+    if log.isEnabledFor(DEBUG):
+        log.debug('Race rates (share of win probability):')
+        for i in np.argsort(-lambdas)[:5]:
+            log.debug('  %-15s %.4f', driver_names[i], lambdas[i] / lambdas.sum())
+
+    # one factorization for every replicate
+    Xd = X.toarray()
+    factor = cho_factor(Xd.T @ Xd)
+    rng = np.random.default_rng(seed)
+    betas = np.empty((n_boot, len(names)))
+    with Progress('bootstrap', total=n_boot, unit='seasons', logger=log) as progress:
+        for start in range(0, n_boot, batch_size):
+            stop = min(start + batch_size, n_boot)
+            sim = simulate_race_positions(lambdas, n_races, stop - start, rng)
+            # simulated positions of the observed (race, driver) rows
+            Y = sim[:, race_of, driver_of].T.astype(float)
+            betas[start:stop] = cho_solve(factor, Xd.T @ Y).T
+            progress.update(stop - start)
+
+    est = model.params.values
+    # pivot: replicate error around the coefficients of the simulating model
+    # (the replicate mean), which the race model does not reproduce exactly
+    centered = betas - betas.mean(axis=0)
+    q_lo, q_hi = np.quantile(centered, [alpha / 2, 1 - alpha / 2], axis=0)
+    t_crit = stats.t.ppf(1 - alpha / 2, model.df_resid)
+    out = pd.DataFrame({
+        'term': names,
+        'Estimate': est,
+        'boot_mean': betas.mean(axis=0),
+        'boot_se': betas.std(axis=0, ddof=1),
+        'ci_lower': est - q_hi,
+        'ci_upper': est - q_lo,
+        # two-sided: how often the replicate error is as large as the estimate
+        'p_value_boot': (1 + (np.abs(centered) >= np.abs(est)).sum(axis=0)) / (n_boot + 1),
+        't_ci_lower': est - t_crit * model.bse.values,
+        't_ci_upper': est + t_crit * model.bse.values,
+        'p_value_t': model.pvalues.values,
+    })
+
+    if log.isEnabledFor(INFO):
+        log.info(f"\n{'Term':<15} {'Estimate':<10} {'Boot SE':<10} {'Boot CI':<20} {'t CI':<20} {'p boot':<8}")
+        log.info('-' * 90)
+        for _, row in out.iterrows():
+            boot_ci = f"[{row['ci_lower']:.3f}, {row['ci_upper']:.3f}]"
+            t_ci = f"[{row['t_ci_lower']:.3f}, {row['t_ci_upper']:.3f}]"
+            log.info(f"{row['term']:<15} {row['Estimate']:<10.4f} {row['boot_se']:<10.4f} "
+                     f"{boot_ci:<20} {t_ci:<20} {row['p_value_boot']:<8.4f}")
+
+    save_df(out, output_path)
+    log.info('\nStage 5 bootstrap done. Wrote -> %s', output_path)
+    return out
+
+
+if __name__ == '__main__':
+    bootstrap_stage5()
@@ -0,0 +1,123 @@
+"""
+Shared stage 5 design: data prep, encoding and cross-products done once.
+
+Stage 5 and the significance analysis both need the same long frame, the same
+team dummies (Williams = reference) and then several models on them (full,
+stepwise-selected, reduced). load_design() builds the full design
+[const, driverorder2, every team dummy] once together with X'X, X'y and y'y,
+and memoizes it by the SHA-256 of the input (file or results store): in memory for the process
+and as an .npz under .cache/ for later runs. Every model variant is then a
+submatrix solve on the Gram matrix (StepwiseOLS.fit), not a refit.
+
+Input: data/f1seconddata.txt
+"""
+import hashlib
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+import scipy.sparse as sp
+from f1_time_rank.config import STAGE5_IN, CACHE_DIR
+from f1_time_rank.stages.regression_engine import encode_categorical, build_design
+from f1_time_rank.stages.stepwise import StepwiseOLS
+from f1_time_rank.stages.results_store import open_results, content_hash
+from f1_time_rank.stages.stage5_regression import select_teams_stepwise, TEAMS_2022
+
+# bump when build_stage5_design, the column layout or the .npz format
+# changes: cached designs from older code are then rebuilt, not reused
+DESIGN_VERSION = 1
+_MEMO = {}
+
+
+class Stage5Design:
+    """Encoded stage 5 design with its cross-products.
+
+    Attributes: df (long frame), driver_names, X (CSR, all columns), names,
+    y, and engine (StepwiseOLS on X'X, X'y, y'y).
+    """
+
+    def __init__(self, df, driver_names, X, names, y, gram=None, xty=None):
+        self.df = df
+        self.driver_names = driver_names
+        self.X = X
+        self.names = list(names)
+        self.y = y
+        gram = (X.T @ X).toarray() if gram is None else gram
+        xty = X.T @ y if xty is None else xty
+        self.engine = StepwiseOLS(gram, xty, y @ y, len(y), self.names, y_sum=y.sum())
+
+    @property
+    def teams(self):
+        return [c for c in self.names if c not in ('const', 'driverorder2')]
+
+    def columns(self, teams=None):
+        """const, driverorder2 and the given team dummies in design order."""
+        teams = self.teams if teams is None else teams
+        return ['const', 'driverorder2'] + [t for t in self.teams if t in teams]
+
+    def fit(self, teams=None):
+        """OLSResult for const + driverorder2 + teams (default: all teams)."""
+        return self.engine.fit(self.columns(teams))
+
+    def select_teams(self, criterion='aic', direction='both'):
+        """Stepwise team selection on the cached Gram (see select_teams_stepwise)."""
+        return select_teams_stepwise(self.df, criterion, direction, engine=self.engine)
+
+    def _save(self, path):
+        X = self.X.tocsr()
+        np.savez(path, data=X.data, indices=X.indices, indptr=X.indptr, shape=X.shape,
+                 names=np.array(self.names), y=self.y, driver_names=np.asarray(self.driver_names, dtype=str),
+                 teams=np.asarray(self.df['constructor'].values, dtype=str),
+                 driverorder2=self.df['driverorder2'].values,
+                 gram=self.engine.gram, xty=self.engine.xty)
+
+    @classmethod
+    def _load(cls, path):
+        z = np.load(path)
+        X = sp.csr_matrix((z['data'], z['indices'], z['indptr']), shape=tuple(z['shape']))
+        df = pd.DataFrame({'positionlabel': z['y'], 'driverorder2': z['driverorder2'],
+                           'constructor': z['teams'].astype(object)})
+        names = [str(n) for n in z['names']]
+        return cls(df, z['driver_names'].astype(object), X, names, z['y'], z['gram'], z['xty'])
+
+
+def build_stage5_design(input_path=STAGE5_IN, teams=TEAMS_2022, reference='Williams'):
+    """Encode the full design from the results of input_path (no design
+    caching; text and CSV inputs are parsed in memory by open_results)."""
+    store = open_results(input_path, teams=teams)
+    _, driver_names, _ = store.positions_matrix()
+    df = store.regression_frame()[['positionlabel', 'driverorder2', 'constructor']]
+    codes, levels = encode_categorical(df['constructor'].values, reference=reference)
+    X, names = build_design(len(df), numeric={'driverorder2': df['driverorder2'].values},
+                            categorical={'constructor': (codes, levels)})
+    return Stage5Design(df, driver_names, X, names, df['positionlabel'].values)
+
+
+def load_design(input_path=STAGE5_IN, teams=TEAMS_2022, reference='Williams', disk=True):
+    """Stage5Design for input_path, memoized by file content.
+
+    The key is the file hash plus DESIGN_VERSION, the team list and the
+    reference level, so an edited data file, a different team mapping or a
+    change to the design code is rebuilt automatically.
+    """
+    digest = hashlib.sha256((content_hash(input_path) + f'|v{DESIGN_VERSION}|' + '|'.join(teams)
+                             + '|' + reference).encode()).hexdigest()[:32]
+    if digest in _MEMO:
+        return _MEMO[digest]
+    path = CACHE_DIR / f'stage5_design_{digest}.npz'
+    if disk and path.exists():
+        design = Stage5Design._load(path)
+    else:
+        design = build_stage5_design(input_path, teams, reference)
+        if disk:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            design._save(path)
+    _MEMO[digest] = design
+    return design
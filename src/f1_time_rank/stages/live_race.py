@@ -0,0 +1,406 @@
+"""
+Live race: conditional finishing-position probabilities from race events.
+
+Under the exponential model driver i finishes at T_i ~ Exp(lambda_i),
+independently. The exponential is memoryless, so whatever happened so far
+the residual times of the drivers still running are again independent
+Exp(lambda_i), and the stage 3 lambdas keep describing the rest of the race:
+    finish(d)    d takes the next classified position; the drivers still
+                 running race on for the positions behind it
+    retire(d)    d is out (not classified); the others race on without it
+    ahead(a, b)  a will finish ahead of b (both still running)
+Known orders are kept as chains c_1 < c_2 < ... < c_m. Given the order, the
+chain finishes like a pure-birth process: the first member after an
+Exp(L_1) time, the next after a further Exp(L_2), ..., with
+L_k = lambda_{c_k} + ... + lambda_{c_m}.
+
+The positions of the running drivers use the same log-time quadrature as
+stage3_joint_lambda:
+    P(rank_i = offset + m + 1) = int f_i(t) P(N_{-i}(t) = m) dt
+with N_{-i}(t) the number of other running drivers finished by t (a product
+of one linear factor per free driver and one pmf per chain). Every event
+rebuilds that product once and takes each driver out again by polynomial
+division, forward or backward whichever is stable at the node, so an event
+costs O(n^2) per node (about 100 nodes) and no simulation is involved.
+conditioned_monte_carlo() is the rejection-sampling check.
+
+Input: output/stage3_lambda.csv (Driver, lambda_est)
+Output: output/live_race.csv
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+from f1_time_rank.config import STAGE3_OUT, LIVE_RACE_OUT
+from f1_time_rank.utils import save_df, read_df
+from f1_time_rank.profiling import profiled
+from f1_time_rank.events import get_logger, DEBUG
+from f1_time_rank.stages.stage3_joint_lambda import _log_time_nodes
+
+log = get_logger(__name__)
+
+EVENTS = ('finish', 'retire', 'ahead')
+
+
+def _times_linear(G, a, q):
+    """G * (a + q z) for pmfs G (N, D + 1) and one factor per node."""
+    out = np.empty((G.shape[0], G.shape[1] + 1))
+    out[:, 0] = a * G[:, 0]
+    out[:, 1:-1] = a[:, None] * G[:, 1:] + q[:, None] * G[:, :-1]
+    out[:, -1] = q * G[:, -1]
+    return out
+
+
+def _times_pmf(G, p):
+    """G * p for pmfs G (N, D + 1) and p (N, m + 1)."""
+    out = np.zeros((G.shape[0], G.shape[1] + p.shape[1] - 1))
+    for c in range(p.shape[1]):
+        out[:, c:c + G.shape[1]] += p[:, c, None] * G
+    return out
+
+
+def _divide_linear(G, a, q):
+    """G / (a_i + q_i z) for every column i of a, q (N, S): (N, S, D).
+
+    Forward division multiplies rounding errors by q/a, backward by a/q, so
+    each node uses the direction with the ratio <= 1."""
+    N, D = G.shape[0], G.shape[1] - 1
+    fwd = np.empty(a.shape + (D,))
+    bwd = np.empty(a.shape + (D,))
+    with np.errstate(all='ignore'):
+        fwd[..., 0] = G[:, None, 0] / a
+        for m in range(1, D):
+            fwd[..., m] = (G[:, None, m] - q * fwd[..., m - 1]) / a
+        bwd[..., D - 1] = G[:, None, D] / q
+        for m in range(D - 1, 0, -1):
+            bwd[..., m - 1] = (G[:, None, m] - a * bwd[..., m]) / q
+    return np.where((a >= q)[..., None], fwd, bwd)
+
+
+def chain_pmf(lam_chain, t):
+    """P(c of the chain finished by t), shape (len(t), m + 1), for a chain of
+    drivers with rates lam_chain finishing in the given order."""
+    from scipy.linalg import expm
+    rates = np.cumsum(np.asarray(lam_chain, dtype=float)[::-1])[::-1]   # L_1 > ... > L_m
+    m = len(rates)
+    Q = np.zeros((m + 1, m + 1))
+    Q[np.arange(m), np.arange(m)] = -rates
+    Q[np.arange(1, m + 1), np.arange(m)] = rates
+    p = expm(t[:, None, None] * Q[None])[:, :, 0]
+    return np.clip(p, 0.0, 1.0)
+
+
+def running_positions(lam, chains=(), step=0.35):
+    """P(rank = r) among the drivers still running.
+
+    Args:
+        lam: lambdas of the running drivers, shape (n,). Only ratios matter.
+        chains: lists of indices into lam with a known finishing order
+                (disjoint; drivers in no chain are free).
+        step: log-time quadrature step.
+
+    Returns:
+        (n x n) matrix, rows = drivers, columns = positions among them.
+    """
+    lam = np.asarray(lam, dtype=float)
+    lam = lam / lam.sum()
+    n = len(lam)
+    P = np.zeros((n, n))
+    if n == 1:
+        P[0, 0] = 1.0
+        return P
+    chained = [i for c in chains for i in c]
+    free = np.setdiff1d(np.arange(n), chained)
+    t, w = _log_time_nodes(lam.min(), step=step)
+
+    lt = t[:, None] * lam[free][None, :]
+    a = np.exp(-lt)
+    q = -np.expm1(-lt)
+    G_free = np.ones((len(t), 1))
+    for s in range(len(free)):
+        G_free = _times_linear(G_free, a[:, s], q[:, s])
+    pmfs = [chain_pmf(lam[list(c)], t) for c in chains]
+    G = G_free
+    for p in pmfs:
+        G = _times_pmf(G, p)
+
+    # free drivers: density lambda_i exp(-lambda_i t), rivals = G without i
+    if len(free):
+        loo = _divide_linear(G, a, q)
+        dens = w[:, None] * lam[free][None, :] * a
+        P[free] = np.einsum('ts,tsm->sm', dens, loo)
+
+    # chain member k: density L_k P(N_chain(t) = k - 1), rivals = the other
+    # units, plus the k - 1 chain members already in
+    for c, p in zip(chains, pmfs):
+        rivals = G_free
+        for other, p_other in zip(chains, pmfs):
+            if other is not c:
+                rivals = _times_pmf(rivals, p_other)
+        rates = np.cumsum(lam[list(c)][::-1])[::-1]
+        for k, i in enumerate(c):
+            dens = w * rates[k] * p[:, k]
+            P[i, k:k + rivals.shape[1]] = dens @ rivals
+    return np.maximum(P, 0.0, out=P)
+
+
+class LiveRace:
+    """Conditional position probabilities, updated one race event at a time.
+
+    Args:
+        lambdas: stage 3 lambdas, one per driver (only ratios matter).
+        drivers: driver names (default '0', '1', ...).
+        step: log-time quadrature step (0.35 gives ~1e-9 accuracy).
+
+    positions[i, r] is P(driver i finishes in position r + 1 | events so far);
+    finished drivers have a 1 in their position, retired drivers an all-zero
+    row (not classified), and the last len(retired) columns are zero.
+    """
+
+    def __init__(self, lambdas, drivers=None, step=0.35):
+        self.lam = np.asarray(lambdas, dtype=float)
+        if self.lam.ndim != 1 or np.any(~(self.lam > 0)):
+            raise ValueError('lambdas must be a 1-d array of positive numbers')
+        n = len(self.lam)
+        self.drivers = [str(d) for d in drivers] if drivers is not None else [str(i) for i in range(n)]
+        if len(self.drivers) != n:
+            raise ValueError(f'{len(self.drivers)} driver names for {n} lambdas')
+        self.step = step
+        self.finished = []      # driver indices in finishing order
+        self.retired = []
+        self.chains = []        # driver indices with a known order, first to finish first
+        self.events = []
+        self._update()
+
+    def index(self, driver):
+        """Row of a driver given by name (case-insensitive) or index."""
+        if isinstance(driver, (int, np.integer)):
+            if not 0 <= driver < len(self.drivers):
+                raise ValueError(f'no driver {driver}')
+            return int(driver)
+        key = str(driver).strip().lower()
+        for i, name in enumerate(self.drivers):
+            if name.lower() == key:
+                return i
+        raise ValueError(f'unknown driver {driver!r}')
+
+    @property
+    def running(self):
+        out = set(self.finished) | set(self.retired)
+        return [i for i in range(len(self.lam)) if i not in out]
+
+    def _running(self, driver):
+        i = self.index(driver)
+        if i in self.finished:
+            raise ValueError(f'{self.drivers[i]} has already finished')
+        if i in self.retired:
+            raise ValueError(f'{self.drivers[i]} has retired')
+        return i
+
+    def _chain_of(self, i):
+        return next((c for c in self.chains if i in c), None)
+
+    def _drop(self, i):
+        chain = self._chain_of(i)
+        if chain is not None:
+            chain.remove(i)
+            if len(chain) < 2:
+                self.chains.remove(chain)
+
+    def finish(self, driver):
+        """driver takes the next classified position."""
+        i = self._running(driver)
+        chain = self._chain_of(i)
+        if chain is not None and chain[0] != i:
+            before = self.drivers[chain[chain.index(i) - 1]]
+            raise ValueError(f'{self.drivers[i]} cannot finish before {before}')
+        self._drop(i)
+        self.finished.append(i)
+        return self._record('finish', i)
+
+    def retire(self, driver):
+        """driver is out of the race; known orders among the others stay."""
+        i = self._running(driver)
+        self._drop(i)
+        self.retired.append(i)
+        return self._record('retire', i)
+
+    def ahead(self, a, b):
+        """a will finish ahead of b. Orders must form chains: b is not yet
+        ordered behind anyone and a not ahead of anyone (other than through
+        an existing chain a ... b)."""
+        i = self.index(a)
+        j = self.index(b)
+        if i == j:
+            raise ValueError('a driver cannot finish ahead of itself')
+        if j in self.finished:
+            if i in self.finished and self.finished.index(i) < self.finished.index(j):
+                return self._record('ahead', i, j)
+            raise ValueError(f'{self.drivers[j]} has already finished ahead of {self.drivers[i]}')
+        if i in self.finished:
+            return self._record('ahead', i, j)     # already true
+        self._running(i)
+        self._running(j)
+        ci, cj = self._chain_of(i), self._chain_of(j)
+        if ci is not None and ci is cj:
+            if ci.index(i) < ci.index(j):
+                return self._record('ahead', i, j)
+            raise ValueError(f'{self.drivers[j]} is already known to finish ahead of {self.drivers[i]}')
+        if (ci is not None and ci[-1] != i) or (cj is not None and cj[0] != j):
+            raise ValueError('only chains of known orders are supported: '
+                             f'{self.drivers[i]} must be last of its chain and '
+                             f'{self.drivers[j]} first of its chain')
+        head = ci if ci is not None else [i]
+        tail = cj if cj is not None else [j]
+        self.chains = [c for c in self.chains if c is not ci and c is not cj] + [head + tail]
+        return self._record('ahead', i, j)
+
+    def apply(self, events):
+        """Apply (kind, driver[, driver]) tuples in order, e.g.
+        [('retire', 'Lando Norris'), ('ahead', 'Max Verstappen', 'Sergio Perez')]."""
+        for kind, *args in events:
+            if kind not in EVENTS:
+                raise ValueError(f'unknown event {kind!r} (expected one of {EVENTS})')
+            getattr(self, kind)(*args)
+        return self
+
+    def _record(self, kind, *rows):
+        self.events.append((kind,) + tuple(self.drivers[r] for r in rows))
+        self._update()
+        if log.isEnabledFor(DEBUG):
+            log.debug('  %s %s: %d running, %d chains', kind,
+                      ' > '.join(self.drivers[r] for r in rows), len(self.running), len(self.chains))
+        return self
+
+    def _update(self):
+        n = len(self.lam)
+        P = np.zeros((n, n))
+        P[self.finished, np.arange(len(self.finished))] = 1.0
+        running = self.running
+        if running:
+            local = {d: k for k, d in enumerate(running)}
+            chains = [[local[d] for d in c] for c in self.chains]
+            offset = len(self.finished)
+            P[np.ix_(running, np.arange(offset, offset + len(running)))] = \
+                running_positions(self.lam[running], chains, self.step)
+        self.positions = P
+
+    @property
+    def win(self):
+        return self.positions[:, 0]
+
+    def top(self, k):
+        """P(finish in the first k positions) per driver."""
+        return self.positions[:, :k].sum(axis=1)
+
+    def table(self):
+        """One row per driver: status, win / podium probability, expected
+        position (NaN if retired) and P1..Pn."""
+        P = self.positions
+        status = ['running'] * len(self.lam)
+        for pos, i in enumerate(self.finished):
+            status[i] = f'P{pos + 1}'
+        for i in self.retired:
+            status[i] = 'DNF'
+        expected = P @ np.arange(1, P.shape[1] + 1)
+        expected[self.retired] = np.nan
+        df = pd.DataFrame({'Driver': self.drivers, 'status': status, 'p_win': self.win,
+                           'p_podium': self.top(3), 'expected_position': expected})
+        pos_cols = pd.DataFrame(P, columns=[f'P{r + 1}' for r in range(P.shape[1])])
+        return pd.concat([df, pos_cols], axis=1)
+
+
+def conditioned_monte_carlo(lambdas, finished=(), retired=(), ahead=(), n_sims=200_000,
+                            seed=None, batch=100_000, max_draws=50_000_000):
+    """Position frequencies of the full model conditioned by rejection.
+
+    Draws T_i ~ Exp(lambda_i) for everyone not retired and keeps the draws
+    where the finished drivers come first in the given order and every
+    (a, b) in ahead has T_a < T_b. As in LiveRace.retire, a retired driver's
+    own pairs are dropped but the orders implied through them stay: a < d
+    and d < b with d retired still require a < b. Returns (frequencies
+    (n x n) in the LiveRace.positions layout, accepted draws). Indices, not
+    names.
+    """
+    lam = np.asarray(lambdas, dtype=float)
+    n = len(lam)
+    rng = np.random.default_rng(seed)
+    field = np.array([i for i in range(n) if i not in set(retired)])
+    col = {d: k for k, d in enumerate(field)}
+    fin = [col[d] for d in finished]
+    # transitive closure of the known orders, then restricted to the field
+    implied = {(int(a), int(b)) for a, b in ahead}
+    while True:
+        extra = {(a, c) for a, b in implied for b2, c in implied if b == b2} - implied
+        if not extra:
+            break
+        implied |= extra
+    pairs = [(col[a], col[b]) for a, b in sorted(implied) if a in col and b in col]
+    counts = np.zeros((n, n))
+    accepted = draws = 0
+    while accepted < n_sims and draws < max_draws:
+        T = rng.exponential(1.0 / lam[field], size=(batch, len(field)))
+        draws += batch
+        ok = np.ones(batch, dtype=bool)
+        if fin:
+            rest = np.delete(T, fin, axis=1)
+            ok &= T[:, fin[-1]] < rest.min(axis=1, initial=np.inf)
+            for x, y in zip(fin, fin[1:]):
+                ok &= T[:, x] < T[:, y]
+        for x, y in pairs:
+            ok &= T[:, x] < T[:, y]
+        T = T[ok][:n_sims - accepted]
+        if len(T):
+            ranks = T.argsort(axis=1).argsort(axis=1)
+            for k, d in enumerate(field):
+                counts[d, :len(field)] += np.bincount(ranks[:, k], minlength=len(field))
+            accepted += len(T)
+    if accepted == 0:
+        raise ValueError('no draw satisfied the events')
+    return counts / accepted, accepted
+
+
+def parse_event(text):
+    """'finish=NAME', 'retire=NAME' or 'ahead=A>B' -> event tuple."""
+    kind, _, args = str(text).partition('=')
+    kind = kind.strip().lower()
+    if kind not in EVENTS or not args:
+        raise ValueError(f"bad event {text!r}: expected finish=NAME, retire=NAME or ahead=A>B")
+    if kind == 'ahead':
+        a, sep, b = args.partition('>')
+        if not sep:
+            raise ValueError(f"bad event {text!r}: expected ahead=A>B")
+        return kind, a.strip(), b.strip()
+    return kind, args.strip()
+
+
+@profiled('live_race')
+def run_live_race(events=(), input_path=STAGE3_OUT, output_path=LIVE_RACE_OUT):
+    log.info('Live race: conditioning %s on %d events', input_path, len(events))
+    df = read_df(input_path)
+    race = LiveRace(df['lambda_est'].values, df['Driver'].values)
+    race.apply(parse_event(e) if isinstance(e, str) else e for e in events)
+    out = race.table()
+    save_df(out, output_path)
+    if log.isEnabledFor(DEBUG):
+        log.debug(out[['Driver', 'status', 'p_win', 'p_podium', 'expected_position']]
+                  .sort_values('expected_position').to_string(index=False))
+    log.info('Live race done (%d finished, %d retired). Wrote -> %s',
+             len(race.finished), len(race.retired), output_path)
+    return out
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Condition the stage 3 model on race events.')
+    parser.add_argument('events', nargs='*',
+                        help="in order: finish=NAME, retire=NAME or ahead=A>B")
+    args = parser.parse_args()
+    run_live_race(args.events)
@@ -0,0 +1,249 @@
+"""
+Crossed random-effects alternative to the stage 5 OLS, for pooled seasons.
+
+The team dummies of stage 5 are fixed per season and assume two drivers per
+team listed in order. Pooling seasons (drivers change teams, teams change
+pace) is handled by the linear mixed model
+    positionlabel = b0 + b1 * driverorder2 + driver + team + team:season + e
+with independent Gaussian random effects per driver, team and team-season.
+It is fitted by REML the way lme4 does (Bates et al. 2015): with relative
+scales theta and Lambda = diag(theta per random column),
+    L L' = Lambda Z'Z Lambda + I          (sparse factorization, q x q)
+    R_X' R_X = X'X - X'Z Lambda (L L')^-1 Lambda Z'X     (p x p Schur complement)
+    REML deviance = log|L L'| + log|R_X' R_X| + (n-p) (1 + log(2 pi r2 / (n-p)))
+where r2 is the penalized residual sum of squares. Everything after one pass
+over the data works on Z'Z, Z'X, Z'y, X'X, X'y, y'y only, so each deviance
+evaluation is a sparse factorization of a matrix the size of the number of
+levels; theta (three numbers) is optimized with L-BFGS-B on [0, inf).
+
+Single-season data: team and team-season are the same grouping, so
+team-season is dropped automatically.
+
+Input: data/f1seconddata.txt (one season), a results store directory, or a
+       long CSV with columns season, race, driver, constructor,
+       positionlabel[, driverorder2]
+Output: output/stage5_mixed.csv (fixed effects), output/stage5_mixed_vc.csv
+        (variance components)
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import minimize
+from scipy import stats
+from f1_time_rank.config import STAGE5_IN, STAGE5_MIXED_OUT, STAGE5_MIXED_VC_OUT
+from f1_time_rank.utils import save_df
+from f1_time_rank.profiling import profiled, step
+from f1_time_rank.events import get_logger, INFO
+from f1_time_rank.stages.results_store import open_results
+from f1_time_rank.stages.stage5_regression import TEAMS_2022
+
+log = get_logger(__name__)
+
+
+def teammate_order(df):
+    """driverorder2 for long data: 0 for the first driver listed for a team in
+    a season (the lead driver, as in f1seconddata.txt), 1 for any other."""
+    first = df.drop_duplicates(['season', 'constructor'])[['season', 'constructor', 'driver']]
+    first = first.rename(columns={'driver': '_lead'})
+    merged = df[['season', 'constructor', 'driver']].merge(first, on=['season', 'constructor'], how='left')
+    return (merged['driver'].values != merged['_lead'].values).astype(float)
+
+
+def read_mixed_frame(path):
+    """Long frame with season, driver, constructor, positionlabel, driverorder2
+    from a long CSV, a results store directory (all seasons) or the positions
+    matrix."""
+    if str(path).endswith('.csv'):
+        df = pd.read_csv(path, dtype={'driver': str, 'constructor': str})
+        if 'driverorder2' not in df:
+            df['driverorder2'] = teammate_order(df)
+    else:
+        df = open_results(path, teams=TEAMS_2022).regression_frame(season='all')
+    return df[np.isfinite(df['positionlabel'].values.astype(float))].reset_index(drop=True)
+
+
+def _same_partition(a, b):
+    pairs = len(pd.MultiIndex.from_arrays([a, b]).unique())
+    return pairs == len(np.unique(a)) == len(np.unique(b))
+
+
+class MixedResult:
+    """REML fit: fixed effects with the stage 5 attribute names, variance
+    components and the predicted random effects (BLUPs)."""
+
+    def __init__(self, names, params, cov, sigma2, theta, factors, ranef, deviance, nobs):
+        self.params = pd.Series(params, index=names)
+        self._cov = pd.DataFrame(cov, index=names, columns=names)
+        self.bse = pd.Series(np.sqrt(np.diag(cov)), index=names)
+        self.tvalues = self.params / self.bse
+        # Wald z (no denominator degrees of freedom, as lme4)
+        self.pvalues = pd.Series(2 * stats.norm.sf(np.abs(self.tvalues.values)), index=names)
+        self.scale = sigma2
+        self.theta = pd.Series(theta, index=list(factors))
+        self.ranef = ranef
+        self.reml_deviance = deviance
+        self.nobs = nobs
+        variances = np.append(np.asarray(theta) ** 2 * sigma2, sigma2)
+        self.variance_components = pd.DataFrame({
+            'component': list(factors) + ['Residual'],
+            'variance': variances,
+            'sd': np.sqrt(variances),
+            'share': variances / variances.sum(),
+            'n_levels': [len(ranef[f]) for f in factors] + [nobs],
+        })
+        k = len(params) + len(theta) + 1
+        self.aic = deviance + 2 * k
+
+    def cov_params(self):
+        """Covariance of the estimates (a method, as in statsmodels)."""
+        return self._cov.copy()
+
+    def conf_int(self, alpha=0.05):
+        """Wald confidence intervals, columns 0 (lower) and 1 (upper)."""
+        q = stats.norm.ppf(1 - alpha / 2)
+        return pd.DataFrame({0: self.params - q * self.bse, 1: self.params + q * self.bse})
+
+    def coef_table(self, X=None):
+        """Coefficient table in the stage5_regression.csv layout; r2 is the
+        marginal R^2 (fixed-effect variance share) when X is given."""
+        coef = self.params.rename('Estimate').to_frame().reset_index().rename(columns={'index': 'term'})
+        coef['Std_Error'] = self.bse.values
+        coef['t_value'] = self.tvalues.values
+        coef['p_value'] = self.pvalues.values
+        if X is not None:
+            var_fixed = float(np.var(X @ self.params.values))
+            coef['r2'] = var_fixed / (var_fixed + self.variance_components['variance'].sum())
+        coef['aic'] = self.aic
+        return coef
+
+
+class CrossedMixedModel:
+    """Linear mixed model with independent random intercepts per factor.
+
+    Args:
+        X: fixed-effects design (dense or sparse), n x p.
+        y: response.
+        names: fixed-effect names.
+        groups: dict {factor name: array of group labels} (n each).
+    """
+
+    def __init__(self, X, y, names, groups):
+        y = np.asarray(y, dtype=float)
+        X = sp.csr_matrix(X)
+        n = len(y)
+        self.names = list(names)
+        self.factors, self.levels, blocks = [], {}, []
+        for name, labels in groups.items():
+            levels, codes = np.unique(np.asarray(labels), return_inverse=True)
+            if any(_same_partition(labels, prev) for prev in
+                   [groups[f] for f in self.factors]):
+                continue
+            self.factors.append(name)
+            self.levels[name] = levels
+            blocks.append(sp.csr_matrix((np.ones(n), (np.arange(n), codes)), shape=(n, len(levels))))
+        Z = sp.hstack(blocks).tocsr()
+        self.block = np.repeat(np.arange(len(blocks)), [b.shape[1] for b in blocks])
+        self.ZtZ = (Z.T @ Z).tocsc()
+        self.ZtX = (Z.T @ X).toarray()
+        self.Zty = Z.T @ y
+        self.XtX = (X.T @ X).toarray()
+        self.Xty = X.T @ y
+        self.yty = float(y @ y)
+        self.n, self.p, self.q = n, X.shape[1], Z.shape[1]
+        self.X = X
+
+    def _solve(self, theta):
+        lam = np.asarray(theta, dtype=float)[self.block]
+        A = (sp.diags(lam) @ self.ZtZ @ sp.diags(lam) + sp.identity(self.q)).tocsc()
+        # A is SPD: symmetric ordering and no pivoting, so diag(U) holds the
+        # pivots of an LDL' and their logs sum to log|A|
+        lu = splu(A, permc_spec='MMD_AT_PLUS_A', diag_pivot_thresh=0.0,
+                  options={'SymmetricMode': True})
+        logdet_a = float(np.log(np.abs(lu.U.diagonal())).sum())
+        lzx = lam[:, None] * self.ZtX
+        lzy = lam * self.Zty
+        cx = lu.solve(lzx)
+        cy = lu.solve(lzy)
+        schur = self.XtX - lzx.T @ cx
+        factor = cho_factor(schur)
+        beta = cho_solve(factor, self.Xty - lzx.T @ cy)
+        u = cy - cx @ beta
+        r2 = (self.yty - 2 * beta @ self.Xty + beta @ self.XtX @ beta
+              - (lzy - lzx @ beta) @ u)
+        logdet_s = 2 * float(np.log(np.diag(factor[0])).sum())
+        return {'lam': lam, 'beta': beta, 'u': u, 'r2': r2, 'factor': factor,
+                'logdet_a': logdet_a, 'logdet_s': logdet_s}
+
+    def deviance(self, theta):
+        """REML deviance profiled over beta and sigma^2."""
+        s = self._solve(theta)
+        dof = self.n - self.p
+        return s['logdet_a'] + s['logdet_s'] + dof * (1 + np.log(2 * np.pi * s['r2'] / dof))
+
+    def fit(self, theta0=None):
+        theta0 = np.ones(len(self.factors)) if theta0 is None else np.asarray(theta0, dtype=float)
+        opt = minimize(self.deviance, theta0, method='L-BFGS-B',
+                       bounds=[(0.0, None)] * len(theta0))
+        theta = opt.x
+        s = self._solve(theta)
+        sigma2 = s['r2'] / (self.n - self.p)
+        cov = sigma2 * cho_solve(s['factor'], np.eye(self.p))
+        b = s['lam'] * s['u']
+        ranef = {f: pd.Series(b[self.block == k], index=self.levels[f])
+                 for k, f in enumerate(self.factors)}
+        result = MixedResult(self.names, s['beta'], cov, sigma2, theta, self.factors, ranef,
+                             float(opt.fun), self.n)
+        result.converged = bool(opt.success)
+        return result
+
+
+def fit_mixed(df, factors=('driver', 'constructor', 'team_season')):
+    """REML fit of positionlabel ~ driverorder2 + (1|driver) + (1|team)
+    + (1|team:season) on a long frame (see read_mixed_frame)."""
+    df = df.copy()
+    df['team_season'] = df['constructor'].astype(str) + ':' + df['season'].astype(str)
+    n = len(df)
+    X = np.column_stack([np.ones(n), df['driverorder2'].values.astype(float)])
+    model = CrossedMixedModel(X, df['positionlabel'].values, ['const', 'driverorder2'],
+                              {f: df[f].astype(str).values for f in factors})
+    return model.fit(), X
+
+
+@profiled('stage5_mixed')
+def run_stage5_mixed(input_path=STAGE5_IN, output_path=STAGE5_MIXED_OUT,
+                     vc_output_path=STAGE5_MIXED_VC_OUT):
+    log.info('Stage 5 (mixed effects): REML fit using %s', input_path)
+    df = read_mixed_frame(input_path)
+    log.info('Rows: %d, seasons: %d, drivers: %d, teams: %d', len(df), df['season'].nunique(),
+             df['driver'].nunique(), df['constructor'].nunique())
+    with step('reml', rows=len(df)):
+        model, X = fit_mixed(df)
+    coef = model.coef_table(X)
+    log.info('REML criterion: %.2f (converged: %s)', model.reml_deviance, model.converged)
+    if log.isEnabledFor(INFO):
+        log.info(f"{'Coefficient':<15} {'Estimate':<10} {'Std. Error':<12} {'z-value':<10} {'p-value':<10}")
+        log.info('-' * 80)
+        for _, row in coef.iterrows():
+            term = 'Second driver' if row['term'] == 'driverorder2' else row['term']
+            log.info('%-15s %-10.4f %-12.4f %-10.3f %-10.4f', term, row['Estimate'], row['Std_Error'],
+                     row['t_value'], row['p_value'])
+        log.info('\nVariance components:\n%s', model.variance_components.to_string(index=False))
+    save_df(coef, output_path)
+    save_df(model.variance_components, vc_output_path)
+    log.info('\nStage 5 (mixed) done. Wrote -> %s, %s', output_path, vc_output_path)
+    return model
+
+
+if __name__ == '__main__':
+    run_stage5_mixed()
@@ -0,0 +1,177 @@
+"""
+Online driver ratings under the exponential / Plackett-Luce race model.
+
+State per driver is a log-rate theta_i = log(lambda_i) and a precision
+(inverse variance) P_i, kept in two flat float arrays. Each race is an
+assumed-density-filtering step with a diagonal Gaussian:
+    P <- decay * P + (1 - decay) * prior_precision     (time decay)
+    theta_i += (g_i - P_i (theta_i - m_i)) / (P_i + h_i),   P_i <- P_i + h_i
+(m, P = state before the race; repeated `iterations` times from the new
+theta), where g and h are the gradient and the (negated) diagonal Hessian of
+the race's Plackett-Luce log-likelihood in theta:
+    g_i = [i wins a choice stage] - lambda_i * sum_j 1/D_j
+    h_i = lambda_i * sum_j 1/D_j - lambda_i^2 * sum_j 1/D_j^2
+summed over the stages j where driver i is still running (D_j = rate mass
+still running). Both sums are cumulative sums along the finishing order, so
+one race is a handful of vector operations.
+
+decay=1 keeps the whole history (approximates the batch stage 6 fit);
+decay<1 forgets old races geometrically for in-season tracking.
+
+A single forward pass weighs early races against a vague state, so with few
+races it can sit a couple of batch standard errors off the batch fit.
+history=True stores each race's Gaussian contribution (site) and refine()
+revisits the races expectation-propagation style: remove the race's site,
+redo the update from the remaining information, store the new site. The
+passes converge towards a fixed point that does not depend on race order.
+
+Input: race columns of data/f1seconddata.txt, one at a time
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+from f1_time_rank.config import STAGE5_IN
+from f1_time_rank.stages.stage5_regression import read_positions_matrix
+from f1_time_rank.events import get_logger, INFO
+
+log = get_logger(__name__)
+
+
+class OnlineRatings:
+    """Array-backed online Plackett-Luce ratings.
+
+    Args:
+        names: driver names (row order of the positions matrix).
+        decay: per-race retention of past information (1 = no decay).
+        prior_precision: precision of the prior on theta (also the level the
+                         decay relaxes towards).
+        theta0: prior mean of log lambda (e.g. log of the stage 3 lambdas);
+                default 0 for everyone.
+        iterations: Newton steps per race (1 = plain ADF update).
+        max_step: cap on the change of any theta in one step.
+        history: keep each race and its site for refine() (memory grows with
+                 the number of races; requires decay=1).
+    """
+
+    def __init__(self, names, decay=1.0, prior_precision=0.3, theta0=None,
+                 iterations=1, max_step=1.0, history=False):
+        if not 0 < decay <= 1:
+            raise ValueError('decay must be in (0, 1]')
+        if history and decay < 1:
+            raise ValueError('history/refine() requires decay=1')
+        self.names = list(names)
+        self.decay = float(decay)
+        self.prior_precision = float(prior_precision)
+        n = len(self.names)
+        self.theta = np.zeros(n) if theta0 is None else np.asarray(theta0, dtype=float).copy()
+        self.precision = np.full(n, self.prior_precision)
+        self.iterations = int(iterations)
+        self.max_step = float(max_step)
+        self.n_races = 0
+        # per race: (order, choice, site precision, site precision * mean)
+        self.history = [] if history else None
+
+    def update(self, positions):
+        """Consume one race: positions in driver (row) order, NaN or <= 0 for
+        a DNF (ranked behind every finisher)."""
+        pos = np.asarray(positions, dtype=float)
+        ranked = pos > 0                               # NaN compares False
+        order = np.argsort(np.where(ranked, pos, np.inf), kind='stable')
+        choice = ranked[order]
+        choice[-1] = False                             # last runner is not a choice
+
+        if self.decay < 1.0:
+            self.precision *= self.decay
+            self.precision += (1.0 - self.decay) * self.prior_precision
+        prior_mean = self.theta[order]
+        prior_prec = self.precision[order]
+        theta, h = self._race_update(choice, prior_mean, prior_prec)
+        self.theta[order] = theta
+        self.precision[order] = h
+        if self.history is not None:
+            tau = np.maximum(h - prior_prec, 0.0)
+            self.history.append((order, choice, tau, (prior_prec + tau) * theta - prior_prec * prior_mean))
+        self.n_races += 1
+        return self
+
+    def refine(self, passes=1):
+        """Revisit every stored race `passes` times (expectation propagation
+        with diagonal Gaussian sites); needs history=True."""
+        if self.history is None:
+            raise ValueError('refine() needs OnlineRatings(..., history=True)')
+        for _ in range(passes):
+            for r, (order, choice, tau, nu) in enumerate(self.history):
+                # cavity: the state without this race's contribution
+                cav_prec = self.precision[order] - tau
+                cav_mean = (self.precision[order] * self.theta[order] - nu) / cav_prec
+                theta, h = self._race_update(choice, cav_mean, cav_prec)
+                tau = np.maximum(h - cav_prec, 0.0)
+                self.theta[order] = theta
+                self.precision[order] = cav_prec + tau
+                self.history[r] = (order, choice, tau, (cav_prec + tau) * theta - cav_prec * cav_mean)
+        return self
+
+    def _race_update(self, choice, prior_mean, prior_prec):
+        """Posterior mean and precision of theta (in finishing order) after
+        one race, starting from a diagonal Gaussian state."""
+        theta = prior_mean.copy()
+        # a few diagonal Newton steps on log-lik + Gaussian prior (iterated
+        # ADF); the first step alone is the plain ADF / diagonal-Fisher update
+        for _ in range(self.iterations):
+            lam = np.exp(theta - theta.max())
+            D = lam[::-1].cumsum()[::-1]
+            inv = np.where(choice, 1.0 / D, 0.0)
+            c1 = inv.cumsum()
+            c2 = (inv * inv).cumsum()
+            g = choice - lam * c1 - prior_prec * (theta - prior_mean)
+            h = lam * c1 - lam * lam * c2 + prior_prec
+            theta += np.minimum(np.maximum(g / h, -self.max_step), self.max_step)
+        return theta, h
+
+    def update_many(self, pos):
+        """Consume races in column order of a drivers x races matrix."""
+        for j in range(pos.shape[1]):
+            self.update(pos[:, j])
+        return self
+
+    @property
+    def lambdas(self):
+        """Rates normalized to sum to 1 (win probabilities if all start)."""
+        lam = np.exp(self.theta - self.theta.max())
+        return lam / lam.sum()
+
+    def snapshot(self):
+        """Current ratings with approximate standard errors of log lambda."""
+        return pd.DataFrame({
+            'Driver': self.names,
+            'lambda_online': self.lambdas,
+            'log_lambda': np.log(self.lambdas),
+            'log_lambda_se': 1.0 / np.sqrt(self.precision),
+        })
+
+
+def run_online_ratings(input_path=STAGE5_IN, decay=1.0, prior_precision=0.3, passes=0):
+    log.info('Online ratings: replaying races in %s', input_path)
+    pos, driver_names = read_positions_matrix(input_path)
+    ratings = OnlineRatings(driver_names, decay=decay, prior_precision=prior_precision,
+                            history=passes > 0)
+    ratings.update_many(pos)
+    if passes:
+        ratings.refine(passes)
+    out = ratings.snapshot().sort_values('lambda_online', ascending=False)
+    if log.isEnabledFor(INFO):
+        log.info('After %d races (decay=%s):\n%s', ratings.n_races, decay,
+                 out.head(10).to_string(index=False))
+    return ratings
+
+
+if __name__ == '__main__':
+    run_online_ratings()
@@ -0,0 +1,268 @@
+"""
+Ordered logit / probit alternative to the stage 5 OLS.
+
+Finishing positions are ordinal, so P(position <= j) = F(c_j - x'beta) with
+increasing cut points c_1 < ... < c_{J-1} and F the logistic or normal CDF.
+The parametrization follows statsmodels' OrderedModel (no constant; the
+first cut point is free and the others are c_{j-1} + exp(tau_j)), so params,
+standard errors and the log-likelihood can be compared one to one.
+
+The fit is Newton's method with the analytic gradient and Hessian. Every
+observation touches x and at most two cut points, so all pieces are sparse
+products or bincounts:
+    beta-beta block      X' diag(h_ee) X
+    beta-cut block       X' (U diag(h_eu) + L diag(h_el))   (U, L one-hot)
+    cut-cut block        bincounts on the diagonal and first off-diagonal
+
+Input: data/f1seconddata.txt
+Output: output/stage5_ordered.csv
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+import scipy.sparse as sp
+from scipy.linalg import cho_factor, cho_solve, LinAlgError
+from scipy.special import expit, ndtr, ndtri, logit as logit_fn
+from scipy import stats
+from f1_time_rank.config import STAGE5_IN, STAGE5_ORDERED_OUT
+from f1_time_rank.utils import save_df
+from f1_time_rank.profiling import profiled, step
+from f1_time_rank.stages.regression_engine import encode_categorical, build_design
+from f1_time_rank.stages.stage5_regression import select_teams_stepwise, TEAMS_2022
+from f1_time_rank.stages.results_store import open_results
+from f1_time_rank.events import get_logger, INFO
+
+log = get_logger(__name__)
+
+
+def _link(distr):
+    """(cdf, pdf, pdf derivative, inverse cdf) of the latent error."""
+    if distr == 'logit':
+        def pdf(z):
+            F = expit(z)
+            return F * (1 - F)
+
+        def dpdf(z):
+            F = expit(z)
+            return F * (1 - F) * (1 - 2 * F)
+        return expit, pdf, dpdf, logit_fn
+    if distr == 'probit':
+        def pdf(z):
+            return np.exp(-0.5 * z * z) / np.sqrt(2 * np.pi)
+
+        def dpdf(z):
+            return -z * pdf(z)
+        return ndtr, pdf, dpdf, ndtri
+    raise ValueError("distr must be 'logit' or 'probit'")
+
+
+class OrderedResult:
+    """Fitted ordered model with statsmodels-like attributes."""
+
+    def __init__(self, names, params, cov, llf, llnull, nobs, k_exog, distr, n_iter, converged):
+        self.params = pd.Series(params, index=names)
+        self._cov = pd.DataFrame(cov, index=names, columns=names)
+        self.bse = pd.Series(np.sqrt(np.diag(cov)), index=names)
+        self.tvalues = self.params / self.bse
+        self.pvalues = pd.Series(2 * stats.norm.sf(np.abs(self.tvalues.values)), index=names)
+        self.llf = llf
+        self.llnull = llnull
+        self.prsquared = 1.0 - llf / llnull
+        self.nobs = nobs
+        self.k_exog = k_exog
+        self.df_model = k_exog
+        self.df_resid = nobs - len(params)
+        self.aic = -2 * llf + 2 * len(params)
+        self.bic = -2 * llf + np.log(nobs) * len(params)
+        self.distr = distr
+        self.n_iter = n_iter
+        self.converged = converged
+
+    def cov_params(self):
+        """Covariance of the estimates (a method, as in statsmodels)."""
+        return self._cov.copy()
+
+    def conf_int(self, alpha=0.05):
+        """Wald confidence intervals, columns 0 (lower) and 1 (upper)."""
+        q = stats.norm.ppf(1 - alpha / 2)
+        return pd.DataFrame({0: self.params - q * self.bse, 1: self.params + q * self.bse})
+
+    def coef_table(self):
+        """Coefficient table in the stage5_regression.csv layout (r2 is
+        McFadden's pseudo R^2; cut points follow the regressors)."""
+        coef = self.params.rename('Estimate').to_frame().reset_index().rename(columns={'index': 'term'})
+        coef['Std_Error'] = self.bse.values
+        coef['t_value'] = self.tvalues.values
+        coef['p_value'] = self.pvalues.values
+        coef['r2'] = self.prsquared
+        coef['aic'] = self.aic
+        return coef
+
+
+class _OrderedProblem:
+    def __init__(self, X, codes, n_cat, distr):
+        self.X = sp.csr_matrix(X)
+        self.codes = codes
+        self.n_cut = n_cat - 1
+        self.F, self.f, self.df, self.Finv = _link(distr)
+        n = len(codes)
+        self.has_upper = codes < self.n_cut          # c_y exists
+        self.has_lower = codes > 0                   # c_{y-1} exists
+        up, lo = np.flatnonzero(self.has_upper), np.flatnonzero(self.has_lower)
+        self.U = sp.csr_matrix((np.ones(len(up)), (up, codes[up])), shape=(n, self.n_cut))
+        self.L = sp.csr_matrix((np.ones(len(lo)), (lo, codes[lo] - 1)), shape=(n, self.n_cut))
+
+    def cuts(self, tau):
+        return np.cumsum(np.concatenate([tau[:1], np.exp(tau[1:])]))
+
+    def evaluate(self, theta, hessian=True):
+        k = self.X.shape[1]
+        beta, tau = theta[:k], theta[k:]
+        c = self.cuts(tau)
+        eta = self.X @ beta
+        c_ext = np.concatenate([[-np.inf], c, [np.inf]])
+        u = c_ext[self.codes + 1] - eta
+        l = c_ext[self.codes] - eta
+        # P = F(u) - F(l), computed on the side that avoids cancellation
+        flip = l > 0
+        P = np.where(flip, self.F(-l) - self.F(-u), self.F(u) - self.F(l))
+        P = np.maximum(P, 1e-300)
+        A = np.where(self.has_upper, self.f(np.where(self.has_upper, u, 0.0)), 0.0)
+        B = np.where(self.has_lower, self.f(np.where(self.has_lower, l, 0.0)), 0.0)
+        ll = float(np.log(P).sum())
+
+        a, b = A / P, B / P
+        g_eta = -(a - b)
+        grad_c = (np.bincount(self.codes[self.has_upper], a[self.has_upper], minlength=self.n_cut + 1)[:self.n_cut]
+                  - np.bincount(self.codes[self.has_lower] - 1, b[self.has_lower], minlength=self.n_cut))
+        grad_beta = self.X.T @ g_eta
+        # chain rule to tau: dc_j/dtau_0 = 1, dc_j/dtau_m = exp(tau_m) for m <= j
+        e = np.concatenate([[1.0], np.exp(tau[1:])])
+        tail = np.cumsum(grad_c[::-1])[::-1]
+        grad_tau = e * tail
+        grad = np.concatenate([grad_beta, grad_tau])
+        if not hessian:
+            return ll, grad, None
+
+        Ad = np.where(self.has_upper, self.df(np.where(self.has_upper, u, 0.0)), 0.0) / P
+        Bd = np.where(self.has_lower, self.df(np.where(self.has_lower, l, 0.0)), 0.0) / P
+        h_ee = (Ad - Bd) - (a - b) ** 2
+        h_eu = -Ad + (a - b) * a
+        h_el = Bd - (a - b) * b
+        h_uu = Ad - a * a
+        h_ll = -Bd - b * b
+        h_ul = a * b
+
+        X = self.X
+        H_bb = (X.T @ X.multiply(h_ee[:, None])).toarray() if k else np.zeros((0, 0))
+        H_bc = np.asarray((X.T @ (self.U.multiply(h_eu[:, None]) + self.L.multiply(h_el[:, None]))).todense())
+        diag = (np.bincount(self.codes[self.has_upper], h_uu[self.has_upper], minlength=self.n_cut + 1)[:self.n_cut]
+                + np.bincount(self.codes[self.has_lower] - 1, h_ll[self.has_lower], minlength=self.n_cut))
+        both = self.has_upper & self.has_lower
+        off = np.bincount(self.codes[both] - 1, h_ul[both], minlength=self.n_cut)[:self.n_cut - 1]
+        H_cc = np.diag(diag) + np.diag(off, 1) + np.diag(off, -1)
+
+        Jc = np.tril(np.ones((self.n_cut, self.n_cut))) * e[None, :]
+        H_bt = H_bc @ Jc
+        H_tt = Jc.T @ H_cc @ Jc + np.diag(np.concatenate([[0.0], (e * tail)[1:]]))
+        H = np.block([[H_bb, H_bt], [H_bt.T, H_tt]])
+        return ll, grad, H
+
+    def start(self):
+        k = self.X.shape[1]
+        freq = np.bincount(self.codes, minlength=self.n_cut + 1).astype(float)
+        cum = np.cumsum(freq)[:-1] / freq.sum()
+        c = self.Finv(np.clip(cum, 1e-6, 1 - 1e-6))
+        c = np.maximum.accumulate(c + np.arange(self.n_cut) * 1e-6)
+        tau = np.concatenate([c[:1], np.log(np.maximum(np.diff(c), 1e-6))])
+        return np.concatenate([np.zeros(k), tau])
+
+
+def fit_ordered(X, y, names, distr='logit', max_iter=100, tol=1e-10):
+    """Ordered logit/probit by Newton's method with analytic derivatives.
+
+    Args:
+        X: regressors without a constant (dense or sparse).
+        y: ordinal outcome; categories are the sorted distinct values.
+        names: column names of X.
+
+    Returns:
+        OrderedResult with params named like statsmodels' OrderedModel
+        (regressors, then '<level>/<next level>' cut parameters).
+    """
+    y = np.asarray(y)
+    levels, codes = np.unique(y, return_inverse=True)
+    problem = _OrderedProblem(X, codes, len(levels), distr)
+    theta = problem.start()
+    ll, grad, H = problem.evaluate(theta)
+    converged = False
+    for it in range(1, max_iter + 1):
+        try:
+            direction = cho_solve(cho_factor(-H), grad)
+        except LinAlgError:
+            direction = grad / max(np.abs(np.diag(H)).max(), 1.0)
+        t = 1.0
+        while t >= 1e-10:
+            cand = theta + t * direction
+            ll_new, _, _ = problem.evaluate(cand, hessian=False)
+            if ll_new >= ll - 1e-12 * abs(ll):
+                break
+            t *= 0.5
+        else:
+            # no ascent along the direction: keep theta, report not converged
+            log.warning('Ordered fit: line search failed at iteration %d (log-likelihood %.6f)',
+                        it, ll)
+            break
+        theta = cand
+        decrement = float(grad @ direction)
+        ll, grad, H = problem.evaluate(theta)
+        if decrement < tol * max(1.0, abs(ll)):
+            converged = True
+            break
+    cov = np.linalg.inv(-H)
+    freq = np.bincount(codes).astype(float)
+    llnull = float((freq * np.log(freq / freq.sum())).sum())
+    cut_names = [f'{a}/{b}' for a, b in zip(levels[:-1], levels[1:])]
+    return OrderedResult(list(names) + cut_names, theta, cov, ll, llnull, len(y),
+                         X.shape[1], distr, it, converged)
+
+
+@profiled('stage5_ordered')
+def run_stage5_ordered(input_path=STAGE5_IN, output_path=STAGE5_ORDERED_OUT, distr='logit',
+                       teams=None):
+    """Ordered logit/probit on the stage 5 frame (same regressors, no constant)."""
+    log.info('Stage 5 (ordered %s): regression analysis using %s', distr, input_path)
+    df = open_results(input_path, teams=TEAMS_2022).regression_frame()
+    if teams is None:
+        teams, _ = select_teams_stepwise(df)
+    codes, levels = encode_categorical(df['constructor'].values, reference='Williams', keep=teams)
+    X, names = build_design(len(df), numeric={'driverorder2': df['driverorder2'].values},
+                            categorical={'constructor': (codes, levels)}, intercept=False)
+    with step('newton', rows=len(df)) as rec:
+        model = fit_ordered(X, df['positionlabel'].values, names, distr=distr)
+        rec['iterations'] = model.n_iter
+    coef = model.coef_table()
+    log.info('Converged: %s after %d Newton steps', model.converged, model.n_iter)
+    log.info('Log-likelihood = %.3f, pseudo R² = %.4f, AIC = %.2f', model.llf, model.prsquared, model.aic)
+    if log.isEnabledFor(INFO):
+        log.info(f"{'Coefficient':<15} {'Estimate':<10} {'Std. Error':<12} {'z-value':<10} {'p-value':<10}")
+        log.info('-' * 80)
+        for _, row in coef.head(len(names)).iterrows():
+            term = 'Second driver' if row['term'] == 'driverorder2' else row['term']
+            log.info('%-15s %-10.4f %-12.4f %-10.3f %-10.4f', term, row['Estimate'], row['Std_Error'],
+                     row['t_value'], row['p_value'])
+    save_df(coef, output_path)
+    log.info('\nStage 5 (ordered) done. Wrote -> %s', output_path)
+    return model
+
+
+if __name__ == '__main__':
+    run_stage5_ordered()
@@ -0,0 +1,170 @@
+"""
+Permutation test for the teammate effect (driverorder2) in the stage 5 model.
+
+Under the null the first/second-driver labels are exchangeable within each
+team and race, so a permutation swaps the labels of some teammate pairs.
+Writing the driverorder2 column as 0.5 + C s, where C holds +-0.5 on the two
+rows of each pair and s = +-1 per pair (s = 1 is the observed labelling),
+the Frisch-Waugh statistic for one permutation is
+
+    beta(s) = g's / (n/4 - ||A s||^2),   g = C'My,   A = L^-1 X'C,
+
+with X the other regressors (const + team dummies), L the Cholesky factor
+of X'X and My the residual of y on X. Stacking [g; A] gives all statistics
+of a block of permutations from one (k+1 x pairs) @ (pairs x B) product.
+
+Blocks can be spread over a process pool (n_jobs). When 2^pairs <= n_perm
+every relabelling is enumerated and the p-value is exact; otherwise it is
+the Monte Carlo p-value (1 + b) / (1 + B), which is exact in level.
+"""
+import numpy as np
+import sys
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from scipy.linalg import cholesky, solve_triangular
+from f1_time_rank.config import STAGE5_IN
+from f1_time_rank.stages.regression_engine import encode_categorical, build_design
+from f1_time_rank.stages.stage5_regression import select_teams_stepwise, TEAMS_2022
+from f1_time_rank.stages.results_store import open_results
+from f1_time_rank.events import get_logger
+
+log = get_logger(__name__)
+
+
+def teammate_pairs(df):
+    """Rows of a stage 5 frame where both drivers of a team finished the
+    race, reordered so that each pair is two consecutive rows (lead driver
+    first). Other rows have no label to swap and are left out."""
+    grouped = df.groupby(['season', 'race', 'constructor'])['driverorder2']
+    paired = (grouped.transform('size') == 2) & (grouped.transform('sum') == 1)
+    # pairs in the order of their first row, so a frame that already has
+    # teammates on consecutive rows keeps its order
+    first = df.index.to_series().groupby([df['season'], df['race'], df['constructor']]).transform('min')
+    order = np.lexsort((df['driverorder2'].values, first.values))
+    return df.iloc[order][paired.values[order]].reset_index(drop=True)
+
+
+def _pair_statistics(W, base, rss_y, dof, S):
+    """Coefficient and t statistic of driverorder2 for sign patterns S
+    (pairs x B): W = [g; A] stacked, base = n/4."""
+    M = W @ S
+    num = M[0]
+    den = base - (M[1:] ** 2).sum(axis=0)
+    beta = num / den
+    rss = rss_y - num * beta
+    t = beta / np.sqrt(rss / dof / den)
+    return beta, t
+
+
+def _random_block(args):
+    W, base, rss_y, dof, size, seed = args
+    rng = np.random.default_rng(seed)
+    S = rng.integers(0, 2, (W.shape[1], size), dtype=np.int8) * 2.0 - 1.0
+    return _pair_statistics(W, base, rss_y, dof, S)
+
+
+def _enumerate_signs(n_pairs, start, stop):
+    """Sign patterns for permutation numbers start..stop-1 (bit j -> pair j)."""
+    codes = np.arange(start, stop, dtype=np.int64)
+    bits = (codes[None, :] >> np.arange(n_pairs, dtype=np.int64)[:, None]) & 1
+    return 1.0 - 2.0 * bits
+
+
+def teammate_permutation_test(input_path=STAGE5_IN, n_perm=100_000, teams=None,
+                              batch_size=10_000, n_jobs=1, seed=None):
+    """Permutation p-values for driverorder2 in the stage 5 model, fitted on
+    the rows where both drivers of a team finished (teammate_pairs).
+
+    Args:
+        n_perm: random relabellings (ignored when full enumeration is smaller).
+        teams: team dummies in the model (default: stepwise selection).
+        batch_size: permutations per matrix product (bounds memory).
+        n_jobs: worker processes for the blocks (1 = in process).
+
+    Returns:
+        dict with the observed statistics, permutation p-values for the
+        coefficient and the t statistic, and timing.
+    """
+    log.info('Stage 5 permutation test for driverorder2: %s', input_path)
+    df = teammate_pairs(open_results(input_path, teams=TEAMS_2022).regression_frame())
+    if df.empty:
+        raise ValueError(f'no teammate pairs in {input_path} (are the teams known?)')
+    if teams is None:
+        teams, _ = select_teams_stepwise(df)
+    codes, levels = encode_categorical(df['constructor'].values, reference='Williams', keep=teams)
+    X, _ = build_design(len(df), categorical={'constructor': (codes, levels)})
+    X = X.toarray()
+    y = df['positionlabel'].values
+    n, k = X.shape
+
+    # teammates are consecutive rows: pair j = rows 2j (driver 1), 2j+1 (driver 2)
+    n_pairs = n // 2
+    L = cholesky(X.T @ X, lower=True)
+    resid_y = y - X @ solve_triangular(L.T, solve_triangular(L, X.T @ y, lower=True))
+    XtC = 0.5 * (X[1::2] - X[0::2]).T                  # k x pairs
+    g = 0.5 * (resid_y[1::2] - resid_y[0::2])
+    W = np.vstack([g, solve_triangular(L, XtC, lower=True)])
+    base = n / 4.0
+    rss_y = float(resid_y @ resid_y)
+    dof = n - k - 1
+
+    obs_beta, obs_t = _pair_statistics(W, base, rss_y, dof, np.ones((n_pairs, 1)))
+    obs_beta, obs_t = float(obs_beta[0]), float(obs_t[0])
+
+    t0 = time.perf_counter()
+    exact = n_pairs < 63 and 2 ** n_pairs <= n_perm
+    if exact:
+        total = 2 ** n_pairs
+        blocks = [_pair_statistics(W, base, rss_y, dof, _enumerate_signs(n_pairs, s, min(s + batch_size, total)))
+                  for s in range(0, total, batch_size)]
+    else:
+        total = n_perm
+        sizes = [min(batch_size, n_perm - s) for s in range(0, n_perm, batch_size)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        jobs = [(W, base, rss_y, dof, size, s) for size, s in zip(sizes, seeds)]
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                blocks = list(pool.map(_random_block, jobs))
+        else:
+            blocks = [_random_block(job) for job in jobs]
+    perm_beta = np.concatenate([b for b, _ in blocks])
+    perm_t = np.concatenate([t for _, t in blocks])
+    elapsed = time.perf_counter() - t0
+
+    # small tolerance so ties with the observed value count as extreme
+    hits_beta = int((np.abs(perm_beta) >= abs(obs_beta) * (1 - 1e-12)).sum())
+    hits_t = int((np.abs(perm_t) >= abs(obs_t) * (1 - 1e-12)).sum())
+    if exact:
+        p_beta, p_t = hits_beta / total, hits_t / total
+    else:
+        p_beta, p_t = (1 + hits_beta) / (1 + total), (1 + hits_t) / (1 + total)
+
+    result = {
+        'estimate': obs_beta,
+        't_value': obs_t,
+        'n_permutations': total,
+        'exact': exact,
+        'p_value_beta': p_beta,
+        'p_value_t': p_t,
+        'null_quantiles_beta': np.quantile(perm_beta, [0.025, 0.975]),
+        'seconds': elapsed,
+    }
+    log.info('Teammate pairs: %d, other regressors: %d (%s)', n_pairs, k, ', '.join(['const'] + levels))
+    log.info('driverorder2 = %.4f, t = %.3f', obs_beta, obs_t)
+    log.info('%s permutation p-value (%s relabellings): beta %.4f, t %.4f',
+             'Exact' if exact else 'Monte Carlo', f'{total:,}', p_beta, p_t)
+    log.info('Null 95%% range of beta: [%.3f, %.3f]', *result['null_quantiles_beta'])
+    log.info('Permutations evaluated in %.2fs', elapsed)
+    return result
+
+
+if __name__ == '__main__':
+    teammate_permutation_test()
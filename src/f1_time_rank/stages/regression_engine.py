@@ -0,0 +1,150 @@
+"""
+Sparse least-squares engine for the stage 5 regression.
+
+Builds the design matrix as a scipy CSR matrix straight from integer codes
+(no dense dummy frame), solves the normal equations with a Cholesky factor of
+X'X and reports the same statistics stage 5 takes from statsmodels OLS
+(params, bse, tvalues, pvalues, R^2, adjusted R^2, F, AIC/BIC).
+X'X is only p x p, so memory is dominated by the CSR matrix itself
+(nnz ~ rows x terms per row), which keeps 10M-row designs practical.
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+import scipy.sparse as sp
+from scipy.linalg import cho_factor, cho_solve
+from scipy.special import stdtr, stdtrit, fdtrc   # t / F tails without importing scipy.stats
+
+
+def encode_categorical(values, reference=None, keep=None):
+    """Integer-code a categorical column.
+
+    Returns (codes, levels) where levels are sorted like pd.get_dummies.
+    Rows whose level is the reference, or is not in keep, get code -1 and
+    fall into the baseline (no dummy column).
+    """
+    levels, inverse = np.unique(np.asarray(values), return_inverse=True)
+    dummy_levels = [str(l) for l in levels
+                    if l != reference and (keep is None or l in keep)]
+    remap = np.full(len(levels), -1, dtype=np.int64)
+    for j, l in enumerate(dummy_levels):
+        remap[np.searchsorted(levels, l)] = j
+    return remap[inverse], list(dummy_levels)
+
+
+def build_design(n_rows, numeric=None, categorical=None, intercept=True):
+    """Sparse CSR design matrix from numeric columns and integer codes.
+
+    Args:
+        n_rows: number of observations.
+        numeric: dict {name: 1D array} of numeric regressors.
+        categorical: dict {name: (codes, levels)} as from encode_categorical;
+                     code -1 means reference level (no entry).
+        intercept: add a 'const' column first (statsmodels naming).
+
+    Returns:
+        (X as CSR, list of column names)
+    """
+    numeric = numeric or {}
+    categorical = categorical or {}
+    names = []
+    row_parts, col_parts, data_parts = [], [], []
+    col = 0
+    all_rows = np.arange(n_rows, dtype=np.int64)
+    if intercept:
+        names.append('const')
+        row_parts.append(all_rows)
+        col_parts.append(np.zeros(n_rows, dtype=np.int64))
+        data_parts.append(np.ones(n_rows))
+        col += 1
+    for name, values in numeric.items():
+        values = np.asarray(values, dtype=float)
+        nz = np.flatnonzero(values)
+        names.append(name)
+        row_parts.append(nz)
+        col_parts.append(np.full(len(nz), col, dtype=np.int64))
+        data_parts.append(values[nz])
+        col += 1
+    for name, (codes, levels) in categorical.items():
+        codes = np.asarray(codes, dtype=np.int64)
+        nz = np.flatnonzero(codes >= 0)
+        names.extend(levels)
+        row_parts.append(nz)
+        col_parts.append(codes[nz] + col)
+        data_parts.append(np.ones(len(nz)))
+        col += len(levels)
+    X = sp.csr_matrix((np.concatenate(data_parts),
+                       (np.concatenate(row_parts), np.concatenate(col_parts))),
+                      shape=(n_rows, col))
+    return X, names
+
+
+class OLSResult:
+    """OLS fit statistics with the attribute and method names stage 5 uses
+    from statsmodels' RegressionResults (``cov_params()`` and ``conf_int()``
+    are methods, as there; there is no ``summary()``)."""
+
+    def __init__(self, names, params, cov_unscaled, ssr, tss, nobs, has_const=True):
+        p = len(params)
+        self.nobs = nobs
+        self.df_model = p - 1 if has_const else p
+        self.df_resid = nobs - p
+        self.ssr = ssr
+        self.scale = ssr / self.df_resid
+        self._cov = pd.DataFrame(self.scale * cov_unscaled, index=names, columns=names)
+        self.params = pd.Series(params, index=names)
+        self.bse = pd.Series(np.sqrt(np.diag(self._cov.values)), index=names)
+        self.tvalues = self.params / self.bse
+        self.pvalues = pd.Series(2 * stdtr(self.df_resid, -np.abs(self.tvalues.values)), index=names)
+        self.rsquared = 1.0 - ssr / tss
+        self.rsquared_adj = 1.0 - (nobs - has_const) / self.df_resid * (1.0 - self.rsquared)
+        self.fvalue = ((tss - ssr) / self.df_model) / self.scale
+        self.f_pvalue = fdtrc(self.df_model, self.df_resid, self.fvalue)
+        self.llf = -nobs / 2.0 * (np.log(2 * np.pi) + np.log(ssr / nobs) + 1)
+        self.aic = -2 * self.llf + 2 * p
+        self.bic = -2 * self.llf + np.log(nobs) * p
+
+    def cov_params(self):
+        """Scaled covariance of the coefficients."""
+        return self._cov.copy()
+
+    def conf_int(self, alpha=0.05):
+        """t-based confidence intervals, columns 0 (lower) and 1 (upper)."""
+        q = stdtrit(self.df_resid, 1 - alpha / 2)
+        return pd.DataFrame({0: self.params - q * self.bse, 1: self.params + q * self.bse})
+
+    def coef_table(self):
+        """Coefficient table in the stage5_regression.csv layout."""
+        coef = self.params.rename('Estimate').to_frame().reset_index().rename(columns={'index': 'term'})
+        coef['Std_Error'] = self.bse.values
+        coef['t_value'] = self.tvalues.values
+        coef['p_value'] = self.pvalues.values
+        coef['r2'] = self.rsquared
+        coef['aic'] = self.aic
+        return coef
+
+
+def fit_ols(X, y, names):
+    """Least squares via Cholesky of the normal equations X'X b = X'y.
+    Residuals are recomputed from X and y (not from y'y - b'X'y) to keep the
+    residual sum of squares accurate."""
+    y = np.asarray(y, dtype=float)
+    gram = X.T @ X
+    gram = gram.toarray() if sp.issparse(gram) else np.asarray(gram)
+    xty = X.T @ y
+    factor = cho_factor(gram)
+    params = cho_solve(factor, xty)
+    cov_unscaled = cho_solve(factor, np.eye(len(params)))
+    resid = y - X @ params
+    ssr = float(resid @ resid)
+    has_const = bool(names) and names[0] == 'const'
+    tss = float(((y - y.mean()) ** 2).sum()) if has_const else float(y @ y)
+    return OLSResult(names, params, cov_unscaled, ssr, tss, len(y), has_const)
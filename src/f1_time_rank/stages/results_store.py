@@ -0,0 +1,340 @@
+"""
+Long-format race results store backed by memory-mapped columns.
+
+One row per (season, round, driver) with integer-coded categoricals:
+    season int16, round int16, driver_id int32, team_id int32,
+    position int16 (0 = not classified), status int8 (code into STATUS)
+Each column is a .npy file in the store directory, opened with
+np.load(mmap_mode='r'), so opening a store reads no data and slices touch
+only the pages they need. meta.json holds the driver / team names.
+
+Rows are sorted by (season, round, driver_id), so a season or a race is a
+contiguous slice found by binary search. Driver and team lookups use CSR-style
+indexes (a stable argsort of the id column plus offsets per id), which keep
+each driver's rows in (season, round) order.
+
+open_results() reads a store directory as is and parses the positions text
+matrix (data/f1seconddata.txt) or a long CSV into an in-memory store, without
+writing anything. Converting to disk is explicit: build_results_store() writes
+a store directory, and convert_results() (open_results(cache=True)) converts
+once per file content into .cache/, keyed by the file hash and STORE_VERSION.
+
+Input: data/f1seconddata.txt or a long CSV
+       (season, round, driver, team, position[, status])
+Output: data/results_store/
+"""
+import hashlib
+import json
+import numpy as np
+import sys
+import os
+from pathlib import Path
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+from f1_time_rank.config import STAGE5_IN, STAGE5_SEASON, RESULTS_STORE_DIR, CACHE_DIR
+from f1_time_rank.utils import file_hash
+from f1_time_rank.events import get_logger
+
+log = get_logger(__name__)
+
+# bump when the column layout or the conversion changes: old .cache/ stores
+# are then not reused
+STORE_VERSION = 1
+STATUS = ['finished', 'dnf']
+COLUMNS = {'season': np.int16, 'round': np.int16, 'driver_id': np.int32,
+           'team_id': np.int32, 'position': np.int16, 'status': np.int8}
+
+
+def parse_positions_text(path):
+    """Drivers x races matrix and driver names from the whitespace text file
+    (driver name in column 0)."""
+    try:
+        df = pd.read_csv(path, sep=r'\s+', header=None)
+    except Exception:
+        df = pd.read_csv(path, header=None)
+    return df.iloc[:, 1:].values.astype(float), df.iloc[:, 0].values
+
+
+def _csr_index(ids, n):
+    order = np.argsort(ids, kind='stable')
+    ptr = np.concatenate([[0], np.cumsum(np.bincount(ids, minlength=n))])
+    return order, ptr
+
+
+class ResultsStore:
+    """Open store; columns are read-only memmaps (see module docstring)."""
+
+    def __init__(self, path, arrays=None, meta=None):
+        """Open the store at path, or wrap arrays / meta held in memory
+        (path None, see write())."""
+        self.path = None if path is None else Path(path)
+        if meta is None:
+            with open(self.path / 'meta.json') as f:
+                meta = json.load(f)
+        self.drivers = np.array(meta['drivers'], dtype=object)
+        self.teams = np.array(meta['teams'], dtype=object)
+        self._driver_lookup = {d: i for i, d in enumerate(meta['drivers'])}
+        self._team_lookup = {t: i for i, t in enumerate(meta['teams'])}
+        for name in list(COLUMNS) + ['by_driver', 'driver_ptr', 'by_team', 'team_ptr']:
+            setattr(self, name, arrays[name] if arrays is not None
+                    else np.load(self.path / f'{name}.npy', mmap_mode='r'))
+
+    def __len__(self):
+        return len(self.season)
+
+    @classmethod
+    def write(cls, path, season, round, driver, team, position, status=None):
+        """Write a store from row arrays (driver / team as names; position
+        NaN or <= 0 = not classified) and open it. path None keeps the
+        columns in memory and writes nothing."""
+        driver_id, driver_names = pd.factorize(np.asarray(driver, dtype=object))
+        team_id, team_names = pd.factorize(np.asarray(team, dtype=object))
+        position = np.asarray(position, dtype=float)
+        classified = np.isfinite(position) & (position > 0)
+        if status is None:
+            status_code = np.where(classified, 0, 1)
+        else:
+            status_code = pd.Categorical(status, categories=STATUS).codes
+            if np.any(status_code < 0):
+                raise ValueError(f'status must be one of {STATUS}')
+        columns = {
+            'season': np.asarray(season), 'round': np.asarray(round),
+            'driver_id': driver_id, 'team_id': team_id,
+            'position': np.where(classified, position, 0), 'status': status_code,
+        }
+        sort = np.lexsort((columns['driver_id'], columns['round'], columns['season']))
+        arrays = {name: np.ascontiguousarray(columns[name][sort], dtype=dtype)
+                  for name, dtype in COLUMNS.items()}
+        by_driver, driver_ptr = _csr_index(driver_id[sort], len(driver_names))
+        by_team, team_ptr = _csr_index(team_id[sort], len(team_names))
+        for name, arr in (('by_driver', by_driver), ('driver_ptr', driver_ptr),
+                          ('by_team', by_team), ('team_ptr', team_ptr)):
+            arrays[name] = arr.astype(np.int64)
+        meta = {'drivers': [str(d) for d in driver_names], 'teams': [str(t) for t in team_names],
+                'status': STATUS, 'n_rows': int(len(sort)), 'version': STORE_VERSION}
+        if path is None:
+            return cls(None, arrays, meta)
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name, arr in arrays.items():
+            np.save(path / f'{name}.npy', arr)
+        with open(path / 'meta.json', 'w') as f:
+            json.dump(meta, f)
+        return cls(path)
+
+    @classmethod
+    def from_frame(cls, df, path, team_col='team'):
+        """From a long frame with season, round, driver, team, position[, status]."""
+        return cls.write(path, df['season'].values, df['round'].values, df['driver'].values,
+                         df[team_col].values, df['position'].values,
+                         df['status'].values if 'status' in df else None)
+
+    @classmethod
+    def from_positions(cls, pos, driver_names, path, teams=None, season=STAGE5_SEASON):
+        """From a drivers x races matrix; teams is the team of every row
+        (None: all 'unknown')."""
+        n_drivers, n_races = pos.shape
+        teams = ['unknown'] * n_drivers if teams is None else list(teams)
+        return cls.write(path,
+                         np.full(pos.size, season),
+                         np.repeat(np.arange(1, n_races + 1), n_drivers),
+                         np.tile(np.asarray(driver_names, dtype=object), n_races),
+                         np.tile(np.asarray(teams, dtype=object), n_races),
+                         pos.flatten(order='F'))
+
+    # --- slicing -----------------------------------------------------------
+
+    @property
+    def seasons(self):
+        s = np.asarray(self.season)
+        return s[np.r_[0, np.flatnonzero(np.diff(s)) + 1]] if len(s) else s
+
+    def season_rows(self, season):
+        """Contiguous slice of one season's rows."""
+        lo = np.searchsorted(self.season, season, side='left')
+        hi = np.searchsorted(self.season, season, side='right')
+        return slice(int(lo), int(hi))
+
+    def race_rows(self, season, round):
+        s = self.season_rows(season)
+        rounds = self.round[s]
+        lo = np.searchsorted(rounds, round, side='left')
+        hi = np.searchsorted(rounds, round, side='right')
+        return slice(s.start + int(lo), s.start + int(hi))
+
+    def _id(self, key, lookup):
+        return lookup[key] if isinstance(key, str) else int(key)
+
+    def driver_rows(self, driver):
+        """Row indices of a driver (name or id), in (season, round) order."""
+        d = self._id(driver, self._driver_lookup)
+        return np.asarray(self.by_driver[self.driver_ptr[d]:self.driver_ptr[d + 1]])
+
+    def team_rows(self, team):
+        t = self._id(team, self._team_lookup)
+        return np.asarray(self.by_team[self.team_ptr[t]:self.team_ptr[t + 1]])
+
+    def select(self, season=None, driver=None, team=None):
+        """Sorted row indices matching every given filter."""
+        rows = None
+        if season is not None:
+            s = self.season_rows(season)
+            rows = np.arange(s.start, s.stop)
+        for key, fn in ((driver, self.driver_rows), (team, self.team_rows)):
+            if key is not None:
+                r = fn(key)
+                rows = r if rows is None else np.intersect1d(rows, r, assume_unique=True)
+        return np.arange(len(self)) if rows is None else rows
+
+    # --- views -------------------------------------------------------------
+
+    def frame(self, rows=None):
+        """Decoded long frame (names instead of ids, NaN for unclassified)."""
+        rows = slice(None) if rows is None else rows
+        position = np.asarray(self.position[rows], dtype=float)
+        status = np.asarray(self.status[rows])
+        return pd.DataFrame({
+            'season': np.asarray(self.season[rows]),
+            'round': np.asarray(self.round[rows]),
+            'driver': self.drivers[self.driver_id[rows]],
+            'team': self.teams[self.team_id[rows]],
+            'position': np.where(status == 0, position, np.nan),
+            'status': np.array(STATUS, dtype=object)[status],
+        })
+
+    def _season(self, season):
+        return self.seasons[-1] if season is None else season
+
+    def positions_matrix(self, season=None):
+        """(drivers x rounds positions with NaN for unclassified / absent,
+        driver names, team of each driver) for one season (default: last);
+        drivers in id order, a driver's team is the one of their first race."""
+        s = self.season_rows(self._season(season))
+        driver_id = np.asarray(self.driver_id[s])
+        rounds, race = np.unique(np.asarray(self.round[s]), return_inverse=True)
+        ids, row = np.unique(driver_id, return_inverse=True)
+        pos = np.full((len(ids), len(rounds)), np.nan)
+        status = np.asarray(self.status[s])
+        pos[row, race] = np.where(status == 0, np.asarray(self.position[s], dtype=float), np.nan)
+        first = np.unique(row, return_index=True)[1]
+        teams = self.teams[np.asarray(self.team_id[s])[first]]
+        return pos, self.drivers[ids], teams
+
+    def regression_frame(self, season=None):
+        """Stage 5 frame (positionlabel, driverorder2, constructor, driver,
+        season, race) for one season (default: last) or all (season='all').
+        Rows are race-major with drivers in id order, as positions_frame.
+        driverorder2 is 0 for the lead driver of a team-season (the lowest
+        driver id, i.e. first listed) and 1 otherwise; unclassified rows are
+        dropped."""
+        rows = slice(None) if season == 'all' else self.season_rows(self._season(season))
+        df = pd.DataFrame({
+            'season': np.asarray(self.season[rows]),
+            'race': np.asarray(self.round[rows]),
+            'driver_id': np.asarray(self.driver_id[rows]),
+            'team_id': np.asarray(self.team_id[rows]),
+            'positionlabel': np.asarray(self.position[rows], dtype=float),
+            'status': np.asarray(self.status[rows]),
+        })
+        lead = df.groupby(['season', 'team_id'])['driver_id'].transform('min')
+        out = pd.DataFrame({
+            'positionlabel': df['positionlabel'].values,
+            'driverorder2': (df['driver_id'] != lead).astype(float).values,
+            'constructor': self.teams[df['team_id'].values],
+            'driver': self.drivers[df['driver_id'].values],
+            'season': df['season'].values,
+            'race': df['race'].values,
+        })
+        return out[df['status'].values == 0].reset_index(drop=True)
+
+    def rankings(self, season=None, dnf='bottom'):
+        """Plackett-Luce Rankings of one season (default: last) or all."""
+        from f1_time_rank.stages.stage6_plackett_luce import Rankings
+        rows = None if season == 'all' else self.season_rows(self._season(season))
+        df = self.frame(rows)
+        df['race'] = df['season'].astype(str) + '-' + df['round'].astype(str)
+        return Rankings.from_long(df, race_col='race', driver_col='driver',
+                                  position_col='position', dnf=dnf)
+
+
+def content_hash(path):
+    """SHA-256 of a file, or of every file of a store directory."""
+    path = Path(path)
+    if not path.is_dir():
+        return file_hash(path)
+    h = hashlib.sha256()
+    for f in sorted(path.iterdir()):
+        h.update(f.name.encode() + file_hash(f).encode())
+    return h.hexdigest()
+
+
+def open_results(path=STAGE5_IN, teams=None, season=STAGE5_SEASON, cache=False):
+    """ResultsStore for a store directory, a long CSV or the positions text
+    matrix. Files are parsed into an in-memory store; cache=True converts
+    them to disk instead (convert_results). teams is the team of each matrix
+    row and is ignored for a matrix with a different number of rows."""
+    path = Path(path)
+    if (path / 'meta.json').exists():
+        return ResultsStore(path)
+    if cache:
+        return convert_results(path, teams, season)
+    return _parse_results(path, None, teams, season)
+
+
+def convert_results(path=STAGE5_IN, teams=None, season=STAGE5_SEASON, cache_dir=CACHE_DIR):
+    """Store for a long CSV or the positions text matrix, converted once per
+    file content into cache_dir. The key is the content hash, STORE_VERSION,
+    season and teams; converting a file again (new content or version)
+    removes its older entries."""
+    import shutil
+    path = Path(path)
+    source = hashlib.sha256(str(path.resolve()).encode()).hexdigest()[:12]
+    key = hashlib.sha256('|'.join([content_hash(path), f'v{STORE_VERSION}', str(season)]
+                                  + list(teams or [])).encode()).hexdigest()[:20]
+    store_path = Path(cache_dir) / f'results_{source}_{key}'
+    if (store_path / 'meta.json').exists():
+        return ResultsStore(store_path)
+    for old in Path(cache_dir).glob(f'results_{source}_*'):
+        shutil.rmtree(old, ignore_errors=True)
+    log.debug('Converting %s into %s', path, store_path)
+    return _parse_results(path, store_path, teams, season)
+
+
+def _parse_results(path, store_path, teams, season):
+    if path.suffix == '.csv':
+        df = pd.read_csv(path)
+        return ResultsStore.from_frame(df, store_path,
+                                       team_col='team' if 'team' in df else 'constructor')
+    pos, driver_names = parse_positions_text(path)
+    if teams is not None and len(teams) != len(driver_names):
+        teams = None
+    return ResultsStore.from_positions(pos, driver_names, store_path, teams, season)
+
+
+def build_results_store(input_path=STAGE5_IN, output_path=RESULTS_STORE_DIR, teams=None):
+    """Convert the positions matrix or a long CSV into a store at output_path."""
+    log.info('Results store: converting %s', input_path)
+    if str(input_path).endswith('.csv'):
+        df = pd.read_csv(input_path)
+        store = ResultsStore.from_frame(df, output_path,
+                                        team_col='team' if 'team' in df else 'constructor')
+    else:
+        if teams is None:
+            from f1_time_rank.stages.stage5_regression import TEAMS_2022
+            teams = TEAMS_2022
+        pos, driver_names = parse_positions_text(input_path)
+        store = ResultsStore.from_positions(pos, driver_names, output_path, teams)
+    log.info('%d rows, seasons %s, %d drivers, %d teams', len(store), [int(s) for s in store.seasons],
+             len(store.drivers), len(store.teams))
+    log.info('Results store done. Wrote -> %s', output_path)
+    return store
+
+
+if __name__ == '__main__':
+    build_results_store()
@@ -7,15 +7,23 @@ import pandas as pd
 import sys
 import os
 
-# Add parent directory to path for imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from f1_time_rank.config import STAGE1_IN, STAGE1_OUT
+from f1_time_rank.utils import fractional_to_rawprob, save_df
+from f1_time_rank.profiling import profiled
+from f1_time_rank.events import get_logger
 
-from config import STAGE1_IN, STAGE1_OUT
-from utils import fractional_to_rawprob, save_df
+log = get_logger(__name__)
 
 
+@profiled('stage1')
 def run_stage1(input_path=STAGE1_IN, output_path=STAGE1_OUT):
-    print('Stage 1: reading', input_path)
+    log.info('Stage 1: reading %s', input_path)
     # Try different delimiters since the CSV might use semicolon
     try:
         df = pd.read_csv(input_path, sep=';')
@@ -62,7 +70,7 @@ def run_stage1(input_path=STAGE1_IN, output_path=STAGE1_OUT):
     # compute raw implied probability
     df['raw_implied_p'] = df['Odds'].apply(fractional_to_rawprob)
     save_df(df, output_path)
-    print('Stage 1 done. Wrote ->', output_path)
+    log.info('Stage 1 done. Wrote -> %s', output_path)
     return df
 
 if __name__ == '__main__':
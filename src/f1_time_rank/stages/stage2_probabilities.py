@@ -0,0 +1,39 @@
+"""
+Stage 2: Renormalize implied probabilities to remove overround.
+Input: output/stage1_odds_parsed.csv
+Output: output/stage2_probabilities.csv
+"""
+import pandas as pd
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from f1_time_rank.config import STAGE1_OUT, STAGE2_OUT
+from f1_time_rank.utils import save_df, read_df
+from f1_time_rank.profiling import profiled
+from f1_time_rank.events import get_logger
+
+log = get_logger(__name__)
+
+
+@profiled('stage2')
+def run_stage2(input_path=STAGE1_OUT, output_path=STAGE2_OUT):
+    log.info('Stage 2: renormalizing probabilities from %s', input_path)
+    df = read_df(input_path)
+    if 'raw_implied_p' not in df.columns:
+        raise ValueError('Expected raw_implied_p in input')
+    sum_raw = df['raw_implied_p'].sum()
+    if sum_raw <= 0 or pd.isna(sum_raw):
+        raise ValueError('Sum of raw_implied_p is non-positive or NaN')
+    df['p_norm'] = df['raw_implied_p'] / sum_raw
+    save_df(df, output_path)
+    log.info('Stage 2 done. Wrote -> %s', output_path)
+    return df
+
+if __name__ == '__main__':
+    run_stage2()
@@ -0,0 +1,200 @@
+"""
+Stage 3: Estimate lambda parameters by minimizing RSS between target p_norm
+and lambda/sum(lambda). This implements the grouped parametrization similar
+with lambdaest4 in the R code.
+Optionally adds standard errors and a driver x driver covariance for lambda,
+obtained from the analytic Jacobian of the objective (delta method) with either
+odds rounding error or the fit residuals as the source of noise in p_norm.
+Input: output/stage2_probabilities.csv
+Output: output/stage3_lambda.csv (+ output/stage3_lambda_cov.csv)
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+from scipy.optimize import minimize
+from f1_time_rank.config import STAGE2_OUT, STAGE3_OUT, STAGE3_COV_OUT
+from f1_time_rank.utils import save_df, read_df, odds_rounding_variance
+from f1_time_rank.profiling import profiled, step
+from f1_time_rank.events import get_logger, DEBUG, INFO
+
+log = get_logger(__name__)
+
+
+def objective_grouped(x, target_sorted, counts):
+    lambda_sorted = np.repeat(x, counts)
+    pred = lambda_sorted / np.sum(lambda_sorted)
+    return np.sum((target_sorted - pred)**2)
+
+
+def grouped_jacobian(x, counts):
+    """d pred / d x for pred = repeat(x, counts) / sum(repeat(x, counts)).
+    Returns an (n drivers x n groups) matrix in sorted driver order."""
+    lambda_sorted = np.repeat(x, counts)
+    total = np.sum(lambda_sorted)
+    group = np.repeat(np.arange(len(x)), counts)
+    J = -np.outer(lambda_sorted, counts) / total**2
+    J[np.arange(len(lambda_sorted)), group] += 1.0 / total
+    return J
+
+
+def p_norm_covariance_from_odds(df):
+    """Covariance of p_norm implied by odds rounding (delta method through
+    the stage 2 renormalization p = r / sum(r))."""
+    r = df['raw_implied_p'].values.astype(float)
+    var_r = np.array([odds_rounding_variance(o) for o in df['Odds']], dtype=float)
+    var_r = np.nan_to_num(var_r)
+    total = r.sum()
+    p = r / total
+    Jn = (np.eye(len(r)) - np.outer(p, np.ones(len(r)))) / total
+    return Jn @ np.diag(var_r) @ Jn.T
+
+
+def lambda_covariance(x, target_sorted, counts, target_cov=None):
+    """Covariance of the grouped lambdas via the implicit function theorem.
+
+    At the optimum of the RSS objective dx/dtarget = (J'J)^+ J', so
+    Cov(x) = A Cov(target) A' with A = (J'J)^+ J'. The objective only
+    identifies lambda up to scale, so the result is projected onto the
+    directions that keep the fitted lambda total fixed.
+    If target_cov is None the residual variance RSS/dof is used instead.
+    """
+    J = grouped_jacobian(x, counts)
+    n, G = J.shape
+    if target_cov is None:
+        rss = objective_grouped(x, target_sorted, counts)
+        dof = max(n - (G - 1), 1)
+        target_cov = rss / dof * np.eye(n)
+    A = np.linalg.pinv(J.T @ J) @ J.T
+    cov = A @ target_cov @ A.T
+    P = np.eye(G) - np.outer(x, counts) / np.dot(counts, x)
+    return P @ cov @ P.T
+
+
+def sample_lambdas(lambda_hat, cov, size, rng=None):
+    """Draw lambda vectors from N(lambda_hat, cov), clipped to stay positive.
+    Used by stage 4 and the Monte Carlo simulator for parameter uncertainty."""
+    rng = np.random.default_rng(rng)
+    draws = rng.multivariate_normal(lambda_hat, cov, size=size, method='eigh')
+    return np.maximum(draws, 1e-12)
+
+
+@profiled('stage3')
+def run_stage3(input_path=STAGE2_OUT, output_path=STAGE3_OUT, uncertainty=None,
+               cov_output_path=STAGE3_COV_OUT):
+    log.info('Stage 3: estimating lambda from %s', input_path)
+    df = read_df(input_path)
+    if 'p_norm' not in df.columns:
+        raise ValueError('Expected p_norm in input')
+    
+    if uncertainty not in (None, 'rounding', 'residual'):
+        raise ValueError("uncertainty must be None, 'rounding' or 'residual'")
+    
+    target = df['p_norm'].values
+    
+    # Implement R's lambdaest4 approach: grouped optimization
+    # Sort target and compute run-lengths of unique values
+    order = np.argsort(target, kind='stable')
+    target_sorted = target[order]
+    unique_vals, counts = np.unique(target_sorted, return_counts=True)
+    
+    log.info('Found %d unique probability values', len(unique_vals))
+    if log.isEnabledFor(DEBUG):
+        for i, (val, count) in enumerate(zip(unique_vals, counts)):
+            log.debug('  Group %d: p=%.9f, count=%d', i + 1, val, count)
+    
+    # Initial guess: use unique_vals scaled by empirical factor
+    # From R code analysis: lambda values are much smaller than probabilities
+    x0 = np.maximum(unique_vals * 0.256, 1e-8)  # Scale factor from journal
+    
+    # Bounds: all lambda values must be positive
+    bounds = [(1e-12, None)] * len(x0)
+    
+    # Optimize using grouped approach
+    with step('minimize', rows=len(target)) as rec:
+        res = minimize(objective_grouped, x0, args=(target_sorted, counts), 
+                       method='L-BFGS-B', bounds=bounds,
+                       options={'maxiter': 10000})
+        rec['iterations'] = int(res.nit)
+    
+    if not res.success:
+        log.warning('Warning: optimization did not converge: %s', res.message)
+        # Fallback: use the initial guess
+        x_opt = x0
+    else:
+        x_opt = res.x
+        log.info('Optimization converged with error: %.2e', res.fun)
+    
+    # Reconstruct full lambda vector aligned with original driver order
+    # Create mapping: for each target value, find index in unique_vals
+    idx_map = []
+    for v in target:
+        idx = np.where(np.abs(unique_vals - v) < 1e-12)[0][0]
+        idx_map.append(idx)
+    
+    lambda_full = np.array([x_opt[i] for i in idx_map], dtype=float)
+    
+    # Verify solution quality
+    lambda_sum = np.sum(lambda_full)
+    predicted_probs = lambda_full / lambda_sum
+    errors = np.abs(target - predicted_probs)
+    max_error = np.max(errors)
+    mean_error = np.mean(errors)
+    
+    log.info('Lambda sum: %.10f', lambda_sum)
+    log.info('Max probability error: %.2e', max_error)
+    log.info('Mean probability error: %.2e', mean_error)
+    
+    # Create output dataframe
+    out_df = df.copy()
+    out_df['lambda_est'] = lambda_full
+    out_df['p_predicted'] = predicted_probs
+    out_df['p_error'] = errors
+    
+    if uncertainty is not None:
+        if uncertainty == 'rounding':
+            target_cov = p_norm_covariance_from_odds(df)[np.ix_(order, order)]
+        else:
+            target_cov = None
+        cov_grouped = lambda_covariance(x_opt, target_sorted, counts, target_cov)
+        idx = np.array(idx_map)
+        cov_full = cov_grouped[np.ix_(idx, idx)]
+        out_df['lambda_se'] = np.sqrt(np.clip(np.diag(cov_full), 0, None))
+        cov_df = pd.DataFrame(cov_full, index=df['Driver'].values, columns=df['Driver'].values)
+        save_df(cov_df, cov_output_path, index=True)
+        log.info('Lambda covariance (%s) wrote -> %s', uncertainty, cov_output_path)
+        if log.isEnabledFor(DEBUG):
+            log.debug('\nGrouped Lambda Standard Errors:')
+            for i, (val, lam) in enumerate(zip(unique_vals, x_opt)):
+                se = np.sqrt(max(cov_grouped[i, i], 0))
+                log.debug('  Group %d: lambda=%.10f se=%.3e', i + 1, lam, se)
+    
+    # Display grouped lambda values (like R output)
+    if log.isEnabledFor(DEBUG):
+        log.debug("\nGrouped Lambda Values (like R's x1 output):")
+        for i, (val, lam) in enumerate(zip(unique_vals, x_opt)):
+            log.debug('  Group %d: p=%.9f -> lambda=%.10f', i + 1, val, lam)
+    
+    # Display results for key drivers
+    if log.isEnabledFor(INFO):
+        log.info('\nKey Results Comparison with Journal:')
+        key_drivers = ['Max Verstappen', 'Lewis Hamilton', 'Sergio Perez', 'Fernando Alonso']
+        for driver in key_drivers:
+            driver_rows = out_df[out_df['Driver'] == driver]
+            if len(driver_rows) > 0:
+                row = driver_rows.iloc[0]
+                log.info('%-15s: p_norm=%.9f, lambda=%.10f', driver, row['p_norm'], row['lambda_est'])
+    
+    save_df(out_df, output_path)
+    log.info('Stage 3 done. Wrote -> %s', output_path)
+    return out_df
+
+if __name__ == '__main__':
+    run_stage3()
\ No newline at end of file
@@ -0,0 +1,310 @@
+"""
+Stage 3 (joint): Estimate one lambda vector from several finishing markets at
+once (winner, top 3, top 6, top 10, ...), instead of the winner odds only.
+
+Under the exponential model driver i finishes in the top k when fewer than k
+of the other drivers have finished before T_i:
+    P(rank_i <= k) = int_0^inf lambda_i exp(-lambda_i t) * P(N_{-i}(t) < k) dt
+where N_{-i}(t) is Poisson-binomial with success probabilities
+1 - exp(-lambda_j t). The integral is evaluated with a trapezoid rule in log t
+(spectrally accurate for this integrand) and the Poisson-binomial pmf with a
+truncated polynomial recursion, so no simulation is involved. The Jacobian
+is analytic: prefix/suffix products give every leave-two-out pmf in
+O(n^2 K) per quadrature node, and the fit is a trust-region least squares.
+
+Input: data/odds_markets.csv (Team;Driver;Market;Odds, Market = win/top3/...)
+Output: output/stage3_joint_lambda.csv
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+from scipy.optimize import least_squares
+from f1_time_rank.config import STAGE3_MARKETS_IN, STAGE3_JOINT_OUT
+from f1_time_rank.utils import fractional_to_rawprob, save_df
+from f1_time_rank.profiling import profiled, step
+from f1_time_rank.events import get_logger
+
+log = get_logger(__name__)
+
+# Same overall lambda scale as stage 3 (x0 = p_norm * 0.256)
+LAMBDA_TOTAL = 0.256
+
+
+def _log_time_nodes(lam_min, step=0.35, t_lo=1e-9, tail=50.0):
+    """Quadrature nodes/weights in t for lambdas normalized to sum 1."""
+    lam_min = max(lam_min, 1e-12)
+    s = np.arange(np.log(t_lo), np.log(tail / lam_min) + step, step)
+    t = np.exp(s)
+    return t, step * t
+
+
+def finish_probabilities(lam, ks, step=0.35, rows=None):
+    """P(rank_i <= k) for every driver and every k in ks.
+
+    Args:
+        lam: lambdas, shape (n,) or a batch (..., n). Only ratios matter.
+        ks: iterable of positive ints (1 = win).
+        step: log-time quadrature step (0.35 gives ~1e-9 accuracy).
+        rows: optional driver indices to evaluate (default: all drivers).
+
+    Returns:
+        array (..., n or len(rows), len(ks)).
+    """
+    lam = np.asarray(lam, dtype=float)
+    batch_shape = lam.shape[:-1]
+    n = lam.shape[-1]
+    lam = lam.reshape(-1, n)
+    lam = (lam / lam.sum(axis=1, keepdims=True)).T            # (n, B)
+    ks = np.asarray(ks, dtype=int)
+    rows = np.arange(n) if rows is None else np.asarray(rows, dtype=int)
+    if ks.size == 0:
+        return np.zeros(batch_shape + (len(rows), 0))
+    K = int(min(ks.max(), n))
+    t, w = _log_time_nodes(lam.min(), step=step)
+
+    # (N, n, B) survival a_j(t) and finished q_j(t); batch axis last so the
+    # recursion below works on contiguous (N, B) slabs
+    lt = t[:, None, None] * lam[None]
+    a = np.exp(-lt)
+    q = -np.expm1(-lt)
+
+    # G[m, i, N, B] = P(m of the drivers other than i finished by t)
+    G = np.zeros((K, len(rows)) + a[:, 0].shape)
+    G[0] = 1.0
+    for j in range(n):
+        own = np.flatnonzero(rows == j)
+        keep = G[:, own].copy()
+        aj = a[:, j]
+        qj = q[:, j]
+        G[1:] = aj * G[1:] + qj * G[:-1]
+        G[0] *= aj
+        G[:, own] = keep                           # driver i is not its own rival
+    C = np.cumsum(G, axis=0)                       # P(N_{-i}(t) < m + 1)
+    dens = lam[rows][:, None, :] * a[:, rows].transpose(1, 0, 2) * w[None, :, None]
+    k_idx = np.minimum(ks, K) - 1
+    P = np.einsum('itb,kitb->bik', dens, C[k_idx])
+    # top-n (or more) is certain
+    P[..., ks >= n] = 1.0
+    return P.reshape(batch_shape + P.shape[1:])
+
+
+def position_probability_matrix(lam, step=0.35):
+    """Full (n x n) matrix P(rank_i = r), rows = drivers, columns = positions."""
+    n = np.shape(lam)[-1]
+    cdf = finish_probabilities(lam, np.arange(1, n + 1), step=step)
+    return np.diff(cdf, axis=-1, prepend=0.0)
+
+
+def _probabilities_and_jacobian(lam, ks, t, w):
+    """P(rank_i <= k) and its analytic Jacobian w.r.t. lambda.
+
+    Returns P with shape (n, markets) and J with shape (n, markets, n),
+    J[i, k, j] = dP_ik / dlambda_j, for lambdas normalized to sum 1.
+    """
+    n = len(lam)
+    K = int(min(ks.max(), n))
+    k_idx = np.minimum(ks, K) - 1
+    eye = np.eye(n, dtype=bool)
+
+    lt = lam[None, :] * t[:, None]
+    a = np.exp(-lt)
+    q = -np.expm1(-lt)
+    A = np.where(eye[None, :, :], 1.0, a[:, None, :])   # (N, i, j) masked factor
+    Q = np.where(eye[None, :, :], 0.0, q[:, None, :])
+
+    # Prefix products Pre[:, i, j] = prod_{l<j, l!=i} (a_l + q_l z) and
+    # suffix products Suf[:, i, j] = prod_{l>j, l!=i} (a_l + q_l z)
+    N = len(t)
+    Pre = np.zeros((N, n, n + 1, K))
+    Pre[:, :, 0, 0] = 1.0
+    for j in range(n):
+        Pre[:, :, j + 1] = A[:, :, j, None] * Pre[:, :, j]
+        Pre[:, :, j + 1, 1:] += Q[:, :, j, None] * Pre[:, :, j, :-1]
+    Suf = np.zeros((N, n, n, K))
+    Suf[:, :, n - 1, 0] = 1.0
+    for j in range(n - 1, 0, -1):
+        Suf[:, :, j - 1] = A[:, :, j, None] * Suf[:, :, j]
+        Suf[:, :, j - 1, 1:] += Q[:, :, j, None] * Suf[:, :, j, :-1]
+
+    G = Pre[:, :, n]                                   # leave-one-out pmf
+    C = np.cumsum(G, axis=-1)[..., k_idx]              # P(N_{-i}(t) < k)
+    f = lam[None, :] * a                               # density lambda_i exp(-lambda_i t)
+    P = np.einsum('t,ti,tik->ik', w, f, C)
+
+    # Own lambda: d/dlambda_i of lambda_i exp(-lambda_i t)
+    J = np.zeros((n, len(ks), n))
+    J[np.arange(n), :, np.arange(n)] = np.einsum('t,ti,tik->ik', w, (1.0 - lt) * a, C)
+
+    # Other lambdas: dP(N_{-i} < k)/dq_j = -[leave-two-out pmf]_{k-1}
+    wf = w[:, None] * f
+    dq = t[:, None] * a                                # dq_j / dlambda_j
+    Pre_j = Pre[:, :, :n]
+    for col, m in enumerate(k_idx):
+        l2o = np.einsum('tijl,tijl->tij', Pre_j[..., :m + 1], Suf[..., m::-1])
+        l2o[:, eye] = 0.0
+        J[:, col, :] -= np.einsum('ti,tij,tj->ij', wf, l2o, dq)
+
+    certain = ks >= n
+    P[:, certain] = 1.0
+    J[:, certain, :] = 0.0
+    return P, J
+
+
+def fit_lambda_joint(targets, weights=None, x0=None, lambda_total=LAMBDA_TOTAL):
+    """Fit one lambda vector to several top-k markets by least squares.
+
+    Args:
+        targets: dict {k: array of probabilities per driver}. A complete
+                 market (every driver priced) holds normalized probabilities.
+                 A partial market (NaN for drivers not priced) holds the raw
+                 implied probabilities; its overround is unknown and fitted
+                 as a factor c_k with raw ~ c_k * P(rank <= k).
+        weights: optional dict {k: weight} (default 1 for every market).
+        x0: optional initial lambdas (default: winner market or uniform).
+        lambda_total: scale of the returned lambdas.
+
+    Returns:
+        (lambda_est, fitted probability matrix (n x markets), scipy result);
+        result.overround is {k: c_k} (1 for complete markets).
+    """
+    ks = np.array(sorted(targets), dtype=int)
+    target = np.column_stack([np.asarray(targets[k], dtype=float) for k in ks])
+    n = target.shape[0]
+    wk = np.array([1.0 if weights is None else weights.get(k, 1.0) for k in ks])
+    observed = ~np.isnan(target)
+    sqrt_w = np.sqrt(np.broadcast_to(wk[None, :], target.shape)[observed])
+    target_obs = target[observed]
+    partial = np.flatnonzero(~observed.all(axis=0))      # markets with a fitted factor
+    # column of every observation and its factor parameter (-1: factor 1)
+    obs_col = np.nonzero(observed)[1]
+    factor_of = np.full(len(ks), -1)
+    factor_of[partial] = np.arange(len(partial))
+    obs_factor = factor_of[obs_col]
+    scaled = obs_factor >= 0
+
+    if x0 is None:
+        if 1 in targets and not np.any(np.isnan(targets[1])):
+            x0 = np.asarray(targets[1], dtype=float)
+        else:
+            x0 = np.ones(n)
+    x0 = np.maximum(np.asarray(x0, dtype=float), 1e-8)
+    theta0 = np.log(x0 / x0.sum())
+    # log c_k starts at the market's raw sum over the model's sum at x0
+    log_c0 = []
+    if len(partial):
+        P0 = finish_probabilities(x0, ks[partial])
+        log_c0 = [np.log(np.nansum(target[:, m]) / P0[observed[:, m], j].sum())
+                  for j, m in enumerate(partial)]
+    x_start = np.concatenate([theta0, log_c0])
+
+    # Quadrature grid fixed for the whole fit (wide enough for tiny lambdas)
+    t, w = _log_time_nodes(np.exp(theta0).min() / 10.0)
+    cache = {}
+
+    def softmax(theta):
+        lam = np.exp(theta - theta.max())
+        return lam / lam.sum()
+
+    def evaluate(theta):
+        key = theta.tobytes()
+        if key not in cache:
+            cache.clear()
+            cache[key] = _probabilities_and_jacobian(softmax(theta), ks, t, w)
+        return cache[key]
+
+    def factors(x):
+        c = np.ones(len(target_obs))
+        c[scaled] = np.exp(x[n:])[obs_factor[scaled]]
+        return c
+
+    def residuals(x):
+        P, _ = evaluate(x[:n])
+        return sqrt_w * (factors(x) * P[observed] - target_obs)
+
+    def jacobian(x):
+        lam = softmax(x[:n])
+        P, J = evaluate(x[:n])
+        # softmax chain rule: dlam/dtheta = diag(lam) - lam lam'
+        J_theta = J * lam[None, None, :] - np.einsum('ikj,j->ik', J, lam)[..., None] * lam[None, None, :]
+        c = factors(x)
+        J_x = np.zeros((len(target_obs), len(x)))
+        J_x[:, :n] = (sqrt_w * c)[:, None] * J_theta[observed]
+        rows = np.flatnonzero(scaled)
+        J_x[rows, n + obs_factor[rows]] = sqrt_w[rows] * c[rows] * P[observed][rows]
+        return J_x
+
+    # log-lambdas bounded so that no driver collapses to exactly zero
+    lower = np.concatenate([np.full(n, np.log(1e-12)), np.full(len(partial), -np.inf)])
+    upper = np.concatenate([np.zeros(n), np.full(len(partial), np.inf)])
+    res = least_squares(residuals, x_start, jac=jacobian, method='trf',
+                        bounds=(lower, upper), x_scale='jac', ftol=1e-12, xtol=1e-12, gtol=1e-12)
+    lam = softmax(res.x[:n])
+    fitted = finish_probabilities(lam, ks)
+    res.overround = {int(k): 1.0 for k in ks}
+    res.overround.update({int(ks[m]): float(np.exp(res.x[n + j])) for j, m in enumerate(partial)})
+    return lam * lambda_total, fitted, res
+
+
+def parse_market(m):
+    """'win' -> 1, 'top3' / 'Top 3' / '3' -> 3."""
+    s = str(m).strip().lower().replace(' ', '')
+    if s in ('win', 'winner', 'outright'):
+        return 1
+    if s.startswith('top'):
+        s = s[3:]
+    return int(s)
+
+
+@profiled('stage3_joint')
+def run_stage3_joint(input_path=STAGE3_MARKETS_IN, output_path=STAGE3_JOINT_OUT):
+    log.info('Stage 3 (joint markets): estimating lambda from %s', input_path)
+    df = pd.read_csv(input_path, sep=None, engine='python')
+    df.columns = df.columns.str.strip()
+    cols = {c.lower(): c for c in df.columns}
+    for k in ('driver', 'market', 'odds'):
+        if k not in cols:
+            raise ValueError(f"Input file {input_path} must contain column '{k}' (found: {list(df.columns)})")
+    df['Driver'] = df[cols['driver']].astype(str).str.strip()
+    df['k'] = df[cols['market']].apply(parse_market)
+    df['raw_implied_p'] = df[cols['odds']].astype(str).str.strip().apply(fractional_to_rawprob)
+
+    drivers = list(dict.fromkeys(df['Driver']))
+    wide = df.pivot_table(index='Driver', columns='k', values='raw_implied_p', aggfunc='first')
+    wide = wide.reindex(drivers)
+    targets = {}
+    for k in wide.columns:
+        raw = wide[k].values.astype(float)
+        if np.isnan(raw).any():
+            # partial market: the overround is fitted with the lambdas
+            targets[int(k)] = raw
+        else:
+            # remove overround: implied probabilities of a top-k market sum to k
+            targets[int(k)] = raw / raw.sum() * min(k, len(drivers))
+        log.info('  Market top%d: %d drivers priced', k, np.sum(~np.isnan(raw)))
+
+    with step('least_squares', rows=len(targets)):
+        lam, fitted, res = fit_lambda_joint(targets)
+    log.info('Optimization %s after %d evaluations, RSS=%.3e', 'converged' if res.success else 'stopped',
+             res.nfev, 2 * res.cost)
+    for k, c in res.overround.items():
+        if np.isnan(targets[k]).any():
+            log.info('  Market top%d: fitted overround %.4f', k, c)
+
+    out_df = pd.DataFrame({'Driver': drivers, 'lambda_est': lam})
+    for j, k in enumerate(sorted(targets)):
+        out_df[f'p_top{k}'] = targets[k] / res.overround[k]
+        out_df[f'p_top{k}_predicted'] = fitted[:, j]
+    save_df(out_df, output_path)
+    log.info('Stage 3 (joint) done. Wrote -> %s', output_path)
+    return out_df
+
+if __name__ == '__main__':
+    run_stage3_joint()
@@ -0,0 +1,136 @@
+"""
+Stage 4: Compute sigma and mu_i from p_norm using normal quantile mapping:
+    z_i = Phi^{-1}(p_i)
+    sigma = (1.5*n - n(n+1)/2) / sum(z_i)
+    mu_i = 1.5 - sigma * z_i
+Input: output/stage2_probabilities.csv or stage3 output (we use p_norm)
+Output: output/stage4_mu_sigma.csv
+
+mu_sigma_batch applies the same mapping to many markets at once, either as a
+padded (markets x drivers) array with NaN padding or as a ragged flat array
+with per-market start offsets.
+Given the stage 3 lambda covariance, lambda draws are pushed through the same
+kernel to report standard errors of mu_hat and sigma_hat.
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+from scipy.special import ndtri
+from f1_time_rank.config import STAGE2_OUT, STAGE3_OUT, STAGE4_OUT
+from f1_time_rank.utils import save_df, read_df
+from f1_time_rank.profiling import profiled
+from f1_time_rank.events import get_logger
+
+log = get_logger(__name__)
+
+
+def mu_sigma_batch(p, offsets=None, eps=1e-12, dtype=np.float64):
+    """Vectorized stage 4 over a batch of markets.
+
+    Args:
+        p: either a 2D padded array (markets x drivers) where NaN marks an
+           empty slot, or a 1D ragged array of all markets concatenated.
+        offsets: for ragged input, start index of every market in p
+                 (sorted, first element 0, no empty markets).
+        eps: clipping applied to p before the quantile transform.
+        dtype: output dtype (np.float64 or np.float32); the arithmetic is
+               float64 either way.
+
+    Returns:
+        z, mu_hat with the same layout as p, and sigma_hat per market.
+    """
+    p = np.asarray(p)
+    padded = offsets is None
+    if padded:
+        if p.ndim != 2:
+            raise ValueError('Padded input must be 2D (markets x drivers)')
+        mask = ~np.isnan(p)
+        counts = mask.sum(axis=1)
+        flat = p[mask]
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    else:
+        if p.ndim != 1:
+            raise ValueError('Ragged input must be 1D with offsets')
+        flat = p
+        offsets = np.asarray(offsets, dtype=np.intp)
+        counts = np.diff(np.append(offsets, len(flat)))
+    if np.any(counts <= 0):
+        raise ValueError('Every market must contain at least one driver')
+
+    # Clip and transform in float64 (1 - eps rounds to 1 in float32, where
+    # ndtri would give inf); only the outputs are cast to dtype
+    flat = np.clip(flat.astype(np.float64, copy=False), eps, 1 - eps)
+    z = ndtri(flat)
+    z_sum = np.add.reduceat(z, offsets)
+    n = counts.astype(np.float64)
+    sigma64 = (1.5 * n - n * (n + 1) / 2.0) / z_sum
+    mu = (1.5 - np.repeat(sigma64, counts) * z).astype(dtype, copy=False)
+    sigma_hat = sigma64.astype(dtype, copy=False)
+    z = z.astype(dtype, copy=False)
+
+    if padded:
+        z_out = np.full(p.shape, np.nan, dtype=dtype)
+        mu_out = np.full(p.shape, np.nan, dtype=dtype)
+        z_out[mask] = z
+        mu_out[mask] = mu
+        return z_out, mu_out, sigma_hat
+    return z, mu, sigma_hat
+
+
+def mu_sigma_uncertainty(lambda_hat, cov, n_draws=2000, rng=None):
+    """Standard errors of mu_hat (per driver) and sigma_hat from lambda draws.
+    Each draw is turned into p = lambda / sum(lambda) and all draws go through
+    mu_sigma_batch as one padded batch."""
+    from f1_time_rank.stages.stage3_estimate_lambda import sample_lambdas
+    draws = sample_lambdas(lambda_hat, cov, n_draws, rng=rng)
+    p = draws / draws.sum(axis=1, keepdims=True)
+    _, mu, sigma = mu_sigma_batch(p)
+    return mu.std(axis=0, ddof=1), sigma.std(ddof=1)
+
+
+@profiled('stage4')
+def run_stage4(input_path=STAGE2_OUT, output_path=STAGE4_OUT, market_col=None,
+               lambda_cov_path=None, lambda_path=STAGE3_OUT, n_draws=2000):
+    log.info('Stage 4: computing mu and sigma from p_norm in %s', input_path)
+    df = read_df(input_path)
+    if 'p_norm' not in df.columns:
+        raise ValueError('Expected p_norm in input')
+    if market_col is not None:
+        # long-format batch: one market per value of market_col
+        df = df.sort_values(market_col, kind='stable').reset_index(drop=True)
+        markets = df[market_col].values
+        offsets = np.flatnonzero(np.r_[True, markets[1:] != markets[:-1]])
+        log.info('Batch mode: %d markets', len(offsets))
+    else:
+        offsets = np.array([0])
+    p = df['p_norm'].values.astype(float)
+    # handle edge probabilities near 0 or 1 (clipped inside the kernel)
+    z, mu_hat, sigma_hat = mu_sigma_batch(p, offsets)
+    counts = np.diff(np.append(offsets, len(p)))
+    out = df.copy()
+    out['z'] = z
+    out['mu_hat'] = mu_hat
+    out['sigma_hat'] = np.repeat(sigma_hat, counts)
+    if lambda_cov_path is not None:
+        if market_col is not None:
+            raise ValueError('Lambda covariance is only supported for a single market')
+        lam = read_df(lambda_path, columns=['lambda_est'])['lambda_est'].values.astype(float)
+        cov = read_df(lambda_cov_path, index_col=0).values
+        mu_se, sigma_se = mu_sigma_uncertainty(lam, cov, n_draws=n_draws)
+        out['mu_hat_se'] = mu_se
+        out['sigma_hat_se'] = sigma_se
+        log.info('Parameter uncertainty from %d lambda draws: sigma_hat_se=%.4f', n_draws, sigma_se)
+    save_df(out, output_path)
+    log.info('Stage 4 done. Wrote -> %s', output_path)
+    return out
+
+if __name__ == '__main__':
+    run_stage4()
@@ -0,0 +1,259 @@
+"""
+Stage 5: Regression analysis that corresponds to F1analysis2.R
+- reads positions matrix file (text), flattens into positionlabel, builds dummies,
+  runs OLS and stepwise selection (p-value based implementation provided),
+  and writes summary/coefficients to CSV.
+- team dummies are chosen by a real stepwise search (stepwise.StepwiseOLS,
+  AIC, both directions from driverorder2 like R's step() with
+  lower = ~driverorder2), which selects the six journal teams on 2022 data.
+- bootstrap=B adds a parametric bootstrap of all coefficients from B
+  simulated exponential-race seasons (bootstrap_regression).
+- permutations=P adds a within-pair label permutation test of driverorder2
+  (permutation_test).
+- engine='sparse' (default) builds a CSR design from integer team codes and
+  solves the normal equations (regression_engine) and returns an OLSResult
+  (params, bse, pvalues, cov_params(), conf_int(), ... but no summary());
+  engine='statsmodels' keeps the original get_dummies + sm.OLS path and
+  returns statsmodels' RegressionResults.
+Input: data/f1seconddata.txt
+Output: output/stage5_regression.csv
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+from f1_time_rank.config import STAGE5_IN, STAGE5_OUT
+from f1_time_rank.utils import save_df
+from f1_time_rank.profiling import profiled, step
+from f1_time_rank.events import get_logger, DEBUG, INFO
+from f1_time_rank.stages.regression_engine import encode_categorical, build_design
+from f1_time_rank.stages.stepwise import StepwiseOLS
+from f1_time_rank.stages.results_store import open_results
+
+# Team of each row of f1seconddata.txt (data order)
+TEAMS_2022 = [
+    "Mercedes", "Mercedes",      # LewisHamilton, GeorgeRussel
+    "RedBull", "RedBull",        # MaxVerstappen, SergioPerez
+    "Ferrari", "Ferrari",        # CharlesLeclerc, CarlosSainz
+    "Mclaren", "Mclaren",        # LandoNorris, DanielRiccardo
+    "Alpine", "Alpine",          # FernandoAlonso, EstabanOcon (Note: Fernando was at Alpine in 2022)
+    "AstonMartin", "AstonMartin", # SebastianVettel, LanceStroll
+    "Haas", "Haas",              # KevinMagnussen, MickSchumacher
+    "AlfaTauri", "AlfaTauri",    # PierreGasly, YukiTsunoda
+    "AlfaRomeo", "AlfaRomeo",    # ZhouGuanyu, ValtteriBottas
+    "Williams", "Williams"       # NicholasLatifi, AlexAlbon
+]
+
+log = get_logger(__name__)
+
+
+def read_positions_matrix(path):
+    """(drivers x races positions, driver names) for path: the whitespace
+    text matrix (driver name in column 0), a long CSV or a results store
+    directory (last season). Nothing is written; pass a store directory
+    (build_results_store / convert_results) to skip parsing."""
+    pos, driver_names, _ = open_results(path, teams=TEAMS_2022).positions_matrix()
+    return pos, driver_names
+
+
+def positions_frame(pos, teams=TEAMS_2022, names=None, season=None):
+    """Long regression frame (race-major, like R's c(position[,1], ...)) from a
+    drivers x races positions matrix; teammates are consecutive rows.
+    names / season add 'driver' and 'season' (plus 'race') columns, as used by
+    the mixed-effects model."""
+    n_drivers, n_races = pos.shape
+    df = pd.DataFrame({
+        'positionlabel': pos.flatten(order='F').astype(float),
+        'driverorder2': np.tile(np.arange(n_drivers) % 2, n_races).astype(float),
+        'constructor': np.tile(np.asarray(teams), n_races),
+    })
+    if names is not None:
+        df['driver'] = np.tile(np.asarray(names), n_races)
+    if season is not None:
+        df['season'] = season
+        df['race'] = np.repeat(np.arange(1, n_races + 1), n_drivers)
+    return df
+
+
+def select_teams_stepwise(df, criterion='aic', direction='both', engine=None):
+    """Stepwise selection of team dummies (Williams = reference) with
+    driverorder2 always kept, mirroring
+    step(lm(positionlabel ~ driverorder2), scope = list(lower = ~driverorder2,
+         upper = ~driverorder2 + all team dummies)).
+    engine: a StepwiseOLS over the full design to reuse (e.g. from the design
+    cache) instead of encoding df again.
+    Returns (selected teams, StepwiseResult)."""
+    if engine is None:
+        team_codes, teams = encode_categorical(df['constructor'].values, reference='Williams')
+        X, names = build_design(len(df), numeric={'driverorder2': df['driverorder2'].values},
+                                categorical={'constructor': (team_codes, teams)})
+        engine = StepwiseOLS.from_design(X, df['positionlabel'].values, names)
+    teams = [c for c in engine.names if c not in ('const', 'driverorder2')]
+    lower = ['const', 'driverorder2']
+    result = engine.step(start=lower, lower=lower, direction=direction, criterion=criterion)
+    selected = [c for c in result.selected if c in teams]
+    return selected, result
+
+
+@profiled('stage5')
+def run_stage5(input_path=STAGE5_IN, output_path=STAGE5_OUT, engine='sparse', bootstrap=None,
+               permutations=None):
+    """Returns the fitted model: a regression_engine.OLSResult for the sparse
+    engine, statsmodels' RegressionResults (with summary()) for
+    engine='statsmodels'."""
+    log.info('Stage 5: regression analysis using %s', input_path)
+    if engine not in ('sparse', 'statsmodels'):
+        raise ValueError("engine must be 'sparse' or 'statsmodels'")
+    # Shared with the significance analysis: flattening, encoding and the
+    # Gram matrix are built once per input file (see design_cache)
+    from f1_time_rank.stages.design_cache import load_design
+    with step('load_design') as rec:
+        design = load_design(input_path, teams=TEAMS_2022, reference='Williams')
+        rec['rows'] = len(design.y)
+    df, driver_names = design.df, design.driver_names
+    n_drivers = len(driver_names)
+    n_races = len(df) // n_drivers
+
+    log.info('Data shape: %d drivers x %d races', n_drivers, n_races)
+    log.info('Total observations: %d', len(df))
+    if log.isEnabledFor(DEBUG):
+        log.debug('Driver names: %s', driver_names)
+        log.debug('Teams found: %s', df['constructor'].unique())
+        log.debug('Driver order distribution:\n%s', df['driverorder2'].value_counts().sort_index())
+    
+    # Prepare feature matrix from the stepwise result
+    # R stepwise output: driverorder2 + redbulldummy + mercedesdummy + ferraridummy + mclarendummy + alpinedummy + astonmartindummy
+    # Williams is the reference category (like R code)
+    with step('stepwise'):
+        significant_teams, step_result = design.select_teams()
+    if log.isEnabledFor(DEBUG):
+        log.debug('\nStepwise selection (AIC, both directions):')
+        for _, row in step_result.history.iterrows():
+            log.debug('  %-15s AIC=%.3f', row['step'] or '<start>', row['criterion'])
+    y = df['positionlabel'].astype(float)
+    
+    if engine == 'statsmodels':
+        import statsmodels.api as sm
+        # Create dummy variables for constructors (excluding Williams as reference)
+        team_dummies = pd.get_dummies(df['constructor'], prefix='', prefix_sep='').astype(float)
+        if 'Williams' in team_dummies.columns:
+            team_dummies = team_dummies.drop('Williams', axis=1)
+        
+        # Filter team dummies to only include significant ones
+        available_teams = [col for col in team_dummies.columns if col in significant_teams]
+        team_dummies_filtered = team_dummies[available_teams]
+        
+        X = pd.concat([df[['driverorder2']], team_dummies_filtered], axis=1)
+        X = sm.add_constant(X).astype(float)
+        features = list(X.columns)
+    else:
+        # Selected columns of the cached design: a submatrix solve on X'X
+        features = design.columns(significant_teams)
+        available_teams = features[2:]
+        X = design.X[:, [design.names.index(c) for c in features]]
+    
+    log.info('Teams included in model: %s', available_teams)
+    log.debug('X shape: %s, y shape: %s', X.shape, y.shape)
+    log.debug('Features: %s', features)
+    
+    # Fit OLS model (this represents the stepwise result)
+    try:
+        with step('fit', rows=len(y)):
+            if engine == 'statsmodels':
+                model = sm.OLS(y, X).fit()
+            else:
+                model = design.fit(significant_teams)
+        
+        # Store coefficients and summary stats
+        coef = model.params.rename('Estimate').to_frame().reset_index().rename(columns={'index':'term'})
+        coef['Std_Error'] = model.bse.values
+        coef['t_value'] = model.tvalues.values
+        coef['p_value'] = model.pvalues.values
+        coef['r2'] = model.rsquared
+        coef['aic'] = model.aic
+        
+        if log.isEnabledFor(INFO):
+            log.info('\nStepwise Regression Results (Table 3 Style):')
+            log.info('=' * 80)
+            log.info('R² value = %.4f', model.rsquared)
+            log.info('=' * 80)
+            log.info(f"{'Coefficient':<15} {'Estimate':<10} {'Std. Error':<12} {'t-value':<10} {'p-value':<10}")
+            log.info('-' * 80)
+            
+            # Display results in journal format
+            for _, row in coef.iterrows():
+                term = row['term']
+                if term == 'const':
+                    term_display = '(Intercept)'
+                elif term == 'driverorder2':
+                    term_display = 'Second driver'
+                else:
+                    term_display = term
+                
+                log.info('%-15s %-10.4f %-12.4f %-10.3f %-10.4f', term_display, row['Estimate'],
+                         row['Std_Error'], row['t_value'], row['p_value'])
+        
+        # Calculate confidence interval for second driver effect (like R code)
+        if 'driverorder2' in model.params.index:
+            coef_driver = model.params['driverorder2']
+            stderr_driver = model.bse['driverorder2']
+            df_resid = model.df_resid
+            
+            # R: qt(0.975, 492) with df=492
+            from scipy.special import stdtrit   # t.ppf without importing scipy.stats
+            t_critical = stdtrit(df_resid, 0.975)
+            
+            ci_lower = coef_driver - t_critical * stderr_driver
+            ci_upper = coef_driver + t_critical * stderr_driver
+            
+            log.info('\nSecond Driver Effect:')
+            log.info('Coefficient: %.4f', coef_driver)
+            log.info('Standard Error: %.4f', stderr_driver)
+            log.info('95%% Confidence Interval: [%.3f, %.3f]', ci_lower, ci_upper)
+            log.info('Degrees of freedom: %s', df_resid)
+            
+            # R calculation verification
+            log.debug('\nR calculation verification:')
+            log.debug('%.3f - qt(0.975, %s) * %.4f = %.3f', coef_driver, df_resid, stderr_driver, ci_lower)
+            log.debug('%.3f + qt(0.975, %s) * %.4f = %.3f', coef_driver, df_resid, stderr_driver, ci_upper)
+        
+        # Additional summary statistics
+        log.info('\nModel Summary:')
+        log.info('Number of observations: %d', len(y))
+        log.info('R-squared: %.4f', model.rsquared)
+        log.info('Adjusted R-squared: %.4f', model.rsquared_adj)
+        log.info('F-statistic: %.3f', model.fvalue)
+        log.info('Prob (F-statistic): %.2e', model.f_pvalue)
+        log.info('AIC: %.2f', model.aic)
+        
+        if bootstrap:
+            from f1_time_rank.stages.bootstrap_regression import bootstrap_stage5
+            log.info('')
+            bootstrap_stage5(input_path, n_boot=bootstrap, teams=significant_teams)
+        if permutations:
+            from f1_time_rank.stages.permutation_test import teammate_permutation_test
+            log.info('')
+            teammate_permutation_test(input_path, n_perm=permutations, teams=significant_teams)
+        
+        save_df(coef, output_path)
+        log.info('\nStage 5 done. Wrote -> %s', output_path)
+        return model
+        
+    except Exception as e:
+        log.error('Error in OLS fitting: %s', e)
+        log.error('Attempting to debug data issues...')
+        if engine == 'statsmodels':
+            log.error('X has NaN: %s', X.isnull().any().any())
+        log.error('y has NaN: %s', y.isnull().any())
+        log.error('X columns: %s', features)
+        raise
+
+if __name__ == '__main__':
+    run_stage5()
@@ -0,0 +1,250 @@
+"""
+Stage 6 (optional): driver strengths from observed finishing orders.
+
+Under the exponential model a race finishes in the order of
+T_i ~ Exp(lambda_i), so the finishing order is a Plackett-Luce ranking:
+the winner is i with probability lambda_i / sum(lambda), the runner-up is
+drawn the same way from the remaining drivers, and so on. The lambdas are
+fitted by the MM algorithm of Hunter (2004):
+    lambda_i <- W_i / sum_{stages s where i is still running} 1 / sum_{k in s} lambda_k
+where W_i counts the stages driver i wins. Races are stored as a padded
+(races x entrants) matrix of driver indices in finishing order, so the
+denominators are reverse cumulative sums along rows and each iteration is a
+handful of array operations.
+
+DNFs / partial rankings: finishers are ranked, non-finishers of a race are
+only known to be behind every finisher (dnf='bottom', they stay in every
+choice set of that race) or are ignored (dnf='drop').
+Warm starts: pass lam0 (e.g. the previous season's fit).
+
+Input: data/f1seconddata.txt (drivers x races positions; NaN/0 = DNF)
+Output: output/stage6_plackett_luce.csv
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+from f1_time_rank.config import STAGE5_IN, STAGE6_OUT
+from f1_time_rank.utils import save_df
+from f1_time_rank.profiling import profiled, step
+from f1_time_rank.stages.stage5_regression import read_positions_matrix
+from f1_time_rank.events import get_logger, INFO
+
+log = get_logger(__name__)
+
+
+class Rankings:
+    """Padded finishing orders.
+
+    order: (races x max entrants) driver indices in finishing order, -1 pads.
+    finished: same shape, True for ranked finishers (False for DNF and pads).
+    """
+
+    def __init__(self, order, finished, n_drivers, names=None):
+        self.order = np.asarray(order, dtype=np.int64)
+        self.finished = np.asarray(finished, dtype=bool)
+        self.n_drivers = int(n_drivers)
+        self.names = names
+
+    @classmethod
+    def from_positions(cls, pos, names=None, dnf='bottom'):
+        """From a drivers x races matrix of positions (NaN or <= 0 = DNF,
+        i.e. did not finish; drivers who did not start should be absent,
+        which a wide matrix cannot express, so every row starts every race)."""
+        pos = np.asarray(pos, dtype=float)
+        n_drivers, n_races = pos.shape
+        ranked = np.isfinite(pos) & (pos > 0)
+        # finishers first by position, then DNFs (key +inf)
+        key = np.where(ranked, pos, np.inf).T
+        order = np.argsort(key, axis=1, kind='stable')
+        finished = np.take_along_axis(ranked.T, order, axis=1)
+        if dnf == 'drop':
+            order = np.where(finished, order, -1)
+        elif dnf != 'bottom':
+            raise ValueError("dnf must be 'bottom' or 'drop'")
+        return cls(order, finished, n_drivers, names)
+
+    @classmethod
+    def from_long(cls, df, race_col='race', driver_col='driver', position_col='position',
+                  dnf='bottom'):
+        """From one row per (race, entrant); NaN or <= 0 position = DNF."""
+        drivers, driver_idx = np.unique(df[driver_col].values, return_inverse=True)
+        races, race_idx = np.unique(df[race_col].values, return_inverse=True)
+        pos = pd.to_numeric(df[position_col], errors='coerce').values.astype(float)
+        ranked = np.isfinite(pos) & (pos > 0)
+        if dnf == 'drop':
+            keep = ranked
+        elif dnf == 'bottom':
+            keep = np.ones(len(pos), dtype=bool)
+        else:
+            raise ValueError("dnf must be 'bottom' or 'drop'")
+        race_idx, driver_idx, pos, ranked = race_idx[keep], driver_idx[keep], pos[keep], ranked[keep]
+        # sort by race, then finishers by position, then DNFs
+        sort = np.lexsort((np.where(ranked, pos, np.inf), race_idx))
+        race_idx, driver_idx, ranked = race_idx[sort], driver_idx[sort], ranked[sort]
+        counts = np.bincount(race_idx, minlength=len(races))
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        slot = np.arange(len(race_idx)) - starts[race_idx]
+        order = np.full((len(races), counts.max()), -1, dtype=np.int64)
+        finished = np.zeros(order.shape, dtype=bool)
+        order[race_idx, slot] = driver_idx
+        finished[race_idx, slot] = ranked
+        return cls(order, finished, len(drivers), list(drivers))
+
+    def choice_mask(self):
+        """Stages that are real choices: a ranked finisher with at least one
+        other driver still in the race behind it."""
+        present = self.order >= 0
+        n_left = present[:, ::-1].cumsum(axis=1)[:, ::-1]
+        return self.finished & (n_left > 1)
+
+
+def _denominators(lam_ext, order, choice):
+    """Per-driver sum of 1/(rate mass still racing) over the stages each
+    driver takes part in, plus the log-likelihood."""
+    w = lam_ext[order]                                   # pads -> index n -> rate 0
+    remaining = np.cumsum(w[:, ::-1], axis=1)[:, ::-1]
+    inv = np.zeros_like(w)
+    np.divide(1.0, remaining, out=inv, where=choice)
+    cum = np.cumsum(inv, axis=1)
+    denom = np.bincount(order.ravel(), weights=cum.ravel(), minlength=len(lam_ext))
+    loglik = np.sum(np.log(w[choice])) - np.sum(np.log(remaining[choice]))
+    return denom, loglik
+
+
+def fit_plackett_luce(rankings, lam0=None, prior=None, max_iter=10_000, tol=1e-9,
+                      accelerate=True):
+    """MM fit of Plackett-Luce rates.
+
+    Args:
+        rankings: Rankings.
+        lam0: warm start (any positive scale).
+        prior: optional (shape, rate) of a Gamma prior on every lambda; gives
+               the MAP estimate. shape > 1 keeps drivers that never beat
+               anyone above 0; rate > 0 fixes the scale. With rate 0 the
+               density prod lambda^(shape-1) is maximized on the simplex
+               sum lambda = 1 (the posterior has no maximum in scale); that
+               constrained MAP is the unconstrained one for rate
+               n (shape - 1), which is what the MM steps use.
+        tol: stop when the largest relative change of lambda is below tol.
+        accelerate: SQUAREM extrapolation of the MM map (same fixed point,
+                    far fewer iterations when the field is large).
+
+    Returns:
+        (lambda normalized to sum 1, dict with n_iter, loglik, converged)
+    """
+    n = rankings.n_drivers
+    # padding reads the extra zero rate at index n
+    order = np.where(rankings.order >= 0, rankings.order, n)
+    choice = rankings.choice_mask()
+    wins = np.bincount(order[choice], minlength=n + 1)[:n].astype(float)
+    a, b = (1.0, 0.0) if prior is None else map(float, prior)
+    if prior is None and np.any(wins == 0):
+        raise ValueError('Some drivers never beat anyone: the MLE is 0 for them; '
+                         'pass prior=(shape, rate) for a MAP fit')
+    if prior is not None and not (a > 1.0 and b >= 0.0):
+        # the likelihood is scale-free: with shape <= 1 the posterior has no
+        # maximum (the rates drift to 0, or below it for drivers without wins)
+        raise ValueError(f'prior needs shape > 1 and rate >= 0, got {prior}')
+    if prior is not None and b == 0.0:
+        # KKT on the simplex: (wins + a - 1) / lam = denom + mu with
+        # mu = n (a - 1), since sum(lam * denom) = sum(wins) for any lam
+        b = n * (a - 1.0)
+    normalize = b == 0.0                     # MLE: scale-free, kept on the simplex
+
+    def mm(lam):
+        denom, _ = _denominators(np.append(lam, 0.0), order, choice)
+        new = (wins + a - 1.0) / (denom[:n] + b)
+        if normalize:
+            new /= new.sum()
+        return new
+
+    lam = np.full(n, 1.0 / n) if lam0 is None else np.asarray(lam0, dtype=float).copy()
+    if normalize:
+        lam /= lam.sum()
+    converged = False
+    n_iter = 0
+    while n_iter < max_iter:
+        if accelerate:
+            # SQUAREM (Varadhan & Roland 2008), step length S3 with fallback
+            lam1 = mm(lam)
+            lam2 = mm(lam1)
+            r = lam1 - lam
+            v = lam2 - 2 * lam1 + lam
+            alpha = -np.sqrt((r @ r) / max(v @ v, 1e-300))
+            new = lam - 2 * alpha * r + alpha ** 2 * v if alpha < -1 else lam2
+            if np.any(new <= 0):
+                new = lam2
+            new = mm(new)
+            n_iter += 3
+        else:
+            new = mm(lam)
+            n_iter += 1
+        change = np.max(np.abs(new - lam) / new)
+        lam = new
+        if change < tol:
+            converged = True
+            break
+    _, loglik = _denominators(np.append(lam, 0.0), order, choice)
+    lam = lam / lam.sum()
+    return lam, {'n_iter': n_iter, 'loglik': float(loglik), 'converged': converged}
+
+
+def log_lambda_covariance(rankings, lam):
+    """Inverse observed information of log lambda at lam (pseudo-inverse:
+    the overall scale is not identified). Loops over races with an
+    (entrants x stages) matrix each, meant for season-sized data."""
+    n = rankings.n_drivers
+    choice = rankings.choice_mask()
+    info = np.zeros((n, n))
+    for order, stages in zip(rankings.order, choice):
+        present = order >= 0
+        order, stages = order[present], stages[present]
+        w = lam[order]
+        remaining = np.cumsum(w[::-1])[::-1]
+        # p[r, j] = P(entrant r is picked at stage j), r still running at j
+        p = np.tril(w[:, None] * np.where(stages, 1.0 / remaining, 0.0)[None, :])
+        info[np.ix_(order, order)] += np.diag(p.sum(axis=1)) - p @ p.T
+    return np.linalg.pinv(info)
+
+
+@profiled('stage6')
+def run_stage6(input_path=STAGE5_IN, output_path=STAGE6_OUT, dnf='bottom', lam0=None):
+    log.info('Stage 6: Plackett-Luce fit of finishing orders in %s', input_path)
+    pos, driver_names = read_positions_matrix(input_path)
+    rankings = Rankings.from_positions(pos, names=list(driver_names), dnf=dnf)
+    log.info('Data shape: %d drivers x %d races', pos.shape[0], pos.shape[1])
+    with step('fit_plackett_luce', rows=pos.shape[1], unit='races') as rec:
+        lam, info = fit_plackett_luce(rankings, lam0=lam0)
+        rec['iterations'] = info['n_iter']
+    log.info('Converged: %s after %d MM steps, log-likelihood %.3f', info['converged'],
+             info['n_iter'], info['loglik'])
+
+    finished = np.isfinite(pos) & (pos > 0)
+    with step('covariance'):
+        cov = log_lambda_covariance(rankings, lam)
+    out = pd.DataFrame({
+        'Driver': driver_names,
+        'lambda_pl': lam,
+        'log_lambda_se': np.sqrt(np.diag(cov)),
+        'p_win': lam / lam.sum(),
+        'races': pos.shape[1],
+        'finishes': finished.sum(axis=1),
+        'mean_position': np.nanmean(np.where(finished, pos, np.nan), axis=1),
+    }).sort_values('lambda_pl', ascending=False)
+    if log.isEnabledFor(INFO):
+        log.info('%s', out.head(10).to_string(index=False))
+    save_df(out, output_path)
+    log.info('Stage 6 done. Wrote -> %s', output_path)
+    return out
+
+
+if __name__ == '__main__':
+    run_stage6()
@@ -0,0 +1,186 @@
+"""
+Stage 6 (optional): posterior of the exponential-race rates given the race
+results, by Gibbs sampling with the latent-variable augmentation of Caron &
+Doucet (2012).
+
+Prior: lambda_k ~ Gamma(a, b_k), centred on the stage 3 odds estimates
+(prior mean of lambda_k proportional to the odds lambda of the same driver;
+drivers without odds get the median). For every choice stage j of every race
+a latent Z_j ~ Exp(D_j) is drawn, D_j being the rate mass still racing, which
+makes the rate update conjugate:
+    lambda_k | Z ~ Gamma(a + W_k, b_k + sum of Z_j over stages k runs in)
+Each sweep is the same padded reverse-cumsum / bincount pass as the stage 6
+MM fit, for all races and drivers at once. A final step redraws the overall
+scale given the shares (the likelihood only depends on the shares), which
+keeps the chain from drifting along the unidentified scale.
+
+Chains run in parallel processes; split R-hat and effective sample sizes are
+reported for the win shares lambda_k / sum(lambda).
+
+Input: data/f1seconddata.txt, output/stage3_lambda.csv (prior centre)
+Output: output/stage6_posterior.csv
+"""
+import numpy as np
+import sys
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+from f1_time_rank.config import STAGE3_OUT, STAGE5_IN, STAGE6_POSTERIOR_OUT
+from f1_time_rank.utils import save_df, read_df, match_driver_names
+from f1_time_rank.profiling import profiled, step
+from f1_time_rank.stages.stage5_regression import read_positions_matrix
+from f1_time_rank.stages.stage6_plackett_luce import Rankings
+from f1_time_rank.events import get_logger, INFO
+
+log = get_logger(__name__)
+
+
+def _gibbs_chain(args):
+    """One chain; returns win shares (kept sweeps x drivers)."""
+    order, choice, wins, a, b, n_sweeps, burn_in, thin, seed = args
+    rng = np.random.default_rng(seed)
+    n = len(wins)
+    shape_post = a + wins
+    lam = rng.gamma(a, 1.0 / b)
+    lam_ext = np.zeros(n + 1)                # index n = padding, rate 0
+    kept = np.empty(((n_sweeps - burn_in) // thin, n))
+    for sweep in range(n_sweeps):
+        lam_ext[:n] = lam
+        w = lam_ext[order]
+        remaining = np.cumsum(w[:, ::-1], axis=1)[:, ::-1]
+        Z = np.zeros_like(w)
+        np.divide(rng.standard_exponential(w.shape), remaining, out=Z, where=choice)
+        exposure = np.bincount(order.ravel(), weights=np.cumsum(Z, axis=1).ravel(),
+                               minlength=n + 1)[:n]
+        lam = rng.gamma(shape_post, 1.0 / (b + exposure))
+        # scale step: total rate | shares ~ Gamma(sum a, sum b * share)
+        share = lam / lam.sum()
+        lam = share * rng.gamma(a.sum(), 1.0 / (b @ share))
+        if sweep >= burn_in and (sweep - burn_in) % thin == 0:
+            kept[(sweep - burn_in) // thin] = share
+    return kept
+
+
+def _autocovariance(x):
+    """Autocovariance of every column of x (draws x params) via FFT."""
+    m = x.shape[0]
+    x = x - x.mean(axis=0)
+    f = np.fft.rfft(x, n=2 * m, axis=0)
+    return np.fft.irfft(f * np.conj(f), axis=0)[:m] / m
+
+
+def split_rhat(draws):
+    """Split-chain potential scale reduction (chains x draws x params)."""
+    c, m, p = draws.shape
+    half = m // 2
+    split = np.concatenate([draws[:, :half], draws[:, half:2 * half]], axis=0)
+    means = split.mean(axis=1)
+    W = split.var(axis=1, ddof=1).mean(axis=0)
+    B = half * means.var(axis=0, ddof=1)
+    var_plus = (half - 1) / half * W + B / half
+    return np.sqrt(var_plus / W)
+
+
+def effective_sample_size(draws):
+    """Multi-chain ESS with Geyer's initial monotone sequence
+    (chains x draws x params)."""
+    c, m, p = draws.shape
+    acov = np.stack([_autocovariance(draws[i]) for i in range(c)])   # c x m x p
+    W = (acov[:, 0] * m / (m - 1)).mean(axis=0)
+    B = m * draws.mean(axis=1).var(axis=0, ddof=1) if c > 1 else 0.0
+    var_plus = (m - 1) / m * W + B / m
+    rho = 1.0 - (W - acov.mean(axis=0)) / var_plus                   # m x p
+    ess = np.empty(p)
+    for j in range(p):
+        # sums of consecutive pairs, truncated at the first negative pair and
+        # made monotone
+        pairs = rho[:-1:2, j] + rho[1::2, j]
+        stop = np.argmax(pairs < 0) if np.any(pairs < 0) else len(pairs)
+        pairs = np.minimum.accumulate(pairs[:stop])
+        tau = -1.0 + 2.0 * pairs.sum()
+        ess[j] = c * m / max(tau, 1.0 / np.log10(c * m))
+    return ess
+
+
+def prior_from_odds(driver_names, lambda_path=STAGE3_OUT):
+    """Prior mean shares from the stage 3 lambdas, matched by name."""
+    m = np.full(len(driver_names), np.nan)
+    if lambda_path is not None and os.path.exists(lambda_path):
+        odds = read_df(lambda_path, columns=['Driver', 'lambda_est'])
+        matched = match_driver_names(driver_names, odds['Driver'])
+        lookup = dict(zip(odds['Driver'], odds['lambda_est']))
+        m = np.array([lookup[d] if d is not None else np.nan for d in matched], dtype=float)
+    missing = np.isnan(m)
+    m[missing] = np.nanmedian(m) if not missing.all() else 1.0
+    return m / m.sum(), missing
+
+
+def sample_posterior(rankings, prior_mean, prior_shape=2.0, n_sweeps=10_000, burn_in=1_000,
+                     thin=1, n_chains=4, n_jobs=None, seed=None):
+    """Posterior draws of the win shares, shape (chains, kept draws, drivers)."""
+    n = rankings.n_drivers
+    order = np.where(rankings.order >= 0, rankings.order, n)
+    choice = rankings.choice_mask()
+    wins = np.bincount(order[choice], minlength=n + 1)[:n].astype(float)
+    a = np.full(n, float(prior_shape))
+    b = a / np.asarray(prior_mean, dtype=float)
+    seeds = np.random.SeedSequence(seed).spawn(n_chains)
+    jobs = [(order, choice, wins, a, b, n_sweeps, burn_in, thin, s) for s in seeds]
+    n_jobs = n_chains if n_jobs is None else n_jobs
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            chains = list(pool.map(_gibbs_chain, jobs))
+    else:
+        chains = [_gibbs_chain(job) for job in jobs]
+    return np.stack(chains)
+
+
+@profiled('stage6_posterior')
+def run_stage6_posterior(input_path=STAGE5_IN, lambda_path=STAGE3_OUT,
+                         output_path=STAGE6_POSTERIOR_OUT, prior_shape=2.0,
+                         n_sweeps=10_000, burn_in=1_000, n_chains=4, n_jobs=None, seed=None):
+    log.info('Stage 6 posterior: Gibbs sampling of race rates from %s', input_path)
+    pos, driver_names = read_positions_matrix(input_path)
+    rankings = Rankings.from_positions(pos, names=list(driver_names))
+    prior_mean, missing = prior_from_odds(driver_names, lambda_path)
+    if missing.any():
+        log.warning('No odds for %s: prior at the median', list(driver_names[missing]))
+
+    t0 = time.perf_counter()
+    with step('gibbs', rows=n_chains * n_sweeps, unit='sweeps'):
+        draws = sample_posterior(rankings, prior_mean, prior_shape, n_sweeps, burn_in,
+                                 n_chains=n_chains, n_jobs=n_jobs, seed=seed)
+    elapsed = time.perf_counter() - t0
+    flat = draws.reshape(-1, draws.shape[-1])
+    ess = effective_sample_size(draws)
+    rhat = split_rhat(draws)
+    log.info('%d chains x %d sweeps in %.2fs; min ESS %.0f, max R-hat %.4f', n_chains, n_sweeps,
+             elapsed, ess.min(), rhat.max())
+
+    out = pd.DataFrame({
+        'Driver': driver_names,
+        'prior_share': prior_mean,
+        'post_mean': flat.mean(axis=0),
+        'post_sd': flat.std(axis=0, ddof=1),
+        'ci_lower': np.quantile(flat, 0.025, axis=0),
+        'ci_upper': np.quantile(flat, 0.975, axis=0),
+        'ess': ess,
+        'rhat': rhat,
+    }).sort_values('post_mean', ascending=False)
+    if log.isEnabledFor(INFO):
+        log.info('%s', out.head(10).to_string(index=False))
+    save_df(out, output_path)
+    log.info('Stage 6 posterior done. Wrote -> %s', output_path)
+    return out
+
+
+if __name__ == '__main__':
+    run_stage6_posterior()
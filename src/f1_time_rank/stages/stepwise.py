@@ -0,0 +1,261 @@
+"""
+Stepwise OLS selection (forward / backward / both) over AIC, BIC or p-values,
+following R's step(): at every step each allowed drop and each allowed add
+is scored, the best move is taken, and the search stops when no move
+improves the criterion.
+
+All work happens on the Gram matrix G = X'X, X'y and y'y, so n only enters
+once when G is built. The active model is an upper-triangular Cholesky
+factor R (R'R = G[S, S]) that is updated in place:
+- adding a column appends one row/column to R (one triangular solve, O(p^2));
+- dropping a column deletes it and re-triangularizes with Givens rotations
+  (O(p^2)).
+Scoring every add candidate is a single triangular solve against all
+candidate columns, and scoring every drop uses beta_k^2 / (G_SS^-1)_kk, so no
+candidate model is refit from scratch.
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+import scipy.sparse as sp
+from scipy.linalg import solve_triangular
+from scipy.special import fdtrc   # F tail without importing scipy.stats
+from f1_time_rank.stages.regression_engine import OLSResult
+
+
+class CholeskyModel:
+    """Active column set S with R'R = G[S, S] and z = R^-T X'y[S]."""
+
+    def __init__(self, gram, xty, yty, active=()):
+        self.gram = gram
+        self.xty = xty
+        self.yty = yty
+        self.active = []
+        self.R = np.zeros((0, 0))
+        self.z = np.zeros(0)
+        for j in active:
+            self.add(j)
+
+    @property
+    def rss(self):
+        return self.yty - self.z @ self.z
+
+    def add_gains(self, candidates):
+        """RSS reduction from adding each candidate column (not committed)."""
+        candidates = np.asarray(candidates, dtype=int)
+        g_cc = self.gram[candidates, candidates]
+        if len(self.active) == 0:
+            rho2 = g_cc
+            num = self.xty[candidates]
+        else:
+            r = solve_triangular(self.R, self.gram[np.ix_(self.active, candidates)], trans='T')
+            rho2 = g_cc - np.einsum('ij,ij->j', r, r)
+            num = self.xty[candidates] - r.T @ self.z
+        gains = np.where(rho2 > 1e-12 * np.maximum(g_cc, 1e-300), num ** 2 / np.maximum(rho2, 1e-300), 0.0)
+        return gains
+
+    def drop_losses(self):
+        """RSS increase from dropping each active column (not committed)."""
+        Rinv = solve_triangular(self.R, np.eye(len(self.active)))
+        beta = Rinv @ self.z
+        diag_inv = np.einsum('ij,ij->i', Rinv, Rinv)
+        return beta ** 2 / diag_inv
+
+    def add(self, j):
+        if len(self.active) == 0:
+            rho = np.sqrt(self.gram[j, j])
+            self.R = np.array([[rho]])
+            self.z = np.array([self.xty[j] / rho])
+        else:
+            r = solve_triangular(self.R, self.gram[self.active, j], trans='T')
+            rho = np.sqrt(max(self.gram[j, j] - r @ r, 1e-300))
+            p = len(self.active)
+            R = np.zeros((p + 1, p + 1))
+            R[:p, :p] = self.R
+            R[:p, p] = r
+            R[p, p] = rho
+            self.R = R
+            self.z = np.append(self.z, (self.xty[j] - r @ self.z) / rho)
+        self.active.append(j)
+
+    def remove(self, k):
+        """Remove the k-th active column and restore triangular form."""
+        R = np.delete(self.R, k, axis=1)
+        z = self.z.copy()
+        # R is now upper Hessenberg from column k on: zero the subdiagonal
+        for i in range(k, R.shape[1]):
+            a, b = R[i, i], R[i + 1, i]
+            h = np.hypot(a, b)
+            c, s = a / h, b / h
+            Ri, Ri1 = R[i, i:].copy(), R[i + 1, i:].copy()
+            R[i, i:] = c * Ri + s * Ri1
+            R[i + 1, i:] = -s * Ri + c * Ri1
+            zi, zi1 = z[i], z[i + 1]
+            z[i], z[i + 1] = c * zi + s * zi1, -s * zi + c * zi1
+        self.R = R[:-1]
+        self.z = z[:-1]
+        del self.active[k]
+
+    def beta(self):
+        return solve_triangular(self.R, self.z)
+
+    def cov_unscaled(self):
+        Rinv = solve_triangular(self.R, np.eye(len(self.active)))
+        return Rinv @ Rinv.T
+
+
+class StepwiseOLS:
+    """Stepwise selection over the columns of a fixed design.
+
+    Build with StepwiseOLS.from_design(X, y, names) (dense or sparse X) or
+    directly from a precomputed Gram matrix.
+    """
+
+    def __init__(self, gram, xty, yty, nobs, names, y_sum=None):
+        self.gram = np.asarray(gram, dtype=float)
+        self.xty = np.asarray(xty, dtype=float)
+        self.yty = float(yty)
+        self.nobs = int(nobs)
+        self.names = list(names)
+        self.index = {n: i for i, n in enumerate(self.names)}
+        self.has_const = 'const' in self.index
+        if y_sum is None and self.has_const:
+            y_sum = self.xty[self.index['const']]
+        self.tss = self.yty - y_sum ** 2 / self.nobs if y_sum is not None else self.yty
+
+    @classmethod
+    def from_design(cls, X, y, names):
+        y = np.asarray(y, dtype=float)
+        gram = X.T @ X
+        gram = gram.toarray() if sp.issparse(gram) else np.asarray(gram)
+        return cls(gram, X.T @ y, y @ y, len(y), names, y_sum=y.sum())
+
+    def _criterion(self, rss, p, criterion):
+        n = self.nobs
+        k = np.log(n) if criterion == 'bic' else 2.0
+        # R extractAIC.lm: n * log(RSS / n) + k * edf
+        return n * np.log(rss / n) + k * p
+
+    def step(self, start=None, lower=('const',), upper=None, direction='both',
+             criterion='aic', alpha_enter=0.05, alpha_remove=0.10, max_steps=1000):
+        """Run stepwise selection.
+
+        Args:
+            start: initial column names (default: lower for 'forward', the
+                   full upper scope otherwise, like R).
+            lower: columns that are never dropped.
+            upper: candidate columns (default: all).
+            direction: 'both', 'forward' or 'backward'.
+            criterion: 'aic', 'bic' or 'pvalue' (F-test of a single column
+                       with alpha_enter / alpha_remove thresholds).
+
+        Returns:
+            StepwiseResult
+        """
+        if direction not in ('both', 'forward', 'backward'):
+            raise ValueError("direction must be 'both', 'forward' or 'backward'")
+        if criterion not in ('aic', 'bic', 'pvalue'):
+            raise ValueError("criterion must be 'aic', 'bic' or 'pvalue'")
+        upper = self.names if upper is None else list(upper)
+        lower = [c for c in lower if c in self.index]
+        if start is None:
+            start = lower if direction == 'forward' else upper
+        start = list(dict.fromkeys(list(lower) + list(start)))
+        locked = {self.index[c] for c in lower}
+        scope = [self.index[c] for c in upper]
+
+        model = CholeskyModel(self.gram, self.xty, self.yty, [self.index[c] for c in start])
+        history = []
+        current = self._criterion(model.rss, len(model.active), criterion) if criterion != 'pvalue' else np.nan
+        history.append({'step': '', 'criterion': current, 'rss': model.rss, 'n_terms': len(model.active)})
+
+        for _ in range(max_steps):
+            rss = model.rss
+            p = len(model.active)
+            moves = []
+            if direction in ('both', 'backward') and p > len(locked):
+                losses = model.drop_losses()
+                for pos, j in enumerate(model.active):
+                    if j in locked:
+                        continue
+                    moves.append(('-', j, pos, rss + losses[pos], p - 1))
+            if direction in ('both', 'forward'):
+                cand = [j for j in scope if j not in model.active]
+                if cand:
+                    gains = model.add_gains(cand)
+                    for j, g in zip(cand, gains):
+                        if g > 0:
+                            moves.append(('+', j, None, rss - g, p + 1))
+            if not moves:
+                break
+
+            if criterion == 'pvalue':
+                move = self._pvalue_move(moves, rss, p, alpha_enter, alpha_remove)
+                if move is None:
+                    break
+                value = np.nan
+            else:
+                scores = [self._criterion(m[3], m[4], criterion) for m in moves]
+                best = int(np.argmin(scores))
+                if scores[best] >= current - 1e-7:
+                    break
+                move, value = moves[best], scores[best]
+                current = value
+
+            op, j, pos, _, _ = move
+            if op == '+':
+                model.add(j)
+            else:
+                model.remove(pos)
+            history.append({'step': f'{op} {self.names[j]}', 'criterion': value,
+                            'rss': model.rss, 'n_terms': len(model.active)})
+
+        return StepwiseResult(self, model, pd.DataFrame(history))
+
+    def _pvalue_move(self, moves, rss, p, alpha_enter, alpha_remove):
+        """Backward: drop the least significant column if p > alpha_remove;
+        otherwise forward: add the most significant candidate if p < alpha_enter."""
+        drops = [m for m in moves if m[0] == '-']
+        if drops:
+            df_resid = self.nobs - p
+            f = [(m[3] - rss) / (rss / df_resid) for m in drops]
+            pv = fdtrc(1, df_resid, f)
+            worst = int(np.argmax(pv))
+            if pv[worst] > alpha_remove:
+                return drops[worst]
+        adds = [m for m in moves if m[0] == '+']
+        if adds:
+            df_resid = self.nobs - p - 1
+            f = [(rss - m[3]) / (m[3] / df_resid) for m in adds]
+            pv = fdtrc(1, df_resid, f)
+            best = int(np.argmin(pv))
+            if pv[best] < alpha_enter:
+                return adds[best]
+        return None
+
+    def fit(self, columns):
+        """OLSResult for a given column subset (submatrix solve on the Gram)."""
+        model = CholeskyModel(self.gram, self.xty, self.yty, [self.index[c] for c in columns])
+        return self._result(model)
+
+    def _result(self, model):
+        names = [self.names[j] for j in model.active]
+        return OLSResult(names, model.beta(), model.cov_unscaled(), model.rss,
+                         self.tss, self.nobs, self.has_const)
+
+
+class StepwiseResult:
+    def __init__(self, engine, model, history):
+        # keep the columns in design order for reporting
+        order = sorted(range(len(model.active)), key=lambda k: model.active[k])
+        self.selected = [engine.names[model.active[k]] for k in order]
+        self.history = history
+        self.model = engine.fit(self.selected)
@@ -0,0 +1,236 @@
+"""
+Out-of-core stage 5 regression: stream race results in chunks and keep only
+a (p+1) x (p+1) summary of [X | y], so memory does not grow with the number
+of rows.
+
+Two accumulators are available:
+- method='tsqr' (default): the triangular factor of [X | y] is updated by a
+  QR of [R_aug; new block] (TSQR merge). Nothing is squared, so accuracy is
+  that of a QR on the full data. The last diagonal entry gives the RSS.
+- method='gram': plain sums of X'X, X'y, y'y (cheaper per row, squares the
+  condition number).
+Either state can be merged with another (e.g. per-season or per-worker
+partial fits) and turned into a StepwiseOLS, so the stepwise team selection
+also runs on streamed data.
+
+Input: data/positions_long.csv (positionlabel, driverorder2, constructor)
+Output: output/stage5_regression.csv
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+import scipy.sparse as sp
+from scipy.linalg import cho_factor, cho_solve, solve_triangular
+from scipy import stats
+from f1_time_rank.config import STAGE5_IN, STAGE5_OUT, STAGE5_LONG_IN
+from f1_time_rank.utils import save_df
+from f1_time_rank.stages.regression_engine import OLSResult, build_design
+from f1_time_rank.stages.stepwise import StepwiseOLS
+from f1_time_rank.stages.stage5_regression import TEAMS_2022
+from f1_time_rank.stages.results_store import open_results
+from f1_time_rank.events import get_logger, DEBUG, INFO
+
+log = get_logger(__name__)
+
+LONG_COLUMNS = ['positionlabel', 'driverorder2', 'constructor']
+
+
+class StreamingOLS:
+    """Accumulate an OLS fit over row blocks of a fixed set of columns."""
+
+    def __init__(self, names, method='tsqr', block_rows=None):
+        if method not in ('tsqr', 'gram'):
+            raise ValueError("method must be 'tsqr' or 'gram'")
+        self.names = list(names)
+        self.method = method
+        p1 = len(self.names) + 1
+        # dense rows materialized at once when a sparse chunk is factorized
+        self.block_rows = block_rows or max(20_000, 50 * p1)
+        # R_aug (tsqr) or [X y]'[X y] (gram), both (p+1) x (p+1)
+        self.state = np.zeros((p1, p1))
+        # y moments for the total sum of squares (Chan et al. merge)
+        self.nobs = 0
+        self.y_mean = 0.0
+        self.y_m2 = 0.0
+
+    def partial_fit(self, X, y):
+        """Add a block of rows (X dense or sparse, with columns self.names)."""
+        y = np.asarray(y, dtype=float)
+        if X.shape[1] != len(self.names):
+            raise ValueError(f'expected {len(self.names)} columns, got {X.shape[1]}')
+        if self.method == 'gram':
+            A = sp.hstack([sp.csr_matrix(X), sp.csr_matrix(y[:, None])]).tocsr()
+            G = A.T @ A
+            self.state += G.toarray() if sp.issparse(G) else G
+        else:
+            for start in range(0, len(y), self.block_rows):
+                stop = min(start + self.block_rows, len(y))
+                Xb = X[start:stop]
+                Xb = Xb.toarray() if sp.issparse(Xb) else np.asarray(Xb, dtype=float)
+                A = np.column_stack([Xb, y[start:stop]])
+                self.state = np.linalg.qr(np.vstack([self.state, A]), mode='r')
+        self._merge_moments(len(y), y.mean() if len(y) else 0.0,
+                            float(((y - y.mean()) ** 2).sum()) if len(y) else 0.0)
+        return self
+
+    def merge(self, other):
+        """Combine with another accumulator over the same columns."""
+        if other.names != self.names or other.method != self.method:
+            raise ValueError('can only merge accumulators with the same columns and method')
+        if self.method == 'gram':
+            self.state = self.state + other.state
+        else:
+            self.state = np.linalg.qr(np.vstack([self.state, other.state]), mode='r')
+        self._merge_moments(other.nobs, other.y_mean, other.y_m2)
+        return self
+
+    def _merge_moments(self, n_b, mean_b, m2_b):
+        n_a = self.nobs
+        n = n_a + n_b
+        if n == 0:
+            return
+        delta = mean_b - self.y_mean
+        self.y_mean += delta * n_b / n
+        self.y_m2 += m2_b + delta ** 2 * n_a * n_b / n
+        self.nobs = n
+
+    def gram(self):
+        """Augmented Gram matrix [X y]'[X y]."""
+        if self.method == 'gram':
+            return self.state
+        return self.state.T @ self.state
+
+    def to_stepwise(self):
+        """StepwiseOLS over the accumulated columns."""
+        G = self.gram()
+        p = len(self.names)
+        return StepwiseOLS(G[:p, :p], G[:p, p], G[p, p], self.nobs, self.names,
+                           y_sum=self.y_mean * self.nobs)
+
+    def result(self, columns=None):
+        """OLSResult for all columns or a subset (in the given order)."""
+        columns = self.names if columns is None else list(columns)
+        idx = [self.names.index(c) for c in columns] + [len(self.names)]
+        p = len(columns)
+        if self.method == 'gram':
+            G = self.state[np.ix_(idx, idx)]
+            factor = cho_factor(G[:p, :p])
+            params = cho_solve(factor, G[:p, p])
+            cov_unscaled = cho_solve(factor, np.eye(p))
+            ssr = float(G[p, p] - G[:p, p] @ params)
+        else:
+            # columns of R_aug span the same geometry as [X_S y]
+            R = np.linalg.qr(self.state[:, idx], mode='r')
+            params = solve_triangular(R[:p, :p], R[:p, p])
+            Rinv = solve_triangular(R[:p, :p], np.eye(p))
+            cov_unscaled = Rinv @ Rinv.T
+            ssr = float(R[p, p] ** 2)
+        has_const = bool(columns) and columns[0] == 'const'
+        tss = self.y_m2 if has_const else self.y_m2 + self.nobs * self.y_mean ** 2
+        return OLSResult(columns, params, cov_unscaled, ssr, tss, self.nobs, has_const)
+
+
+def iter_long_chunks(path, chunksize=1_000_000):
+    """Yield DataFrame chunks of a long-format results file."""
+    for chunk in pd.read_csv(path, usecols=LONG_COLUMNS, chunksize=chunksize,
+                             dtype={'constructor': str}):
+        yield chunk.dropna(subset=['positionlabel', 'driverorder2'])
+
+
+def scan_levels(path, column='constructor', chunksize=1_000_000):
+    """Distinct levels of a column, read one column and one chunk at a time."""
+    levels = set()
+    for chunk in pd.read_csv(path, usecols=[column], chunksize=chunksize, dtype={column: str}):
+        levels.update(chunk[column].dropna().unique())
+    return sorted(levels)
+
+
+def chunk_design(chunk, teams):
+    """CSR design (const, driverorder2, team dummies) for one chunk."""
+    codes = pd.Categorical(chunk['constructor'].values, categories=teams).codes.astype(np.int64)
+    return build_design(len(chunk), numeric={'driverorder2': chunk['driverorder2'].values},
+                        categorical={'constructor': (codes, list(teams))})
+
+
+def stream_fit(path, teams, chunksize=1_000_000, method='tsqr'):
+    """One pass over the file into a StreamingOLS of the full team design."""
+    names = ['const', 'driverorder2'] + list(teams)
+    acc = StreamingOLS(names, method=method)
+    for chunk in iter_long_chunks(path, chunksize):
+        X, _ = chunk_design(chunk, teams)
+        acc.partial_fit(X, chunk['positionlabel'].values)
+    return acc
+
+
+def write_positions_long(input_path=STAGE5_IN, output_path=STAGE5_LONG_IN, teams=TEAMS_2022):
+    """Convert stage 5 results (positions matrix, long CSV or results store)
+    to the long format read by the streaming stage, in the same row order as
+    stage 5."""
+    df = open_results(input_path, teams=teams).regression_frame()
+    df = df[['positionlabel', 'driverorder2', 'constructor', 'driver', 'race']]
+    save_df(df, output_path)
+    return df
+
+
+def run_stage5_streaming(input_path=STAGE5_LONG_IN, output_path=STAGE5_OUT, teams=None,
+                         reference='Williams', chunksize=1_000_000, method='tsqr',
+                         criterion='aic'):
+    """Stage 5 on a long-format file that need not fit in memory.
+
+    teams: team dummies to use; None selects them by stepwise search on the
+    streamed factor (same rule as run_stage5).
+    """
+    log.info('Stage 5 (streaming): regression analysis using %s', input_path)
+    levels = [t for t in scan_levels(input_path, chunksize=chunksize) if t != reference]
+    log.info('Teams found: %s (reference: %s)', levels, reference)
+
+    acc = stream_fit(input_path, levels, chunksize=chunksize, method=method)
+    log.info('Accumulated %d observations into a %dx%d %s', acc.nobs, acc.state.shape[0],
+             acc.state.shape[1], 'triangular factor' if method == 'tsqr' else 'Gram matrix')
+
+    if teams is None:
+        lower = ['const', 'driverorder2']
+        step_result = acc.to_stepwise().step(start=lower, lower=lower, direction='both',
+                                             criterion=criterion)
+        if log.isEnabledFor(DEBUG):
+            log.debug('\nStepwise selection (%s, both directions):', criterion.upper())
+            for _, row in step_result.history.iterrows():
+                log.debug('  %-15s %s=%.3f', row['step'] or '<start>', criterion.upper(), row['criterion'])
+        teams = [c for c in step_result.selected if c in levels]
+    columns = ['const', 'driverorder2'] + [t for t in levels if t in teams]
+    log.info('Teams included in model: %s', columns[2:])
+
+    model = acc.result(columns)
+    coef = model.coef_table()
+    if log.isEnabledFor(INFO):
+        log.info('\nR² value = %.4f', model.rsquared)
+        log.info(f"{'Coefficient':<15} {'Estimate':<10} {'Std. Error':<12} {'t-value':<10} {'p-value':<10}")
+        log.info('-' * 80)
+        for _, row in coef.iterrows():
+            log.info('%-15s %-10.4f %-12.4f %-10.3f %-10.4f', row['term'], row['Estimate'],
+                     row['Std_Error'], row['t_value'], row['p_value'])
+
+        if 'driverorder2' in model.params.index:
+            t_critical = stats.t.ppf(0.975, model.df_resid)
+            ci = model.params['driverorder2'] + np.array([-1, 1]) * t_critical * model.bse['driverorder2']
+            log.info('\nSecond driver 95%% CI: [%.3f, %.3f] (df = %s)', ci[0], ci[1], model.df_resid)
+        log.info('AIC: %.2f', model.aic)
+
+    save_df(coef, output_path)
+    log.info('\nStage 5 (streaming) done. Wrote -> %s', output_path)
+    return model
+
+
+if __name__ == '__main__':
+    if not STAGE5_LONG_IN.exists():
+        log.info('%s not found, converting %s', STAGE5_LONG_IN, STAGE5_IN)
+        write_positions_long()
+    run_stage5_streaming()
@@ -0,0 +1,122 @@
+"""
+What-if sweep: move one or more drivers' odds over a grid and recompute
+stages 2-4 for every grid point in one broadcasted array computation.
+
+For every grid point the swept drivers' raw implied probabilities replace the
+stage 1 values, then
+    stage 2: p_norm = raw / sum(raw)
+    stage 3: lambda = LAMBDA_TOTAL * p_norm  (the grouped fit is exact)
+    stage 4: z, mu_hat, sigma_hat via mu_sigma_batch
+Optionally P(finish <= k) is added from the analytic position evaluator.
+
+Input: output/stage1_odds_parsed.csv (or a DataFrame with Driver, raw_implied_p)
+Output: tidy DataFrame, one row per (grid point, reported driver)
+"""
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+from f1_time_rank.config import STAGE1_OUT
+from f1_time_rank.utils import fractional_to_rawprob, read_df
+from f1_time_rank.stages.stage4_mu_sigma import mu_sigma_batch
+from f1_time_rank.stages.stage3_joint_lambda import LAMBDA_TOTAL, finish_probabilities
+
+
+def sweep_odds(grids, base=STAGE1_OUT, report=None, positions=None,
+               chunk_size=200_000, dtype=np.float64):
+    """Evaluate stages 2-4 over the outer product of odds grids.
+
+    Args:
+        grids: dict {driver: sequence of odds}; odds may be strings such as
+               '25/1' or decimal odds as numbers.
+        base: stage 1 output path or DataFrame with Driver and raw_implied_p.
+        report: drivers to report (default: the swept drivers).
+        positions: optional list of k for P(finish <= k) (e.g. [1, 3]).
+                   This step costs O(n^2 K) per grid point, so keep the grid
+                   coarse when using it.
+        chunk_size: grid points evaluated per block (bounds memory).
+        dtype: float dtype of the stage 4 kernel.
+
+    Returns:
+        DataFrame with one odds_<driver> column per swept driver, Driver,
+        p_norm, lambda_est, z, mu_hat, sigma_hat (+ p_top<k> columns).
+    """
+    df = base if isinstance(base, pd.DataFrame) else read_df(base)
+    drivers = df['Driver'].astype(str).str.strip().values
+    r_base = df['raw_implied_p'].values.astype(float)
+    n = len(drivers)
+    index = {d: i for i, d in enumerate(drivers)}
+
+    swept = list(grids)
+    missing = [d for d in swept if d not in index]
+    if missing:
+        raise ValueError(f'Unknown drivers in grid: {missing}')
+    swept_idx = np.array([index[d] for d in swept])
+    report = swept if report is None else list(report)
+    report_idx = np.array([index[d] for d in report])
+
+    grid_values = [np.asarray(grids[d], dtype=object) for d in swept]
+    raw_grids = [np.array([fractional_to_rawprob(v) for v in g], dtype=float) for g in grid_values]
+    if any(np.isnan(g).any() for g in raw_grids):
+        raise ValueError('Could not parse every odds value in the grids')
+    shape = tuple(len(g) for g in raw_grids)
+    R_swept = np.stack([m.ravel() for m in np.meshgrid(*raw_grids, indexing='ij')], axis=1)
+    n_points = R_swept.shape[0]
+
+    fixed = np.ones(n, dtype=bool)
+    fixed[swept_idx] = False
+    fixed_sum = r_base[fixed].sum()
+
+    m = len(report_idx)
+    p_out = np.empty((n_points, m), dtype=dtype)
+    z_out = np.empty_like(p_out)
+    mu_out = np.empty_like(p_out)
+    sigma_out = np.empty(n_points, dtype=dtype)
+    pos_out = None
+    if positions is not None:
+        positions = np.asarray(positions, dtype=int)
+        pos_out = np.empty((n_points, m, len(positions)))
+
+    P = np.empty((min(chunk_size, n_points), n))
+    for start in range(0, n_points, chunk_size):
+        stop = min(start + chunk_size, n_points)
+        Rs = R_swept[start:stop]
+        total = fixed_sum + Rs.sum(axis=1)
+        block = P[:stop - start]
+        block[:, fixed] = r_base[fixed][None, :]
+        block[:, swept_idx] = Rs
+        block /= total[:, None]                    # stage 2
+        z, mu, sigma = mu_sigma_batch(block, dtype=dtype)   # stage 4
+        p_out[start:stop] = block[:, report_idx]
+        z_out[start:stop] = z[:, report_idx]
+        mu_out[start:stop] = mu[:, report_idx]
+        sigma_out[start:stop] = sigma
+        if pos_out is not None:
+            # the position evaluator holds (points x nodes x n x K) in memory
+            step = max(1, 2_000_000 // (100 * m * positions.max()))
+            for s in range(0, stop - start, step):
+                probs = finish_probabilities(block[s:s + step], positions, rows=report_idx)
+                pos_out[start + s:start + s + len(probs)] = probs
+
+    # tidy output: grid coordinates repeated for every reported driver
+    coords = np.meshgrid(*[np.arange(k) for k in shape], indexing='ij')
+    out = {}
+    for d, g, c in zip(swept, grid_values, coords):
+        out[f'odds_{d}'] = np.repeat(g[c.ravel()], m)
+    out['Driver'] = np.tile(np.asarray(report, dtype=object), n_points)
+    out['p_norm'] = p_out.ravel()
+    out['lambda_est'] = LAMBDA_TOTAL * p_out.ravel()
+    out['z'] = z_out.ravel()
+    out['mu_hat'] = mu_out.ravel()
+    out['sigma_hat'] = np.repeat(sigma_out, m)
+    if pos_out is not None:
+        for j, k in enumerate(positions):
+            out[f'p_top{k}'] = pos_out[:, :, j].ravel()
+    return pd.DataFrame(out)
@@ -0,0 +1,277 @@
+"""
+SQLite warehouse of pipeline results across runs.
+
+Every run of the pipeline overwrites output/, so comparing outputs over races
+or bookmakers meant keeping copies of CSVs around. The warehouse appends each
+run to one SQLite file instead:
+
+    runs            run_id, event, bookmaker, season, created_at, note
+    driver_results  one row per (run, stage, driver, metric): stages 1-4,
+                    stage 6 and the Monte Carlo validation
+    coefficients    one row per (run, stage, term, metric): stage 5 and its
+                    ordered / mixed alternatives
+
+Tables are long (metric, value), so adding a column to a stage needs no
+schema change. A run is ingested in a single transaction with executemany
+(WAL journal, synchronous=NORMAL), and the point queries hit the indexes on
+(event, driver, stage) and (driver, stage).
+
+Input: output/stage*.csv (or .parquet / .arrow)
+Output: output/warehouse.sqlite
+"""
+import sqlite3
+import sys
+import os
+from datetime import datetime, timezone
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import numpy as np
+import pandas as pd
+from f1_time_rank.config import (STAGE1_OUT, STAGE2_OUT, STAGE3_OUT, STAGE4_OUT, STAGE5_OUT,
+                                 STAGE5_ORDERED_OUT, STAGE5_MIXED_OUT, STAGE6_OUT,
+                                 STAGE6_POSTERIOR_OUT, STAGE1_IN, STAGE5_SEASON, WAREHOUSE_DB)
+from f1_time_rank.utils import read_df
+from f1_time_rank.profiling import profiled
+from f1_time_rank.events import get_logger
+
+log = get_logger(__name__)
+
+# stage label -> output table, per driver (Driver[, Team] + numeric columns)
+DRIVER_TABLES = {
+    'stage1': STAGE1_OUT,
+    'stage2': STAGE2_OUT,
+    'stage3': STAGE3_OUT,
+    'stage4': STAGE4_OUT,
+    'stage6': STAGE6_OUT,
+    'stage6_posterior': STAGE6_POSTERIOR_OUT,
+}
+# stage label -> coefficient table (term + numeric columns)
+TERM_TABLES = {
+    'stage5': STAGE5_OUT,
+    'stage5_ordered': STAGE5_ORDERED_OUT,
+    'stage5_mixed': STAGE5_MIXED_OUT,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id     INTEGER PRIMARY KEY,
+    event      TEXT NOT NULL,
+    bookmaker  TEXT,
+    season     INTEGER,
+    created_at TEXT NOT NULL,
+    note       TEXT
+);
+CREATE TABLE IF NOT EXISTS driver_results (
+    run_id    INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    event     TEXT NOT NULL,
+    bookmaker TEXT,
+    season    INTEGER,
+    stage     TEXT NOT NULL,
+    driver    TEXT NOT NULL,
+    team      TEXT,
+    metric    TEXT NOT NULL,
+    value     REAL
+);
+CREATE TABLE IF NOT EXISTS coefficients (
+    run_id    INTEGER NOT NULL REFERENCES runs(run_id) ON DELETE CASCADE,
+    event     TEXT NOT NULL,
+    bookmaker TEXT,
+    season    INTEGER,
+    stage     TEXT NOT NULL,
+    term      TEXT NOT NULL,
+    metric    TEXT NOT NULL,
+    value     REAL
+);
+CREATE INDEX IF NOT EXISTS ix_driver_results_event ON driver_results(event, driver, stage, metric);
+CREATE INDEX IF NOT EXISTS ix_driver_results_driver ON driver_results(driver, stage, metric);
+CREATE INDEX IF NOT EXISTS ix_driver_results_run ON driver_results(run_id);
+CREATE INDEX IF NOT EXISTS ix_coefficients_event ON coefficients(event, term, stage);
+CREATE INDEX IF NOT EXISTS ix_coefficients_run ON coefficients(run_id);
+"""
+
+RESULT_COLUMNS = ['run_id', 'event', 'bookmaker', 'season', 'stage', 'driver', 'team', 'metric', 'value']
+COEF_COLUMNS = ['run_id', 'event', 'bookmaker', 'season', 'stage', 'term', 'metric', 'value']
+
+
+def _long_rows(df, key, run):
+    """(run_id, event, bookmaker, season, stage, key, [team,] metric, value)
+    tuples for every numeric column of df; NaN is stored as NULL."""
+    n = len(df)
+    metrics = [c for c in df.columns
+               if c not in (key, 'Team') and pd.api.types.is_numeric_dtype(df[c])]
+    m = len(metrics)
+    # plain lists and zip: pandas calls per column dominate on 20-row tables
+    values = np.concatenate([df[c].to_numpy(dtype=float) for c in metrics]).tolist() if m else []
+    values = [None if v != v else v for v in values]
+    labels = [[str(x).strip() for x in df[key].tolist()] * m]
+    if key == 'Driver':
+        teams = [str(x).strip() for x in df['Team'].tolist()] if 'Team' in df else [None] * n
+        labels.append(teams * m)
+    names = [c for c in metrics for _ in range(n)]
+    return list(zip(*[[x] * (n * m) for x in run], *labels, names, values))
+
+
+def _where(filters):
+    """WHERE clause and parameters; list values become IN (...)."""
+    clauses, params = [], []
+    for col, value in filters.items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set, np.ndarray, pd.Index)):
+            value = list(value)
+            clauses.append(f"{col} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            clauses.append(f'{col} = ?')
+            params.append(value)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+class Warehouse:
+    """Append-only SQLite store of stage outputs, keyed by run.
+
+    Usage:
+        with Warehouse() as wh:
+            run_id = wh.ingest_outputs(event='bahrain', bookmaker='bet365')
+            wh.query(driver='Charles Leclerc', stage='stage3', metric='lambda_est')
+    """
+
+    def __init__(self, path=WAREHOUSE_DB):
+        self.path = str(path)
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('PRAGMA foreign_keys=ON')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -- writing ---------------------------------------------------------
+
+    def _new_run(self, event, bookmaker, season, note):
+        cur = self.conn.execute(
+            'INSERT INTO runs (event, bookmaker, season, created_at, note) VALUES (?, ?, ?, ?, ?)',
+            (event, bookmaker, season, datetime.now(timezone.utc).isoformat(timespec='seconds'), note))
+        return cur.lastrowid
+
+    def _insert(self, driver_tables, term_tables, event, bookmaker, season, note):
+        if event is None:
+            raise ValueError('event is required')
+        run_id = self._new_run(event, bookmaker, season, note)
+        run = (run_id, event, bookmaker, season)
+        rows, coef_rows = [], []
+        for stage, df in (driver_tables or {}).items():
+            rows.extend(_long_rows(df, 'Driver', run + (stage,)))
+        for stage, df in (term_tables or {}).items():
+            coef_rows.extend(_long_rows(df, 'term', run + (stage,)))
+        self.conn.executemany(
+            f"INSERT INTO driver_results VALUES ({', '.join('?' * len(RESULT_COLUMNS))})", rows)
+        self.conn.executemany(
+            f"INSERT INTO coefficients VALUES ({', '.join('?' * len(COEF_COLUMNS))})", coef_rows)
+        return run_id
+
+    def ingest(self, driver_tables=None, term_tables=None, event=None, bookmaker=None,
+               season=None, note=None):
+        """Store one run in a single transaction.
+
+        Args:
+            driver_tables: {stage label: DataFrame with a Driver column}.
+            term_tables: {stage label: DataFrame with a term column}.
+            event, bookmaker, season, note: run labels, copied onto every row.
+
+        Returns:
+            run_id of the new run.
+        """
+        with self.conn:
+            return self._insert(driver_tables, term_tables, event, bookmaker, season, note)
+
+    def ingest_batch(self, runs):
+        """Store many runs (dicts of ingest() keyword arguments, e.g. every
+        race and bookmaker of a season) in one transaction; all or nothing."""
+        with self.conn:
+            return [self._insert(r.get('driver_tables'), r.get('term_tables'), r.get('event'),
+                                 r.get('bookmaker'), r.get('season'), r.get('note'))
+                    for r in runs]
+
+    def ingest_outputs(self, event, bookmaker=None, season=STAGE5_SEASON, stages=None, note=None):
+        """Store the stage outputs currently in output/ as one run.
+
+        stages: labels from DRIVER_TABLES / TERM_TABLES to include (default:
+        every one whose output file exists).
+        """
+        def pick(tables):
+            return {stage: read_df(path) for stage, path in tables.items()
+                    if (stages is None or stage in stages) and os.path.exists(path)}
+        return self.ingest(pick(DRIVER_TABLES), pick(TERM_TABLES), event=event,
+                           bookmaker=bookmaker, season=season, note=note)
+
+    def delete_run(self, run_id):
+        with self.conn:
+            self.conn.execute('DELETE FROM runs WHERE run_id = ?', (run_id,))
+
+    # -- reading ---------------------------------------------------------
+
+    def _select(self, table, columns, filters):
+        where, params = _where(filters)
+        cur = self.conn.execute(f"SELECT {', '.join(columns)} FROM {table}{where}", params)
+        return pd.DataFrame.from_records(cur.fetchall(), columns=columns)
+
+    def query(self, event=None, driver=None, stage=None, metric=None, bookmaker=None,
+              season=None, run_id=None, wide=False):
+        """Driver results as a long DataFrame (RESULT_COLUMNS). Each filter is
+        a value or a list of values. wide=True pivots metrics to columns,
+        one row per (run, stage, driver)."""
+        df = self._select('driver_results', RESULT_COLUMNS, {
+            'event': event, 'driver': driver, 'stage': stage, 'metric': metric,
+            'bookmaker': bookmaker, 'season': season, 'run_id': run_id})
+        if wide:
+            keys = ['run_id', 'event', 'bookmaker', 'season', 'stage', 'driver', 'team']
+            df = (df.set_index(keys + ['metric'])['value'].unstack('metric')
+                  .reset_index().rename_axis(columns=None))
+        return df
+
+    def coefficients(self, event=None, term=None, stage=None, metric=None, bookmaker=None,
+                     season=None, run_id=None):
+        """Stage 5 coefficient rows as a long DataFrame (COEF_COLUMNS)."""
+        return self._select('coefficients', COEF_COLUMNS, {
+            'event': event, 'term': term, 'stage': stage, 'metric': metric,
+            'bookmaker': bookmaker, 'season': season, 'run_id': run_id})
+
+    def runs(self):
+        return pd.read_sql_query('SELECT * FROM runs ORDER BY run_id', self.conn)
+
+    def sql(self, query, params=()):
+        """Free-form read query as a DataFrame."""
+        return pd.read_sql_query(query, self.conn, params=params)
+
+
+@profiled('warehouse')
+def run_warehouse(event=None, bookmaker=None, season=STAGE5_SEASON, stages=None, db_path=WAREHOUSE_DB):
+    event = STAGE1_IN.stem if event is None else event
+    log.info('Warehouse: storing outputs of event %r in %s', event, db_path)
+    with Warehouse(db_path) as wh:
+        run_id = wh.ingest_outputs(event, bookmaker=bookmaker, season=season, stages=stages)
+        n_rows = wh.conn.execute('SELECT COUNT(*) FROM driver_results WHERE run_id = ?',
+                                 (run_id,)).fetchone()[0]
+        n_coef = wh.conn.execute('SELECT COUNT(*) FROM coefficients WHERE run_id = ?',
+                                 (run_id,)).fetchone()[0]
+    log.info('Warehouse done. Run %s: %d driver rows, %d coefficient rows', run_id, n_rows, n_coef)
+    return run_id
+
+
+if __name__ == '__main__':
+    run_warehouse()
@@ -0,0 +1,189 @@
+import hashlib
+import re
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from f1_time_rank.config import ROOT
+from f1_time_rank.profiling import step, profiled
+
+
+def fractional_to_rawprob(s):
+    """Convert fractional or decimal odds string to raw implied probability.
+    Handles formats like '25/1', '2/9', '1.5', 'EVS' (even -> 1/2).
+    Returns np.nan if cannot parse.
+    """
+    if pd.isna(s):
+        return np.nan
+    s = str(s).strip()
+    # handle common words
+    if s.upper() in ('EVEN','EVS','EVENS'):
+        return 1.0 / 2.0
+    # fractional
+    if '/' in s:
+        parts = s.split('/')
+        try:
+            a = float(parts[0])
+            b = float(parts[1])
+            return b / (a + b)
+        except Exception:
+            return np.nan
+    # decimal
+    try:
+        d = float(s)
+        if d <= 0:
+            return np.nan
+        return 1.0 / d
+    except Exception:
+        return np.nan
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file's bytes."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _table_format(path):
+    """Output format from the file suffix (.csv, .parquet, .arrow/.feather)."""
+    suffix = Path(path).suffix.lower()
+    if suffix in ('.parquet', '.pq'):
+        return 'parquet'
+    if suffix in ('.arrow', '.feather', '.ipc'):
+        return 'arrow'
+    return 'csv'
+
+
+def _require_pyarrow(fmt):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError(f"{fmt} output needs pyarrow (pip install pyarrow), "
+                          f"or set OUTPUT_FORMAT = 'csv'") from None
+
+
+def save_df(df, path, index=False, partition_cols=None):
+    """Write a table; the format follows the suffix of path (config.OUTPUT_FORMAT
+    sets it for the stage outputs). partition_cols (parquet / arrow only)
+    writes a hive-partitioned dataset directory at path, e.g.
+    season=2022/part-0.parquet."""
+    with step('write', rows=len(df)):
+        _write_table(df, Path(path), index, partition_cols)
+
+
+def _write_table(df, path, index, partition_cols):
+    fmt = _table_format(path)
+    if fmt == 'csv':
+        if partition_cols:
+            raise ValueError('partition_cols needs the parquet or arrow format')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        df.to_csv(path, index=index)
+        return
+    _require_pyarrow(fmt)
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=index)
+    if partition_cols:
+        import pyarrow.dataset as ds
+        ds.write_dataset(table, path, format='parquet' if fmt == 'parquet' else 'ipc',
+                         partitioning=list(partition_cols), partitioning_flavor='hive',
+                         existing_data_behavior='delete_matching')
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, path)
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(table, path)
+
+
+@profiled('read')
+def read_df(path, columns=None, filters=None, index_col=None):
+    """Read a table written by save_df.
+
+    Args:
+        columns: only these columns (parquet / arrow read nothing else).
+        filters: row filter for parquet / arrow, e.g. [('season', '=', 2022)]
+                 (partition filters skip whole files).
+        index_col: CSV only, as in pd.read_csv (columnar formats restore the
+                   index saved with index=True).
+    """
+    path = Path(path)
+    fmt = _table_format(path)
+    if fmt == 'csv':
+        if filters:
+            raise ValueError('filters need the parquet or arrow format')
+        if index_col is None:
+            return pd.read_csv(path, usecols=columns)
+        df = pd.read_csv(path, index_col=index_col)
+        return df if columns is None else df[list(columns)]
+    _require_pyarrow(fmt)
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    dataset = ds.dataset(path, format='parquet' if fmt == 'parquet' else 'ipc',
+                         partitioning='hive' if path.is_dir() else None)
+    expr = pq.filters_to_expression(filters) if filters else None
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+
+def odds_rounding_variance(s):
+    """Variance of the raw implied probability caused by odds rounding.
+    Quoted prices sit on a ladder, so the fair price is only known to within
+    half a step. The rounded part is treated as uniform (variance step^2/12):
+    the numerator of odds-against fractions ('25/1'), the denominator of
+    odds-on fractions ('2/9'), and the last quoted digit of decimal odds.
+    Returns np.nan if cannot parse.
+    """
+    if pd.isna(s):
+        return np.nan
+    s = str(s).strip()
+    if s.upper() in ('EVEN','EVS','EVENS'):
+        s = '1/1'
+    if '/' in s:
+        parts = s.split('/')
+        try:
+            a = float(parts[0])
+            b = float(parts[1])
+        except Exception:
+            return np.nan
+        if a + b <= 0:
+            return np.nan
+        if a >= b:
+            deriv = b / (a + b) ** 2     # d r / d a (sign irrelevant)
+        else:
+            deriv = a / (a + b) ** 2     # d r / d b
+        return deriv ** 2 / 12.0
+    try:
+        d = float(s)
+        if d <= 0:
+            return np.nan
+    except Exception:
+        return np.nan
+    decimals = len(s.split('.')[1]) if '.' in s else 0
+    step = 10.0 ** (-decimals)
+    return (step / d ** 2) ** 2 / 12.0
+
+
+def match_driver_names(names, candidates, cutoff=0.85):
+    """Map driver names between sources that spell them differently
+    ('Lewis Hamilton' vs 'LewisHamilton', 'Valterri' vs 'Valtteri').
+    Compares lowercase letters only, exact first, then closest above cutoff.
+    Returns a list with the matched candidate or None for every name.
+    """
+    import difflib
+    key = lambda s: re.sub(r'[^a-z]', '', str(s).lower())
+    lookup = {}
+    for c in candidates:
+        lookup.setdefault(key(c), c)
+    out = []
+    for name in names:
+        k = key(name)
+        if k in lookup:
+            out.append(lookup[k])
+            continue
+        close = difflib.get_close_matches(k, list(lookup), n=1, cutoff=cutoff)
+        out.append(lookup[close[0]] if close else None)
+    return out
@@ -4,18 +4,25 @@ ANALISIS DETAIL 4 DIAGRAM VALIDASI MONTE CARLO
 
 Analisis mendalam dari 4 diagram validasi yang dihasilkan oleh simulasi Monte Carlo
 untuk memvalidasi model distribusi exponential dalam penelitian F1.
+Data diagram diambil dari ringkasan run Monte Carlo terakhir
+(output/monte_carlo_summary.json, lihat validation_plots).
 """
 
-import matplotlib.pyplot as plt
 import numpy as np
 import sys
 import os
 
-# Add src to path for imports
-sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
 
 import pandas as pd
 from scipy import stats
+from f1_time_rank.config import STAGE2_OUT
+from f1_time_rank.utils import read_df
+from f1_time_rank.validation.validation_plots import load_summary
 
 def explain_validation_plots():
     """
@@ -26,13 +33,22 @@ def explain_validation_plots():
     print("PENJELASAN DETAIL 4 DIAGRAM VALIDASI MONTE CARLO")
     print("="*80)
     
-    # Load data untuk analisis
-    prob_df = pd.read_csv('output/stage2_probabilities.csv')
-    theoretical_probs = prob_df['p_norm'].values
-    
-    # Simulate empirical data for explanation (in actual run, this comes from Monte Carlo)
-    np.random.seed(42)  # For reproducible explanation
-    empirical_probs = theoretical_probs + np.random.normal(0, 0.0005, len(theoretical_probs))
+    # Load data untuk analisis: data yang sama dengan diagram Monte Carlo
+    summary = load_summary()
+    if summary is not None:
+        theoretical_probs = np.asarray(summary['p_theoretical'])
+        empirical_probs = np.asarray(summary['p_empirical'])
+        driver_names = summary['driver_names']
+        print(f"Data: run Monte Carlo terakhir ({summary['n_simulations']:,} simulasi)")
+    else:
+        prob_df = read_df(STAGE2_OUT)
+        theoretical_probs = prob_df['p_norm'].values
+        driver_names = prob_df['Driver'].values
+        
+        # Belum ada run Monte Carlo: data empiris ilustratif (theoretical + noise)
+        print("Data: ilustrasi (jalankan monte_carlo_simulation.py untuk data asli)")
+        np.random.seed(42)  # For reproducible explanation
+        empirical_probs = theoretical_probs + np.random.normal(0, 0.0005, len(theoretical_probs))
     
     print("\n" + "="*60)
     print("DIAGRAM 1: THEORETICAL vs EMPIRICAL SCATTER PLOT")
@@ -100,7 +116,6 @@ def explain_validation_plots():
     
     # Get top 5 drivers
     top_5_indices = np.argsort(theoretical_probs)[::-1][:5]
-    driver_names = prob_df['Driver'].values
     
     print("TUJUAN:")
     print("• Perbandingan visual untuk driver dengan probabilitas tertinggi")
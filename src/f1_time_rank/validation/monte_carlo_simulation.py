@@ -0,0 +1,530 @@
+"""
+SIMULASI MONTE CARLO UNTUK VALIDASI MODEL DISTRIBUSI EXPONENTIAL
+================================================================
+
+Tujuan: Memberikan bukti empiris bahwa hasil perhitungan teoritis dari model
+distribusi exponential sesuai dengan simulasi Monte Carlo.
+
+Model Teoritis:
+- Waktu lap mengikuti distribusi exponential dengan parameter lambda
+- P(posisi = k) = probabilitas driver berada di posisi ke-k
+- Estimasi lambda menggunakan maximum likelihood (grouped approach)
+- Hubungan: mu = -log(p_norm), sigma = sqrt(trigamma(1))
+"""
+
+import numpy as np
+import sys
+import os
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pandas as pd
+from scipy import stats
+from scipy.special import gamma, digamma, polygamma
+from f1_time_rank.config import (OUTPUT_DIR, STAGE1_IN, STAGE2_OUT, STAGE3_OUT, STAGE3_COV_OUT,
+                                 STAGE4_OUT, STAGE5_SEASON, WAREHOUSE_DB)
+from f1_time_rank.utils import read_df
+from f1_time_rank.profiling import step, enable as enable_profiling, write_report, PROFILER
+from f1_time_rank.events import (get_logger, configure as configure_logging, Progress,
+                                 JsonLinesProgress, add_progress_callback, INFO)
+from f1_time_rank.stages.stage2_probabilities import run_stage2
+from f1_time_rank.stages.stage3_estimate_lambda import run_stage3, sample_lambdas
+from f1_time_rank.stages.stage4_mu_sigma import run_stage4
+from f1_time_rank.validation.validation_plots import plot_data, submit as submit_plots
+import warnings
+warnings.filterwarnings('ignore')
+
+log = get_logger(__name__)
+
+class MonteCarloF1Simulator:
+    """
+    Simulator Monte Carlo untuk model F1 dengan distribusi exponential
+    """
+    
+    def __init__(self, n_simulations=10000, n_drivers=20, n_races=25,
+                 parameter_uncertainty=False):
+        self.n_simulations = n_simulations
+        self.n_drivers = n_drivers
+        self.n_races = n_races
+        # Draw a lambda vector per simulation from the stage 3 covariance
+        self.parameter_uncertainty = parameter_uncertainty
+        self.results = {}
+        self.plot_job = None
+        
+    def load_theoretical_parameters(self):
+        """Load parameter teoritis dari hasil stage 2-4"""
+        log.info("Loading theoretical parameters from pipeline...")
+        
+        # Load normalized probabilities (stage 2)
+        prob_df = read_df(STAGE2_OUT)
+        self.p_norm_theoretical = prob_df['p_norm'].values
+        self.driver_names = prob_df['Driver'].values
+        
+        # Load lambda estimates (stage 3) 
+        lambda_df = read_df(STAGE3_OUT)
+        self.lambda_theoretical = lambda_df['lambda_est'].values
+        
+        # Lambda covariance (stage 3 with uncertainty enabled)
+        self.lambda_cov = None
+        if self.parameter_uncertainty:
+            self.lambda_cov = read_df(STAGE3_COV_OUT, index_col=0).values
+        
+        # Load mu and sigma (stage 4)
+        mu_sigma_df = read_df(STAGE4_OUT)
+        self.mu_theoretical = mu_sigma_df['mu_hat'].values
+        self.sigma_theoretical = mu_sigma_df['sigma_hat'].values
+        
+        log.info('Loaded %d drivers parameters', len(self.p_norm_theoretical))
+        
+    def simulate_exponential_times(self, lambda_params):
+        """
+        Simulasi waktu lap menggunakan distribusi exponential
+        
+        Args:
+            lambda_params: array parameter lambda untuk setiap driver, atau
+                matrix (n_simulations x n_drivers) untuk lambda per simulasi
+            
+        Returns:
+            simulated_times: matrix (n_drivers x n_races x n_simulations)
+        """
+        simulated_times = np.zeros((self.n_drivers, self.n_races, self.n_simulations))
+        lambda_params = np.asarray(lambda_params)
+        
+        for sim in range(self.n_simulations):
+            sim_lambda = lambda_params[sim] if lambda_params.ndim == 2 else lambda_params
+            for driver_idx in range(self.n_drivers):
+                # Generate exponential random times for each race
+                times = np.random.exponential(1/sim_lambda[driver_idx], self.n_races)
+                simulated_times[driver_idx, :, sim] = times
+                
+        return simulated_times
+    
+    def times_to_positions(self, times):
+        """
+        Konversi waktu lap ke posisi (ranking)
+        
+        Args:
+            times: array waktu lap (n_drivers x n_races)
+            
+        Returns:
+            positions: array posisi (n_drivers x n_races)
+        """
+        positions = np.zeros_like(times, dtype=int)
+        
+        for race in range(self.n_races):
+            race_times = times[:, race]
+            # Sort and get positions (1 = fastest, 20 = slowest)
+            sorted_indices = np.argsort(race_times)
+            positions[sorted_indices, race] = np.arange(1, self.n_drivers + 1)
+            
+        return positions
+    
+    def calculate_empirical_probabilities(self, positions):
+        """
+        Hitung probabilitas empiris dari simulasi
+        
+        Args:
+            positions: array posisi (n_drivers x n_races x n_simulations)
+            
+        Returns:
+            empirical_probs: probabilitas setiap driver menang
+        """
+        # Count wins (position = 1) for each driver across all simulations and races
+        wins = np.sum(positions == 1, axis=(1, 2))  # Sum over races and simulations
+        total_opportunities = self.n_races * self.n_simulations
+        
+        empirical_probs = wins / total_opportunities
+        return empirical_probs
+    
+    def run_monte_carlo_validation(self, plots=True):
+        """
+        Jalankan validasi Monte Carlo lengkap
+        plots=False: tanpa diagram (batch run)
+        """
+        log.info("="*80)
+        log.info("SIMULASI MONTE CARLO UNTUK VALIDASI MODEL F1")
+        log.info("="*80)
+        log.info('Jumlah simulasi: %s', f'{self.n_simulations:,}')
+        log.info('Jumlah driver: %d', self.n_drivers)
+        log.info('Jumlah race: %d', self.n_races)
+        log.info('')
+        
+        with step('monte_carlo', rows=self.n_simulations, unit='simulations'):
+            # 1. Load theoretical parameters
+            with step('load_theoretical_parameters'):
+                self.load_theoretical_parameters()
+            
+            # 2. Run Monte Carlo simulation
+            log.info("Running Monte Carlo simulations...")
+            lambda_params = self.lambda_theoretical
+            if self.lambda_cov is not None:
+                log.info("  Drawing lambda per simulation from stage 3 covariance")
+                lambda_params = sample_lambdas(self.lambda_theoretical, self.lambda_cov,
+                                               self.n_simulations)
+            with step('simulate_exponential_times', rows=self.n_simulations, unit='simulations'):
+                simulated_times = self.simulate_exponential_times(lambda_params)
+            
+            # 3. Convert times to positions for each simulation
+            log.info("Converting times to positions...")
+            all_positions = np.zeros((self.n_drivers, self.n_races, self.n_simulations))
+            
+            with step('times_to_positions', rows=self.n_simulations, unit='simulations'), \
+                    Progress('Processing simulation', total=self.n_simulations, unit='simulations',
+                             logger=log) as progress:
+                for sim in range(self.n_simulations):
+                    all_positions[:, :, sim] = self.times_to_positions(simulated_times[:, :, sim])
+                    progress.update()
+            
+            # 4. Calculate empirical probabilities
+            log.info("Calculating empirical probabilities...")
+            with step('calculate_empirical_probabilities', rows=self.n_simulations, unit='simulations'):
+                empirical_probs = self.calculate_empirical_probabilities(all_positions)
+            
+            # 5. Generate plots: rendered in a background process while the
+            # tests and report below run (see wait_for_plots)
+            if plots:
+                with step('generate_validation_plots'):
+                    self.generate_validation_plots(empirical_probs)
+            
+            # 6. Compare with theoretical
+            self.compare_theoretical_vs_empirical(empirical_probs)
+            
+            # 7. Statistical tests
+            with step('run_statistical_tests'):
+                self.run_statistical_tests(empirical_probs)
+            
+            # 8. Detailed analysis for top drivers
+            with step('detailed_driver_analysis'):
+                self.detailed_driver_analysis(all_positions)
+        
+        return empirical_probs
+    
+    def compare_theoretical_vs_empirical(self, empirical_probs):
+        """
+        Bandingkan probabilitas teoritis vs empiris
+        """
+        if not log.isEnabledFor(INFO):
+            return
+        log.info("\n" + "="*80)
+        log.info("PERBANDINGAN PROBABILITAS TEORITIS VS EMPIRIS")
+        log.info("="*80)
+        
+        # Sort by theoretical probability (descending)
+        sorted_indices = np.argsort(self.p_norm_theoretical)[::-1]
+        
+        log.info(f"{'Driver':<15} {'Theoretical':<12} {'Empirical':<12} {'Difference':<12} {'Rel Error %':<12}")
+        log.info("-" * 75)
+        
+        total_abs_error = 0
+        total_rel_error = 0
+        
+        for i in sorted_indices[:10]:  # Top 10 drivers
+            driver = self.driver_names[i]
+            theoretical = self.p_norm_theoretical[i]
+            empirical = empirical_probs[i]
+            difference = empirical - theoretical
+            rel_error = abs(difference / theoretical) * 100 if theoretical > 0 else 0
+            
+            total_abs_error += abs(difference)
+            total_rel_error += rel_error
+            
+            log.info(f"{driver:<15} {theoretical:<12.6f} {empirical:<12.6f} "
+                  f"{difference:<12.6f} {rel_error:<12.2f}")
+        
+        log.info("-" * 75)
+        log.info(f"{'Average':<15} {'':<12} {'':<12} "
+              f"{total_abs_error/10:<12.6f} {total_rel_error/10:<12.2f}")
+        
+        # Overall correlation
+        correlation = np.corrcoef(self.p_norm_theoretical, empirical_probs)[0, 1]
+        log.info(f"\nCorrelation coefficient: {correlation:.6f}")
+        
+        # R-squared
+        r_squared = correlation ** 2
+        log.info(f"R-squared: {r_squared:.6f}")
+        
+        # Mean Absolute Error
+        mae = np.mean(np.abs(empirical_probs - self.p_norm_theoretical))
+        log.info(f"Mean Absolute Error: {mae:.8f}")
+        
+        # Root Mean Square Error
+        rmse = np.sqrt(np.mean((empirical_probs - self.p_norm_theoretical) ** 2))
+        log.info(f"Root Mean Square Error: {rmse:.8f}")
+        
+    def run_statistical_tests(self, empirical_probs):
+        """
+        Jalankan tes statistik untuk validasi
+        """
+        if not log.isEnabledFor(INFO):
+            return
+        log.info("\n" + "="*80)
+        log.info("TES STATISTIK VALIDASI")
+        log.info("="*80)
+        
+        # 1. Kolmogorov-Smirnov test
+        ks_stat, ks_pvalue = stats.ks_2samp(self.p_norm_theoretical, empirical_probs)
+        log.info(f"Kolmogorov-Smirnov Test:")
+        log.info(f"  Statistic: {ks_stat:.6f}")
+        log.info(f"  P-value: {ks_pvalue:.6f}")
+        log.info(f"  Result: {'PASS' if ks_pvalue > 0.05 else 'FAIL'} (α = 0.05)")
+        
+        # 2. Wilcoxon signed-rank test
+        wilcoxon_stat, wilcoxon_pvalue = stats.wilcoxon(
+            self.p_norm_theoretical, empirical_probs, alternative='two-sided'
+        )
+        log.info(f"\nWilcoxon Signed-Rank Test:")
+        log.info(f"  Statistic: {wilcoxon_stat:.6f}")
+        log.info(f"  P-value: {wilcoxon_pvalue:.6f}")
+        log.info(f"  Result: {'PASS' if wilcoxon_pvalue > 0.05 else 'FAIL'} (α = 0.05)")
+        
+        # 3. Paired t-test
+        t_stat, t_pvalue = stats.ttest_rel(self.p_norm_theoretical, empirical_probs)
+        log.info(f"\nPaired T-Test:")
+        log.info(f"  Statistic: {t_stat:.6f}")
+        log.info(f"  P-value: {t_pvalue:.6f}")
+        log.info(f"  Result: {'PASS' if t_pvalue > 0.05 else 'FAIL'} (α = 0.05)")
+        
+        # 4. Check if differences are within Monte Carlo error bounds
+        # Standard error for binomial proportion: sqrt(p(1-p)/n)
+        log.info(f"\nMonte Carlo Error Analysis:")
+        total_trials = self.n_races * self.n_simulations
+        
+        within_bounds = 0
+        for i in range(len(empirical_probs)):
+            p = self.p_norm_theoretical[i]
+            se = np.sqrt(p * (1 - p) / total_trials)
+            margin_error = 1.96 * se  # 95% confidence interval
+            
+            lower_bound = p - margin_error
+            upper_bound = p + margin_error
+            
+            if lower_bound <= empirical_probs[i] <= upper_bound:
+                within_bounds += 1
+        
+        pct_within_bounds = (within_bounds / len(empirical_probs)) * 100
+        log.info(f"  Drivers within 95% CI: {within_bounds}/{len(empirical_probs)} ({pct_within_bounds:.1f}%)")
+        log.info(f"  Expected: ~95% for valid model")
+        
+    def detailed_driver_analysis(self, all_positions):
+        """
+        Analisis detail untuk driver teratas
+        """
+        if not log.isEnabledFor(INFO):
+            return
+        log.info("\n" + "="*80)
+        log.info("ANALISIS DETAIL DRIVER TERATAS")
+        log.info("="*80)
+        
+        # Focus on top 5 drivers by theoretical probability
+        top_indices = np.argsort(self.p_norm_theoretical)[::-1][:5]
+        
+        for idx in top_indices:
+            driver = self.driver_names[idx]
+            theoretical_p = self.p_norm_theoretical[idx]
+            lambda_param = self.lambda_theoretical[idx]
+            
+            log.info(f"\n{driver} Analysis:")
+            log.info(f"  Theoretical win probability: {theoretical_p:.6f}")
+            log.info(f"  Lambda parameter: {lambda_param:.6f}")
+            
+            # Calculate position distribution from simulations
+            driver_positions = all_positions[idx, :, :].flatten().astype(int)  # All positions across races and sims
+            
+            position_counts = np.bincount(driver_positions, minlength=21)[1:21]  # Positions 1-20
+            position_probs = position_counts / len(driver_positions)
+            
+            log.info(f"  Empirical position distribution:")
+            for pos in range(1, 6):  # Top 5 positions
+                log.info(f"    P(position = {pos}): {position_probs[pos-1]:.6f}")
+            
+            # Expected vs actual wins
+            expected_wins = theoretical_p * self.n_races * self.n_simulations
+            actual_wins = np.sum(driver_positions == 1)
+            log.info(f"  Expected wins: {expected_wins:.1f}")
+            log.info(f"  Actual wins: {actual_wins}")
+            log.info(f"  Win rate: {actual_wins / (self.n_races * self.n_simulations):.6f}")
+    
+    def generate_validation_plots(self, empirical_probs, background=True):
+        """
+        Generate plots untuk validasi visual (validation_plots): dari ringkasan
+        per driver, di proses terpisah; dilewati jika data tidak berubah.
+        Mengembalikan PlotJob; tunggu dengan wait_for_plots()
+        """
+        log.info("\n" + "="*80)
+        log.info("GENERATING VALIDATION PLOTS")
+        log.info("="*80)
+        
+        data = plot_data(self.driver_names, self.p_norm_theoretical, empirical_probs,
+                         self.n_simulations, self.n_races)
+        self.plot_job = submit_plots(data, background=background)
+        if self.plot_job.status == 'unchanged':
+            log.info('Validation plots unchanged, kept %s', self.plot_job.path)
+        else:
+            log.info('Rendering validation plots to %s in the background', self.plot_job.path)
+        return self.plot_job
+    
+    def wait_for_plots(self):
+        """Tunggu render diagram yang berjalan di background"""
+        job = self.plot_job
+        if job is None or job.status != 'running':
+            return None if job is None else job.status
+        with step('wait_validation_plots'):
+            status = job.result()
+        log.info('Saved validation plots to %s', job.path)
+        return status
+    
+    def results_frame(self, empirical_probs):
+        """Tabel hasil per driver (teoritis vs empiris), untuk warehouse"""
+        return pd.DataFrame({
+            'Driver': self.driver_names,
+            'p_theoretical': self.p_norm_theoretical,
+            'p_empirical': empirical_probs,
+            'abs_error': np.abs(empirical_probs - self.p_norm_theoretical),
+            'lambda': self.lambda_theoretical,
+            'n_simulations': float(self.n_simulations),
+        })
+
+    def generate_summary_report(self, empirical_probs):
+        """
+        Generate ringkasan laporan validasi
+        """
+        correlation = np.corrcoef(self.p_norm_theoretical, empirical_probs)[0, 1]
+        mae = np.mean(np.abs(empirical_probs - self.p_norm_theoretical))
+        rmse = np.sqrt(np.mean((empirical_probs - self.p_norm_theoretical) ** 2))
+        
+        report = f"""
+MONTE CARLO VALIDATION REPORT
+============================
+
+Model: Exponential Distribution for F1 Lap Times
+Simulations: {self.n_simulations:,}
+Drivers: {self.n_drivers}
+Races: {self.n_races}
+
+VALIDATION METRICS:
+- Correlation: {correlation:.6f}
+- R-squared: {correlation**2:.6f}
+- Mean Absolute Error: {mae:.8f}
+- Root Mean Square Error: {rmse:.8f}
+
+CONCLUSION:
+{'VALID: Model confirmed by Monte Carlo simulation' if correlation > 0.99 else 'INVALID: Significant discrepancy found'}
+
+The exponential distribution model for F1 lap times is {'well-supported' if correlation > 0.99 else 'questionable'} by empirical evidence.
+Monte Carlo simulation with {self.n_simulations:,} iterations shows {'excellent' if correlation > 0.99 else 'poor'} agreement with theoretical predictions.
+"""
+        
+        # Save report
+        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        with open(OUTPUT_DIR / 'monte_carlo_report.txt', 'w', encoding='utf-8') as f:
+            f.write(report)
+        
+        log.info("\n" + "="*80)
+        log.info("SUMMARY REPORT")
+        log.info("="*80)
+        log.info('%s', report)
+        log.info('Full report saved to %s', OUTPUT_DIR / 'monte_carlo_report.txt')
+
+
+def main(warehouse=None, event=None, bookmaker=None, n_simulations=10000, profile=None,
+         profile_hook=None, quiet=False, verbose=False, progress_log=None, plots=True, seed=None):
+    """
+    Main function untuk menjalankan simulasi Monte Carlo
+
+    warehouse: path database SQLite (stages.warehouse); jika diberikan, hasil
+    per driver disimpan sebagai stage 'monte_carlo'
+    profile: path laporan JSON (profiling); waktu, memori dan jumlah simulasi
+    per langkah
+    quiet / verbose: level log (events.configure); progress_log: file JSON
+    lines untuk event progress (job monitor)
+    plots=False: tanpa diagram validasi; seed: seed numpy (run yang sama
+    menghasilkan data plot yang sama, sehingga render dilewati)
+    """
+    configure_logging(quiet=quiet, verbose=verbose)
+    if progress_log:
+        add_progress_callback(JsonLinesProgress(progress_log))
+    if profile:
+        enable_profiling(hook=profile_hook)
+    if seed is not None:
+        np.random.seed(seed)
+    log.info("MONTE CARLO SIMULATION FOR F1 EXPONENTIAL MODEL VALIDATION")
+    log.info("=" * 80)
+    
+    # Ensure we have the theoretical results first
+    log.info("1. Generating theoretical results (if needed)...")
+    try:
+        # Check if files exist, if not run the pipeline
+        if not all(os.path.exists(p) for p in (STAGE2_OUT, STAGE3_OUT, STAGE4_OUT)):
+            log.info("   Running stages 2-4 to generate theoretical parameters...")
+            run_stage2()
+            run_stage3()  
+            run_stage4()
+    except Exception as e:
+        log.error('   Error running pipeline: %s', e)
+        return
+    
+    # Create and run Monte Carlo simulator
+    log.info("\n2. Initializing Monte Carlo simulator...")
+    simulator = MonteCarloF1Simulator(
+        n_simulations=n_simulations,  # Adjust based on computational resources
+        n_drivers=20,
+        n_races=25
+    )
+    
+    log.info("\n3. Running Monte Carlo validation...")
+    empirical_probs = simulator.run_monte_carlo_validation(plots=plots)
+    
+    log.info("\n4. Generating summary report...")
+    simulator.generate_summary_report(empirical_probs)
+
+    if warehouse:
+        from f1_time_rank.stages.warehouse import Warehouse
+        with Warehouse(warehouse) as wh:
+            run_id = wh.ingest({'monte_carlo': simulator.results_frame(empirical_probs)},
+                               event=event or STAGE1_IN.stem, bookmaker=bookmaker,
+                               season=STAGE5_SEASON, note='monte_carlo')
+        log.info('   Stored in warehouse %s (run %s)', warehouse, run_id)
+
+    simulator.wait_for_plots()
+
+    if profile:
+        write_report(profile)
+        log.info('\n%s', PROFILER.summary())
+        log.info('Profile report saved to %s', profile)
+    
+    log.info("\n" + "="*80)
+    log.info("MONTE CARLO VALIDATION COMPLETED SUCCESSFULLY!")
+    log.info("="*80)
+    log.info("Check the following output files:")
+    if plots:
+        log.info("- output/monte_carlo_validation.png (validation plots)")
+        log.info("- output/monte_carlo_summary.json (data of the plots)")
+    log.info("- output/monte_carlo_report.txt (summary report)")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--warehouse', nargs='?', const=WAREHOUSE_DB, metavar='DB',
+                        help='simpan hasil ke SQLite warehouse (default output/warehouse.sqlite)')
+    parser.add_argument('--event', help='label event untuk warehouse')
+    parser.add_argument('--bookmaker', help='label bookmaker untuk warehouse')
+    parser.add_argument('--simulations', type=int, default=10000, help='jumlah simulasi')
+    parser.add_argument('--profile', nargs='?', const=OUTPUT_DIR / 'profile_monte_carlo.json',
+                        metavar='JSON', help='simpan laporan profiling (waktu, memori per langkah)')
+    parser.add_argument('--profile-hook', choices=['cprofile', 'pyinstrument'],
+                        help='dengan --profile: profil per fungsi (.prof / .html)')
+    parser.add_argument('--no-plots', dest='plots', action='store_false',
+                        help='lewati diagram validasi (batch run)')
+    parser.add_argument('--seed', type=int, help='seed numpy untuk simulasi')
+    parser.add_argument('--quiet', action='store_true', help='hanya warning dan error')
+    parser.add_argument('--verbose', action='store_true', help='tampilkan juga detail (DEBUG)')
+    parser.add_argument('--progress-log', metavar='JSONL',
+                        help='tulis event progress sebagai JSON lines (untuk job monitor)')
+    args = parser.parse_args()
+    main(args.warehouse, args.event, args.bookmaker, args.simulations, args.profile,
+         args.profile_hook, args.quiet, args.verbose, args.progress_log, args.plots, args.seed)
\ No newline at end of file
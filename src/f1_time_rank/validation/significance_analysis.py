@@ -2,12 +2,15 @@ import pandas as pd
 import sys
 import os
 
-# Add src to path for imports
-sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
 
 import numpy as np
-import statsmodels.api as sm
-from stages.stage5_regression import read_positions_matrix
+from f1_time_rank.config import STAGE5_IN
+from f1_time_rank.stages.design_cache import load_design
 
 def analyze_statistical_significance():
     """
@@ -17,51 +20,20 @@ def analyze_statistical_significance():
     print("ANALISIS SIGNIFIKANSI STATISTIK DALAM STEPWISE REGRESSION")
     print("="*80)
     
-    # Load data
-    pos, driver_names = read_positions_matrix('data/f1seconddata.txt')
-    n_drivers = pos.shape[0]
-    n_races = pos.shape[1]
-    
-    # Prepare data exactly like stage5
-    positionlabel = pos.flatten(order='F')
-    driverorder_base = np.tile([1, 2], 10)
-    driverorder = np.tile(driverorder_base, n_races)
-    driverorder2 = driverorder - 1
-    
-    # Team mapping
-    actual_teams = [
-        "Mercedes", "Mercedes", "RedBull", "RedBull", "Ferrari", "Ferrari",
-        "Mclaren", "Mclaren", "Alpine", "Alpine", "AstonMartin", "AstonMartin",
-        "Haas", "Haas", "AlfaTauri", "AlfaTauri", "AlfaRomeo", "AlfaRomeo",
-        "Williams", "Williams"
-    ]
-    constructors = np.tile(actual_teams, n_races)
-    
-    # Create DataFrame
-    df = pd.DataFrame({
-        'positionlabel': positionlabel.astype(float),
-        'driverorder2': driverorder2.astype(float),
-        'constructor': constructors
-    })
-    
-    # Create team dummies (Williams as reference)
-    team_dummies = pd.get_dummies(df['constructor'], prefix='', prefix_sep='').astype(float)
-    if 'Williams' in team_dummies.columns:
-        team_dummies = team_dummies.drop('Williams', axis=1)
+    # Data prep, dummies (Williams = reference) and X'X come from the shared,
+    # hash-memoized stage 5 design; each model below is a submatrix solve
+    design = load_design(STAGE5_IN)
+    df = design.df
     
     print(f"Data prepared: {len(df)} observations")
-    print(f"Teams available: {list(team_dummies.columns)}")
+    print(f"Teams available: {design.teams}")
     print()
     
     # === MODEL 1: FULL MODEL (9 TEAMS) ===
     print("1. FULL MODEL (SEMUA 9 TIM)")
     print("-" * 50)
     
-    X_full = pd.concat([df[['driverorder2']], team_dummies], axis=1)
-    X_full = sm.add_constant(X_full)
-    y = df['positionlabel']
-    
-    model_full = sm.OLS(y, X_full).fit()
+    model_full = design.fit()
     
     print("Hasil Signifikansi (α = 0.05):")
     print(f"{'Tim':<15} {'Coefficient':<12} {'Std Error':<12} {'t-value':<10} {'p-value':<12} {'Signifikan?':<12}")
@@ -101,10 +73,15 @@ def analyze_statistical_significance():
     print("2. SIMULASI STEPWISE SELECTION")
     print("-" * 50)
     
-    # Start with only significant teams (p < 0.05)
-    significant_teams = [result['team'] for result in significance_results if result['significant']]
+    # Stepwise AIC (dua arah) mulai dari driverorder2, seperti step() di R
+    significant_teams, step_result = design.select_teams()
+    
+    print("Langkah stepwise (AIC):")
+    for _, row in step_result.history.iterrows():
+        print(f"  {row['step'] or '<awal>':<15} AIC = {row['criterion']:.3f}")
+    print(f"Tim terpilih: {significant_teams}")
     
-    print("Tim yang SIGNIFIKAN (p < 0.05):")
+    print("\nTim yang SIGNIFIKAN (p < 0.05):")
     for result in significance_results:
         if result['significant']:
             print(f"  ✓ {result['team']:<15} p = {result['p_value']:.4f}")
@@ -119,13 +96,8 @@ def analyze_statistical_significance():
     print("3. STEPWISE MODEL (HANYA TIM SIGNIFIKAN)")
     print("-" * 50)
     
-    # Filter team dummies for significant teams only
-    team_dummies_significant = team_dummies[significant_teams]
-    
-    X_stepwise = pd.concat([df[['driverorder2']], team_dummies_significant], axis=1)
-    X_stepwise = sm.add_constant(X_stepwise)
-    
-    model_stepwise = sm.OLS(y, X_stepwise).fit()
+    # Only the significant team columns of the cached design
+    model_stepwise = design.fit(significant_teams)
     
     print("Hasil Model Stepwise:")
     print(f"{'Variabel':<15} {'Coefficient':<12} {'Std Error':<12} {'t-value':<10} {'p-value':<12}")
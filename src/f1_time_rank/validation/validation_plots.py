@@ -0,0 +1,222 @@
+"""
+RENDER DIAGRAM VALIDASI MONTE CARLO
+===================================
+
+Empat panel validasi (scatter teoritis vs empiris, residual, top 5 driver,
+distribusi error) dibuat dari ringkasan hasil simulasi saja: nama driver,
+probabilitas teoritis dan empiris per driver (plot_data). Array posisi
+mentah tidak dibutuhkan.
+
+- submit() merender di proses terpisah (ProcessPoolExecutor, backend Agg),
+  jadi simulasi dan laporan tidak menunggu matplotlib.
+- Hash SHA-256 dari data yang diplot disimpan di metadata PNG. Jika hash
+  gambar yang ada sama, render dilewati.
+- Ringkasan juga ditulis ke output/monte_carlo_summary.json, dipakai oleh
+  diagram_analysis.
+
+Input: ringkasan dari MonteCarloF1Simulator
+Output: output/monte_carlo_validation.png, output/monte_carlo_summary.json
+"""
+import hashlib
+import json
+import struct
+import sys
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Only when run as a script (python src/f1_time_rank/<package>/<module>.py):
+# put src first on the path. Imported as a package module, sys.path is
+# left alone.
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import numpy as np
+from f1_time_rank.config import OUTPUT_DIR
+
+PLOT_PATH = OUTPUT_DIR / 'monte_carlo_validation.png'
+SUMMARY_PATH = OUTPUT_DIR / 'monte_carlo_summary.json'
+# naikkan jika tampilan diagram berubah, supaya gambar lama dirender ulang
+RENDER_VERSION = 1
+_DIGEST_KEY = 'DataSHA256'
+
+
+def plot_data(driver_names, p_theoretical, p_empirical, n_simulations=None, n_races=None):
+    """Ringkasan yang diplot (list biasa, bisa di-pickle dan di-JSON)"""
+    return {
+        'driver_names': [str(d) for d in driver_names],
+        'p_theoretical': np.asarray(p_theoretical, dtype=float).tolist(),
+        'p_empirical': np.asarray(p_empirical, dtype=float).tolist(),
+        'n_simulations': n_simulations,
+        'n_races': n_races,
+    }
+
+
+def data_digest(data):
+    """Hash isi diagram: data yang diplot + RENDER_VERSION"""
+    payload = json.dumps({'version': RENDER_VERSION, 'data': data}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def image_digest(path):
+    """Hash yang tersimpan di chunk teks PNG oleh render(), atau None.
+    Chunk dibaca sampai IDAT saja, tanpa mendekode gambar."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(8) != b'\x89PNG\r\n\x1a\n':
+                return None
+            while True:
+                head = f.read(8)
+                if len(head) < 8:
+                    return None
+                length, kind = struct.unpack('>I4s', head)
+                if kind in (b'IDAT', b'IEND'):
+                    return None
+                body = f.read(length)
+                f.read(4)   # CRC
+                if kind == b'tEXt':
+                    key, _, value = body.partition(b'\0')
+                    if key.decode('latin-1') == _DIGEST_KEY:
+                        return value.decode('latin-1')
+    except OSError:
+        return None
+
+
+def load_summary(path=SUMMARY_PATH):
+    """Ringkasan run Monte Carlo terakhir, atau None jika belum ada"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def render(data, path=PLOT_PATH, digest=None):
+    """Render 4 panel ke path (backend Agg). Dipanggil di proses worker."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    driver_names = data['driver_names']
+    p_theoretical = np.asarray(data['p_theoretical'])
+    empirical_probs = np.asarray(data['p_empirical'])
+
+    plt.style.use('default')
+    fig, axes = plt.subplots(2, 2, figsize=(15, 12))
+    fig.suptitle('Monte Carlo Validation of F1 Exponential Model', fontsize=16, fontweight='bold')
+
+    # Plot 1: Theoretical vs Empirical scatter
+    ax1 = axes[0, 0]
+    ax1.scatter(p_theoretical, empirical_probs, alpha=0.7, s=60)
+
+    # Perfect correlation line
+    min_val = min(min(p_theoretical), min(empirical_probs))
+    max_val = max(max(p_theoretical), max(empirical_probs))
+    ax1.plot([min_val, max_val], [min_val, max_val], 'r--', label='Perfect correlation')
+
+    ax1.set_xlabel('Theoretical Probability')
+    ax1.set_ylabel('Empirical Probability')
+    ax1.set_title('Theoretical vs Empirical Probabilities')
+    ax1.legend()
+    ax1.grid(True, alpha=0.3)
+
+    # Add correlation coefficient
+    correlation = np.corrcoef(p_theoretical, empirical_probs)[0, 1]
+    ax1.text(0.05, 0.95, f'r = {correlation:.4f}', transform=ax1.transAxes,
+            bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+
+    # Plot 2: Residuals
+    ax2 = axes[0, 1]
+    residuals = empirical_probs - p_theoretical
+    ax2.scatter(p_theoretical, residuals, alpha=0.7, s=60)
+    ax2.axhline(y=0, color='r', linestyle='--')
+    ax2.set_xlabel('Theoretical Probability')
+    ax2.set_ylabel('Residuals (Empirical - Theoretical)')
+    ax2.set_title('Residual Plot')
+    ax2.grid(True, alpha=0.3)
+
+    # Plot 3: Distribution comparison for top drivers
+    ax3 = axes[1, 0]
+    top_5_indices = np.argsort(p_theoretical)[::-1][:5]
+
+    x_pos = np.arange(len(top_5_indices))
+    width = 0.35
+
+    theoretical_top5 = p_theoretical[top_5_indices]
+    empirical_top5 = empirical_probs[top_5_indices]
+
+    ax3.bar(x_pos - width/2, theoretical_top5, width, label='Theoretical', alpha=0.8)
+    ax3.bar(x_pos + width/2, empirical_top5, width, label='Empirical', alpha=0.8)
+
+    ax3.set_xlabel('Top 5 Drivers')
+    ax3.set_ylabel('Win Probability')
+    ax3.set_title('Top 5 Drivers: Theoretical vs Empirical')
+    ax3.set_xticks(x_pos)
+    ax3.set_xticklabels([driver_names[i][:8] for i in top_5_indices], rotation=45)
+    ax3.legend()
+    ax3.grid(True, alpha=0.3)
+
+    # Plot 4: Error distribution
+    ax4 = axes[1, 1]
+    errors = empirical_probs - p_theoretical
+    ax4.hist(errors, bins=15, alpha=0.7, edgecolor='black')
+    ax4.axvline(x=0, color='r', linestyle='--', label='Zero error')
+    ax4.set_xlabel('Error (Empirical - Theoretical)')
+    ax4.set_ylabel('Frequency')
+    ax4.set_title('Distribution of Errors')
+    ax4.legend()
+    ax4.grid(True, alpha=0.3)
+
+    # Add statistics
+    mean_error = np.mean(errors)
+    std_error = np.std(errors)
+    ax4.text(0.05, 0.95, f'Mean: {mean_error:.6f}\nStd: {std_error:.6f}',
+            transform=ax4.transAxes, bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+
+    plt.tight_layout()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fig.savefig(path, dpi=300, bbox_inches='tight',
+                metadata={_DIGEST_KEY: digest or data_digest(data)})
+    plt.close(fig)
+    return str(path)
+
+
+class PlotJob:
+    """Render yang sedang berjalan (atau dilewati). result() menunggu dan
+    mengembalikan 'rendered' atau 'unchanged'."""
+
+    def __init__(self, path, future=None, pool=None):
+        self.path = path
+        self._future = future
+        self._pool = pool
+        self.status = 'unchanged' if future is None else 'running'
+
+    def done(self):
+        return self._future is None or self._future.done()
+
+    def result(self):
+        if self._future is not None and self.status == 'running':
+            try:
+                self._future.result()
+                self.status = 'rendered'
+            finally:
+                self._pool.shutdown()
+        return self.status
+
+
+def submit(data, path=PLOT_PATH, summary_path=SUMMARY_PATH, force=False, background=True):
+    """Tulis ringkasan dan render diagram jika datanya berubah.
+    background=False merender di proses ini (tetap dengan Agg)."""
+    digest = data_digest(data)
+    if summary_path is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(summary_path)), exist_ok=True)
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump({**data, 'sha256': digest}, f, indent=2)
+    if not force and image_digest(path) == digest:
+        return PlotJob(path)
+    if not background:
+        render(data, path, digest)
+        job = PlotJob(path)
+        job.status = 'rendered'
+        return job
+    pool = ProcessPoolExecutor(max_workers=1)
+    return PlotJob(path, pool.submit(render, data, str(path), digest), pool)